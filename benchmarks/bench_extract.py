@@ -0,0 +1,171 @@
+"""Times the unpacking stages on synthetic game files and reports MB/s and peak RSS.
+
+Builds format-valid data.trpfd/data.trpfs (with real TRPAK packs) and an NSP of the
+same size with za_tools.synthetic, then runs each case in a fresh process so its peak RSS
+is its own. Nothing here needs real game files.
+
+Usage: python benchmarks/bench_extract.py [--packs N] [--mean-size BYTES]
+       [--distribution fixed|uniform|lognormal] [--depth MIN:MAX] [--repeat N] [--json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from za_tools.hashing import CONTENT_HASH_NAME, content_hasher, fnv1a_64_hash_many
+from za_tools.pfs0 import unpack_pfs0_logic
+from za_tools.slicer import DEFAULT_WORKERS, extract_trpfs
+from za_tools.synthetic import SIZE_DISTRIBUTIONS, write_pfs0, write_synthetic_game
+from za_tools.trpfs import DataArchiveMap, NameIndex
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+# --- CASES ---
+# Each case gets the work directory and returns the number of bytes it processed.
+
+def case_pfs0(work):
+    out = os.path.join(work, 'out_pfs0')
+    unpack_pfs0_logic(os.path.join(work, 'game.nsp'), out)
+    return os.path.getsize(os.path.join(work, 'game.nsp'))
+
+
+def case_name_index(work):
+    NameIndex(os.path.join(work, 'data.trpfd'))
+    return os.path.getsize(os.path.join(work, 'data.trpfd'))
+
+
+def case_data_archive_map(work):
+    data_map = DataArchiveMap(os.path.join(work, 'data.trpfs'))
+    return 16 * len(data_map.hashes)
+
+
+def case_pack_sizes(work):
+    data_map = DataArchiveMap(os.path.join(work, 'data.trpfs'))
+    data_map.pack_sizes(os.path.getsize(os.path.join(work, 'data.trpfs')))
+    return os.path.getsize(os.path.join(work, 'data.trpfs'))
+
+
+def case_fnv(work):
+    name_index = NameIndex(os.path.join(work, 'data.trpfd'))
+    names = [name_index.name(i).encode('utf-8') for i in range(len(name_index))]
+    start = time.perf_counter()
+    fnv1a_64_hash_many(names)
+    return sum(map(len, names)), time.perf_counter() - start
+
+
+def case_content_hash(work):
+    hasher = content_hasher(CONTENT_HASH_NAME)
+    with open(os.path.join(work, 'data.trpfs'), 'rb') as f:
+        for chunk in iter(lambda: f.read(8 * 1024 * 1024), b''):
+            hasher.update(chunk)
+    return os.path.getsize(os.path.join(work, 'data.trpfs'))
+
+
+def case_extract(work):
+    extract_trpfs(os.path.join(work, 'data.trpfd'), os.path.join(work, 'data.trpfs'), os.path.join(work, 'out_trpfs'),
+                  workers=DEFAULT_WORKERS, use_cache=False, incremental=False)
+    return os.path.getsize(os.path.join(work, 'data.trpfs'))
+
+
+def case_extract_trpak(work):
+    extract_trpfs(os.path.join(work, 'data.trpfd'), os.path.join(work, 'data.trpfs'), os.path.join(work, 'out_trpak'),
+                  workers=DEFAULT_WORKERS, use_cache=False, unpack_trpak=True)
+    return os.path.getsize(os.path.join(work, 'data.trpfs'))
+
+
+CASES = [
+    ("unpack_pfs0_logic", case_pfs0),
+    ("NameIndex", case_name_index),
+    ("DataArchiveMap", case_data_archive_map),
+    ("DataArchiveMap.pack_sizes", case_pack_sizes),
+    ("fnv1a_64_hash_many", case_fnv),
+    (f"content hash ({CONTENT_HASH_NAME})", case_content_hash),
+    ("extract_trpfs", case_extract),
+    ("extract_trpfs --unpack-trpak", case_extract_trpak),
+]
+
+
+def _run_case(index, work, results):
+    start = time.perf_counter()
+    result = CASES[index][1](work)
+    elapsed = time.perf_counter() - start
+    # Cases that need setup inside the child report their own timing
+    processed, elapsed = result if isinstance(result, tuple) else (result, elapsed)
+    results.put((processed, elapsed, peak_rss_mb()))
+
+
+def run_case(index, work):
+    """Runs one case in a spawned process and returns (bytes, seconds, peak RSS in MB)."""
+    for name in os.listdir(work):
+        if name.startswith('out_'):
+            shutil.rmtree(os.path.join(work, name))
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_run_case, args=(index, work, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--packs', type=int, default=2000, help="number of packs in data.trpfs")
+    parser.add_argument('--mean-size', type=int, default=64 * 1024, help="mean pack size in bytes")
+    parser.add_argument('--distribution', choices=SIZE_DISTRIBUTIONS, default='lognormal')
+    parser.add_argument('--depth', default="2:5", help="min:max folders in pack paths")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per case; the fastest is reported")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    args = parser.parse_args()
+    depth = tuple(int(part) for part in args.depth.split(':'))
+
+    work = tempfile.mkdtemp(prefix="za_bench_")
+    try:
+        start = time.perf_counter()
+        trpfd, trpfs = write_synthetic_game(work, args.packs, args.distribution, args.mean_size, depth=depth, seed=args.seed)
+        write_pfs0(os.path.join(work, 'game.nsp'), [('data.trpfd', open(trpfd, 'rb').read()),
+                                                     ('data.trpfs', os.path.getsize(trpfs))], seed=args.seed)
+        if not args.json:
+            print(f"{args.packs} packs, {os.path.getsize(trpfs) / 1e6:.1f} MB data.trpfs "
+                  f"(generated in {time.perf_counter() - start:.1f} s), {DEFAULT_WORKERS} workers")
+
+        rows = []
+        for index, (name, _) in enumerate(CASES):
+            runs = [run_case(index, work) for _ in range(max(1, args.repeat))]
+            processed, elapsed, rss = min(runs, key=lambda run: run[1])
+            rows.append({'case': name, 'bytes': processed, 'seconds': elapsed,
+                         'mb_per_s': processed / 1e6 / elapsed if elapsed else None, 'peak_rss_mb': rss})
+
+        if args.json:
+            json.dump(rows, sys.stdout, indent=2)
+            sys.stdout.write("\n")
+            return
+        print(f"  {'case':<32} {'seconds':>9} {'MB/s':>10} {'peak RSS':>10}")
+        for row in rows:
+            rss = f"{row['peak_rss_mb']:.0f} MB" if row['peak_rss_mb'] is not None else "n/a"
+            print(f"  {row['case']:<32} {row['seconds']:9.3f} {row['mb_per_s'] or 0:10.1f} {rss:>10}")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
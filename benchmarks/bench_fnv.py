@@ -0,0 +1,48 @@
+"""Compares the scalar and batched FNV-1a hashers on synthetic .trpfd-style pack paths.
+
+Usage: python benchmarks/bench_fnv.py [name_count]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from za_tools.hashing import fnv1a_64_hash, fnv1a_64_hash_many
+
+
+def make_names(count, seed=0):
+    rnd = random.Random(seed)
+    words = ["ai_influence", "pokemon", "field", "effect", "ui", "model", "texture", "common", "battle", "event"]
+    names = []
+    for i in range(count):
+        depth = rnd.randint(2, 6)
+        parts = [rnd.choice(words) + f"_{rnd.randint(0, 999):03d}" for _ in range(depth)]
+        names.append(("arc/" + "/".join(parts) + f"/pack_{i:06d}.trpak").encode('utf-8'))
+    return names
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    names = make_names(count)
+    total_bytes = sum(map(len, names))
+
+    start = time.perf_counter()
+    scalar = [fnv1a_64_hash(name) for name in names]
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = fnv1a_64_hash_many(names)
+    batched_time = time.perf_counter() - start
+
+    if scalar != batched:
+        raise SystemExit("MISMATCH: batched hashes differ from fnv1a_64_hash")
+
+    print(f"{count} names, {total_bytes / 1e6:.1f} MB of path data")
+    print(f"  fnv1a_64_hash      : {scalar_time:8.3f} s")
+    print(f"  fnv1a_64_hash_many : {batched_time:8.3f} s  ({scalar_time / batched_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
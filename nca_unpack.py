@@ -1,78 +1,50 @@
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
 import os
-import subprocess
+import shutil
 import threading
 
-# --- CORE HACTOOL LOGIC ---
+from za_tools.crypto import crypto_available
+from za_tools.events import EventChannel
+from za_tools.hactool import HactoolCancelled, romfs_output_dir, run_hactool_logic
+from za_tools.nca import extract_nca_romfs, load_keyset
 
-def run_hactool_logic(hactool_path, keys_path, nca_path, output_dir, log_callback):
-    try:
-        hactool_path = os.path.normpath(hactool_path)
-        keys_path = os.path.normpath(keys_path)
-        nca_path = os.path.normpath(nca_path)
-        output_dir = os.path.normpath(output_dir)
-
-        nca_basename = os.path.basename(nca_path)
-        romfs_output_dirname = os.path.splitext(nca_basename)[0] + "_romfs"
-        romfs_output_path = os.path.join(output_dir, romfs_output_dirname)
-        romfs_output_path = os.path.normpath(romfs_output_path)
-
-        command = [
-            hactool_path,
-            "-k", keys_path,
-            "--romfsdir", romfs_output_path,
-            nca_path
-        ]
-        
-        log_callback(f"Target directory for RomFS: {romfs_output_path}\n")
-        formatted_command = ' '.join(f'"{c}"' for c in command)
-        log_callback(f"Running command:\n{formatted_command}\n")
-
-        process = subprocess.Popen(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding='utf-8',
-            errors='replace',
-            creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
-        )
+def run_native_logic(keys_path, nca_path, output_dir, log_callback, progress_callback=None, cancel_event=None):
+    """Extracts the RomFS with the built-in NCA reader instead of hactool.
 
-        stdout, stderr = process.communicate()
+    Takes the same progress and cancel arguments as run_hactool_logic.
+    """
+    romfs_output_path = romfs_output_dir(nca_path, output_dir)
+    existed_before = os.path.exists(romfs_output_path)
 
-        if stdout:
-            log_callback("--- HACTOOL OUTPUT ---")
-            log_callback(stdout.strip())
-            log_callback("----------------------")
-        
-        if stderr:
-            log_callback("\n--- HACTOOL ERRORS ---")
-            log_callback(stderr.strip())
-            log_callback("----------------------")
-        
-        if process.returncode != 0:
-            if "key" in stderr.lower():
-                log_callback("\nHint: This error might be caused by an invalid or incomplete keys file (prod.keys).")
-            elif "Is NCA file a gamecard image?" in stderr or "PFS0 magic is invalid" in stderr:
-                 log_callback("\nHint: This NCA file likely does not contain a RomFS section (e.g., it could be an update or metadata). Try the largest NCA file from the game.")
-            raise RuntimeError(f"Hactool exited with an error (code: {process.returncode}). Check the logs.")
-        
-        log_callback("\nOperation finished!")
-        if os.path.exists(romfs_output_path) and os.listdir(romfs_output_path):
-             messagebox.showinfo("Success", f"Finished extracting RomFS to:\n{romfs_output_path}")
-        else:
-             log_callback("\nINFO: Hactool finished successfully, but the RomFS directory was not created. This NCA file probably did not contain a RomFS partition.")
-             messagebox.showinfo("Finished", "Hactool completed, but no RomFS section was found to extract.")
-
-    except FileNotFoundError:
-        error_msg = f"Error: 'hactool.exe' not found!\nMake sure it is in the same folder as this script."
-        log_callback(error_msg)
-        messagebox.showerror("Critical Error", error_msg)
-    except Exception as e:
-        error_msg = f"\nAn error occurred: {e}"
-        log_callback(error_msg)
-        messagebox.showerror("Error", error_msg)
+    def progress(done, total, entry, bytes_done, total_bytes):
+        if cancel_event is not None and cancel_event.is_set():
+            raise HactoolCancelled("Extraction was cancelled.")
+        if done == total or done % 500 == 0:
+            log_callback(f"[{done}/{total}] {entry['path']}")
+        if progress_callback:
+            progress_callback(bytes_done, total_bytes)
+
+    try:
+        return extract_nca_romfs(nca_path, load_keyset(keys_path), output_dir, log_callback=log_callback, progress_callback=progress)
+    except HactoolCancelled:
+        if not existed_before:
+            shutil.rmtree(romfs_output_path, ignore_errors=True)
+            log_callback("\nCancelled; the partial RomFS directory was removed.")
+        raise
+
+def run_unpacking_logic(hactool_path, keys_path, nca_path, output_dir, log_callback, use_native=False,
+                        progress_callback=None, cancel_event=None):
+    """Runs the core hactool logic (or the built-in reader). Returns the RomFS directory, or None without a RomFS."""
+    if use_native:
+        return run_native_logic(keys_path, nca_path, output_dir, log_callback, progress_callback, cancel_event)
+    return run_hactool_logic(hactool_path, keys_path, nca_path, output_dir, log_callback, progress_callback, cancel_event)
+
+def missing_file_message(error, hactool_path, use_native):
+    """Describes a FileNotFoundError from run_unpacking_logic: a missing hactool, or the file that was missing."""
+    if not use_native and (error.filename is None or os.path.normpath(error.filename) == os.path.normpath(hactool_path)):
+        return "Error: 'hactool.exe' not found!\nMake sure it is in the same folder as this script."
+    return f"Error: file not found:\n{error.filename or error}"
 
 # --- GRAPHICAL USER INTERFACE ---
 
@@ -87,7 +59,7 @@ class HactoolGuiApp(ctk.CTk):
         ctk.set_default_color_theme("blue")
 
         self.grid_columnconfigure(0, weight=1)
-        self.grid_rowconfigure(4, weight=1)
+        self.grid_rowconfigure(6, weight=1)
 
         script_dir = os.path.dirname(os.path.abspath(__file__))
         self.hactool_path = os.path.join(script_dir, "hactool.exe")
@@ -95,6 +67,9 @@ class HactoolGuiApp(ctk.CTk):
         self.keys_path = ctk.StringVar(value=os.path.join(script_dir, "prod.keys"))
         self.nca_path = ctk.StringVar()
         self.output_dir = ctk.StringVar(value=os.getcwd())
+        self.use_native_var = ctk.BooleanVar(value=crypto_available())
+        self.cancel_event = threading.Event()
+        self.running_native = False
         
         self.create_widgets()
         self.check_initial_files()
@@ -109,17 +84,42 @@ class HactoolGuiApp(ctk.CTk):
         # Frame 3: Output Directory
         self.create_path_selection_frame(2, "3. Base Output Directory", self.output_dir, self.select_output_dir)
 
-        # Action Button
-        self.unpack_button = ctk.CTkButton(self, text="UNPACK ROMFS FROM NCA FILE", font=ctk.CTkFont(size=14, weight="bold"), command=self.start_unpacking_thread)
-        self.unpack_button.grid(row=3, column=0, padx=10, pady=20, ipady=10, sticky="ew")
+        # Built-in reader option
+        self.native_checkbox = ctk.CTkCheckBox(self, text="Use built-in NCA reader (no hactool.exe needed)", variable=self.use_native_var)
+        self.native_checkbox.grid(row=3, column=0, padx=20, pady=(5, 0), sticky="w")
+        if not crypto_available():
+            self.native_checkbox.configure(state='disabled')
+
+        # Action Buttons
+        action_frame = ctk.CTkFrame(self, fg_color="transparent")
+        action_frame.grid(row=4, column=0, padx=10, pady=(20, 5), sticky="ew")
+        action_frame.grid_columnconfigure(0, weight=1)
+
+        self.unpack_button = ctk.CTkButton(action_frame, text="UNPACK ROMFS FROM NCA FILE", font=ctk.CTkFont(size=14, weight="bold"), command=self.start_unpacking_thread)
+        self.unpack_button.grid(row=0, column=0, ipady=10, sticky="ew")
+
+        self.cancel_button = ctk.CTkButton(action_frame, text="CANCEL", width=100, state='disabled', command=self.cancel_unpacking)
+        self.cancel_button.grid(row=0, column=1, padx=(10, 0), ipady=10)
+
+        # Progress
+        progress_frame = ctk.CTkFrame(self, fg_color="transparent")
+        progress_frame.grid(row=5, column=0, padx=10, pady=(0, 10), sticky="ew")
+        progress_frame.grid_columnconfigure(0, weight=1)
+
+        self.progress_bar = ctk.CTkProgressBar(progress_frame)
+        self.progress_bar.set(0)
+        self.progress_bar.grid(row=0, column=0, sticky="ew")
+
+        self.progress_label = ctk.CTkLabel(progress_frame, text="", width=140)
+        self.progress_label.grid(row=0, column=1, padx=(10, 0))
 
         # Log Frame
         log_frame = ctk.CTkFrame(self)
-        log_frame.grid(row=4, column=0, padx=10, pady=(0, 10), sticky="nsew")
+        log_frame.grid(row=6, column=0, padx=10, pady=(0, 10), sticky="nsew")
         log_frame.grid_columnconfigure(0, weight=1)
         log_frame.grid_rowconfigure(1, weight=1)
 
-        ctk.CTkLabel(log_frame, text="Operation Log (hactool output)").grid(row=0, column=0, padx=10, pady=(5,0), sticky="w")
+        ctk.CTkLabel(log_frame, text="Operation Log").grid(row=0, column=0, padx=10, pady=(5,0), sticky="w")
         
         self.log_output = ctk.CTkTextbox(log_frame, state='disabled', wrap='word', font=("Consolas", 11))
         self.log_output.grid(row=1, column=0, padx=10, pady=10, sticky="nsew")
@@ -145,6 +145,53 @@ class HactoolGuiApp(ctk.CTk):
             self.log_output.configure(state='disabled')
         self.after(0, append_log)
 
+    def apply_events(self, update):
+        """Applies one coalesced EventChannel update; runs on the Tk main loop."""
+        if update['log']:
+            self.log_output.configure(state='normal')
+            self.log_output.insert(ctk.END, "\n".join(update['log']) + "\n")
+            self.log_output.see(ctk.END)
+            self.log_output.configure(state='disabled')
+        if update['progress'] is not None:
+            written, total, _ = update['progress']
+            self.progress_bar.set(min(1.0, written / total) if total else 0)
+            self.progress_label.configure(text=update['throughput'] or f"{written / (1024 * 1024):.0f} / {total / (1024 * 1024):.0f} MB")
+        if update['finished']:
+            self.unpack_button.configure(state='normal', text="UNPACK ROMFS FROM NCA FILE")
+            self.cancel_button.configure(state='disabled', text="CANCEL")
+            self.show_outcome(update['error'], update['result'])
+
+    def show_outcome(self, error, romfs_output_path):
+        """Reports how the run ended with a message box; runs on the Tk main loop."""
+        if error is None:
+            if romfs_output_path:
+                messagebox.showinfo("Success", f"Finished extracting RomFS to:\n{romfs_output_path}")
+            else:
+                messagebox.showinfo("Finished", "Unpacking completed, but no RomFS section was found to extract.")
+        elif isinstance(error, HactoolCancelled):
+            messagebox.showinfo("Cancelled", "Unpacking was cancelled.")
+        elif isinstance(error, FileNotFoundError):
+            error_msg = missing_file_message(error, self.hactool_path, self.running_native)
+            self.log(error_msg)
+            messagebox.showerror("Critical Error", error_msg)
+        else:
+            error_msg = f"\nAn error occurred: {error}"
+            self.log(error_msg)
+            messagebox.showerror("Error", error_msg)
+
+    def run_unpacking(self, events, *args):
+        """Runs in the worker thread; the outcome goes back through `events` to show_outcome."""
+        try:
+            romfs_output_path = run_unpacking_logic(*args)
+        except Exception as e:
+            events.finish(e)
+        else:
+            events.finish(result=romfs_output_path)
+
+    def cancel_unpacking(self):
+        self.cancel_event.set()
+        self.cancel_button.configure(state='disabled', text="CANCELLING...")
+
     def select_keys_file(self):
         path = filedialog.askopenfilename(title="Select keys file", filetypes=[("Keys Files", "*.keys"), ("All files", "*.*")])
         if path:
@@ -161,7 +208,7 @@ class HactoolGuiApp(ctk.CTk):
             self.output_dir.set(path)
 
     def check_initial_files(self):
-        if not os.path.exists(self.hactool_path):
+        if not os.path.exists(self.hactool_path) and not crypto_available():
              messagebox.showwarning("File Not Found", "hactool.exe was not found. Please make sure it is in the same folder as this script.")
         if not os.path.exists(self.keys_path.get()):
             self.log("INFO: Default 'prod.keys' file not found. Please select it manually.")
@@ -180,21 +227,21 @@ class HactoolGuiApp(ctk.CTk):
         self.log_output.configure(state='disabled')
         
         self.unpack_button.configure(state='disabled', text="WORKING...")
-        
+        self.cancel_button.configure(state='normal', text="CANCEL")
+        self.progress_bar.set(0)
+        self.progress_label.configure(text="")
+        self.cancel_event = threading.Event()
+        self.running_native = self.use_native_var.get()
+
+        # The worker only talks to the window through the channel
+        events = EventChannel()
+        events.pump(self, self.apply_events)
         thread = threading.Thread(
-            target=run_hactool_logic, 
-            args=(self.hactool_path, keys, nca, out_dir, self.log), 
+            target=self.run_unpacking, 
+            args=(events, self.hactool_path, keys, nca, out_dir, events.log, self.running_native, events.progress, self.cancel_event), 
             daemon=True
         )
         thread.start()
-        
-        self.after(100, self.check_thread, thread)
-
-    def check_thread(self, thread):
-        if thread.is_alive():
-            self.after(100, self.check_thread, thread)
-        else:
-            self.unpack_button.configure(state='normal', text="UNPACK ROMFS FROM NCA FILE")
 
 if __name__ == "__main__":
     app = HactoolGuiApp()
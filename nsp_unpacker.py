@@ -1,72 +1,10 @@
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
-import struct
 import os
+import threading
 
-# --- CORE UNPACKING LOGIC ---
-
-def unpack_pfs0_logic(pfs0_data, output_dir):
-    logs = []
-    
-    if len(pfs0_data) < 16:
-        logs.append("Error: File is too small to be a valid PFS0 container.")
-        return logs
-
-    try:
-        magic, file_count, string_table_size, _ = struct.unpack('<IIII', pfs0_data[0:16])
-        
-        if magic != 0x30534650:
-            decoded_magic = pfs0_data[0:4].decode('ascii', 'ignore')
-            raise ValueError(f"Invalid PFS0 file. Expected 'PFS0', found: '{decoded_magic}'")
-    except (struct.error, ValueError) as e:
-        logs.append(f"Error: Could not process PFS0 header. {e}")
-        return logs
-
-    logs.append(f"PFS0 header found. File count: {file_count}")
-
-    file_entries = []
-    header_size = 16
-    file_entry_table_size = file_count * 24
-    
-    for i in range(file_count):
-        entry_offset = header_size + (i * 24)
-        data_offset, size, string_offset, _ = struct.unpack('<QQII', pfs0_data[entry_offset:entry_offset+24])
-        file_entries.append({'data_offset': data_offset, 'size': size, 'string_offset': string_offset})
-
-    string_table_start = header_size + file_entry_table_size
-    string_table = pfs0_data[string_table_start : string_table_start + string_table_size]
-
-    for entry in file_entries:
-        end_of_string = string_table.find(b'\x00', entry['string_offset'])
-        filename_bytes = string_table[entry['string_offset']:end_of_string]
-        entry['filename'] = filename_bytes.decode('utf-8')
-
-    data_section_start = string_table_start + string_table_size
-    
-    extracted_count = 0
-    for entry in file_entries:
-        filename = entry['filename']
-        start = data_section_start + entry['data_offset']
-        end = start + entry['size']
-
-        if end > len(pfs0_data):
-            logs.append(f"Skipped: {filename} (data is outside the file bounds - likely a reference).")
-            continue
-
-        file_data = pfs0_data[start:end]
-        output_path = os.path.join(output_dir, filename)
-
-        try:
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            with open(output_path, 'wb') as f:
-                f.write(file_data)
-            logs.append(f"Extracted: {filename} ({entry['size']} bytes)")
-            extracted_count += 1
-        except IOError as e:
-            logs.append(f"Error writing file {filename}: {e}")
-            
-    logs.append(f"\nOperation finished. Extracted {extracted_count} of {file_count} files.")
-    return logs
+from za_tools.events import EventChannel
+from za_tools.pfs0 import extract_pfs0
 
 # --- GRAPHICAL USER INTERFACE ---
 
@@ -81,7 +19,7 @@ class PFS0UnpackerApp(ctk.CTk):
         ctk.set_default_color_theme("blue")
 
         self.grid_columnconfigure(0, weight=1)
-        self.grid_rowconfigure(3, weight=1)
+        self.grid_rowconfigure(4, weight=1)
 
         self.input_file_path = ctk.StringVar()
         self.output_dir_path = ctk.StringVar(value=os.getcwd())
@@ -118,9 +56,21 @@ class PFS0UnpackerApp(ctk.CTk):
         self.btn_unpack = ctk.CTkButton(self, text="UNPACK FILE", font=ctk.CTkFont(size=14, weight="bold"), command=self.start_unpacking)
         self.btn_unpack.grid(row=2, column=0, padx=10, pady=20, ipady=10)
 
+        # Progress
+        progress_frame = ctk.CTkFrame(self, fg_color="transparent")
+        progress_frame.grid(row=3, column=0, padx=10, pady=(0, 5), sticky="ew")
+        progress_frame.grid_columnconfigure(0, weight=1)
+
+        self.progress_bar = ctk.CTkProgressBar(progress_frame)
+        self.progress_bar.set(0)
+        self.progress_bar.grid(row=0, column=0, sticky="ew")
+
+        self.progress_label = ctk.CTkLabel(progress_frame, text="", width=180)
+        self.progress_label.grid(row=0, column=1, padx=(10, 0))
+
         # Log Frame
         log_frame = ctk.CTkFrame(self)
-        log_frame.grid(row=3, column=0, padx=10, pady=(5,10), sticky="nsew")
+        log_frame.grid(row=4, column=0, padx=10, pady=(5,10), sticky="nsew")
         log_frame.grid_rowconfigure(1, weight=1)
         log_frame.grid_columnconfigure(0, weight=1)
         
@@ -134,7 +84,31 @@ class PFS0UnpackerApp(ctk.CTk):
         self.log_output.insert(ctk.END, message + "\n")
         self.log_output.see(ctk.END)
         self.log_output.configure(state='disabled')
-        self.update_idletasks()
+
+    def apply_events(self, update):
+        """Applies one coalesced EventChannel update; runs on the Tk main loop."""
+        if update['log']:
+            # One insert per tick, however many lines the worker logged
+            self.log("\n".join(update['log']))
+        if update['progress'] is not None:
+            bytes_done, total_bytes, _ = update['progress']
+            self.progress_bar.set(bytes_done / total_bytes if total_bytes else 0)
+            self.progress_label.configure(text=update['throughput'])
+        if update['finished']:
+            self.btn_unpack.configure(state='normal', text="UNPACK FILE")
+            self.progress_label.configure(text="")
+            error = update['error']
+            if error is None:
+                messagebox.showinfo("Success", "Operation completed. Check logs for details.")
+            elif isinstance(error, ValueError):
+                self.log(f"Error: Could not process PFS0 header. {error}")
+                messagebox.showerror("Error", f"Could not process PFS0 header: {error}")
+            elif isinstance(error, IOError):
+                messagebox.showerror("File Read Error", f"Could not read the input file: {error}")
+                self.log(f"Critical read error: {error}")
+            else:
+                messagebox.showerror("Critical Error", f"An unexpected error occurred: {error}")
+                self.log(f"Critical error: {error}")
 
     def select_input_file(self):
         filepath = filedialog.askopenfilename(
@@ -170,22 +144,23 @@ class PFS0UnpackerApp(ctk.CTk):
             return
 
         self.log(f"Starting to unpack: {os.path.basename(input_path)}...")
-        
+        self.btn_unpack.configure(state='disabled', text="WORKING...")
+        self.progress_bar.set(0)
+
+        # Unpack on a worker thread; it only talks to the window through the channel
+        events = EventChannel()
+        events.pump(self, self.apply_events)
+        threading.Thread(target=self.run_unpacking, args=(events, input_path, output_dir), daemon=True).start()
+
+    def run_unpacking(self, events, input_path, output_dir):
+        def on_progress(done, total, entry, bytes_done, total_bytes):
+            events.progress(bytes_done, total_bytes)
+
         try:
-            with open(input_path, 'rb') as f:
-                pfs0_binary_data = f.read()
-            
-            result_logs = unpack_pfs0_logic(pfs0_binary_data, output_dir)
-            for line in result_logs:
-                self.log(line)
-            messagebox.showinfo("Success", "Operation completed. Check logs for details.")
-
-        except IOError as e:
-            messagebox.showerror("File Read Error", f"Could not read the input file: {e}")
-            self.log(f"Critical read error: {e}")
+            extract_pfs0(input_path, output_dir, events.log, on_progress)
+            events.finish()
         except Exception as e:
-            messagebox.showerror("Critical Error", f"An unexpected error occurred: {e}")
-            self.log(f"Critical error: {e}")
+            events.finish(e)
 
 if __name__ == "__main__":
     app = PFS0UnpackerApp()
@@ -1,70 +1,11 @@
 import os
-import struct
-import sys
 import traceback
 import threading
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
 
-# --- FNV-1a HASHING IMPLEMENTATION ---
-def fnv1a_64_hash(data: bytes) -> int:
-    """Computes the 64-bit FNV-1a hash of the given data."""
-    PRIME = 0x100000001b3
-    BASIS = 0xcbf29ce484222645
-    h = BASIS
-    for byte in data:
-        h ^= byte
-        h = (h * PRIME) & 0xFFFFFFFFFFFFFFFF
-    return h
-
-# --- SAFE READ FUNCTIONS ---
-def read_u32(f):
-    data = f.read(4)
-    return struct.unpack('<I', data)[0] if len(data) == 4 else 0
-
-def read_u64(f):
-    data = f.read(8)
-    return struct.unpack('<Q', data)[0] if len(data) == 8 else 0
-
-def read_string(f):
-    length = read_u32(f)
-    return f.read(length).decode('utf-8', 'ignore')
-
-def read_vec_u64(f_handle, count):
-    return [read_u64(f_handle) for _ in range(count)]
-
-# --- PARSER CLASSES ---
-class NameIndex:
-    """Parses a .trpfd file to extract package names and their hashes."""
-    def __init__(self, fname):
-        self.pack_infos = []
-        with open(fname, 'rb') as f:
-            f.seek(0x1C)
-            base = 0x1C + read_u32(f)
-            f.seek(base)
-            count = read_u32(f)
-            rel_offsets = [read_u32(f) for _ in range(count)]
-            offsets = [base + 4 + (i * 4) + rel_off for i, rel_off in enumerate(rel_offsets)]
-            for off in offsets:
-                f.seek(off)
-                name = read_string(f)
-                hash_val = fnv1a_64_hash(name.encode('utf-8'))
-                self.pack_infos.append({'name': name, 'hash': hash_val})
-
-class DataArchiveMap:
-    """Parses a .trpfs file to map package hashes to their file offsets."""
-    def __init__(self, fname):
-        with open(fname, 'rb') as f:
-            if f.read(8) != b"ONEPACK\0":
-                raise IOError("Invalid .trpfs signature")
-            offsets_start = read_u64(f)
-            f.seek(offsets_start + 28)
-            pack_count = read_u32(f)
-            pack_offsets = read_vec_u64(f, pack_count)
-            f.seek(f.tell() + 4)
-            pack_hash_count = read_u32(f)
-            pack_hashes = read_vec_u64(f, pack_hash_count)
-            self.pack_hash_to_offset = {h: offset for h, offset in zip(pack_hashes, pack_offsets)}
+from za_tools.events import EventChannel
+from za_tools.slicer import DEFAULT_WORKERS, extract_trpfs
 
 # --- GUI APPLICATION ---
 class BrutalSlicerApp(ctk.CTk):
@@ -72,7 +13,7 @@ class BrutalSlicerApp(ctk.CTk):
         super().__init__()
 
         self.title("TRPFS Unpacker")
-        self.geometry("700x400")
+        self.geometry("700x500")
         ctk.set_appearance_mode("dark")
         ctk.set_default_color_theme("blue")
         
@@ -103,18 +44,34 @@ class BrutalSlicerApp(ctk.CTk):
         self.output_button = ctk.CTkButton(self, text="Browse", width=100, command=self.browse_output)
         self.output_button.grid(row=2, column=2, padx=20, pady=10)
 
+        # Worker Count
+        self.workers_label = ctk.CTkLabel(self, text="Workers:")
+        self.workers_label.grid(row=3, column=0, padx=20, pady=10, sticky="w")
+        self.workers_entry = ctk.CTkEntry(self, width=80)
+        self.workers_entry.insert(0, str(DEFAULT_WORKERS))
+        self.workers_entry.grid(row=3, column=1, padx=20, pady=10, sticky="w")
+        self.unpack_trpak_var = ctk.BooleanVar(value=False)
+        self.unpack_trpak_check = ctk.CTkCheckBox(self, text="Unpack .trpak contents", variable=self.unpack_trpak_var)
+        self.unpack_trpak_check.grid(row=3, column=2, padx=20, pady=10, sticky="w")
+
+        # Pack Filter
+        self.filter_label = ctk.CTkLabel(self, text="Filter:")
+        self.filter_label.grid(row=4, column=0, padx=20, pady=10, sticky="w")
+        self.filter_entry = ctk.CTkEntry(self, placeholder_text="Optional names, prefixes or globs, e.g. arc/pokemon/** (space separated)")
+        self.filter_entry.grid(row=4, column=1, columnspan=2, padx=20, pady=10, sticky="ew")
+
         # Start Button
         self.start_button = ctk.CTkButton(self, text="Start Extraction", command=self.start_extraction_thread)
-        self.start_button.grid(row=3, column=0, columnspan=3, padx=20, pady=20)
+        self.start_button.grid(row=5, column=0, columnspan=3, padx=20, pady=20)
 
         # Status Label
         self.status_label = ctk.CTkLabel(self, text="Ready. Please select files and an output directory.")
-        self.status_label.grid(row=4, column=0, columnspan=3, padx=20, pady=10, sticky="w")
+        self.status_label.grid(row=6, column=0, columnspan=3, padx=20, pady=10, sticky="w")
 
         # Progress Bar
         self.progress_bar = ctk.CTkProgressBar(self)
         self.progress_bar.set(0)
-        self.progress_bar.grid(row=5, column=0, columnspan=3, padx=20, pady=20, sticky="ew")
+        self.progress_bar.grid(row=7, column=0, columnspan=3, padx=20, pady=20, sticky="ew")
 
     def browse_trpfd(self):
         path = filedialog.askopenfilename(title="Select data.trpfd", filetypes=[("TRPFD files", "*.trpfd"), ("All files", "*.*")])
@@ -136,18 +93,31 @@ class BrutalSlicerApp(ctk.CTk):
 
     def update_status(self, message):
         self.status_label.configure(text=message)
-        self.update_idletasks()
 
     def update_progress(self, value):
         self.progress_bar.set(value)
-        self.update_idletasks()
+
+    def apply_events(self, update):
+        """Applies one coalesced EventChannel update; runs on the Tk main loop."""
+        if update['progress'] is not None:
+            bytes_done, total_bytes, text = update['progress']
+            self.update_progress(bytes_done / total_bytes if total_bytes else 0)
+            self.update_status(f"{text}  {update['throughput']}".rstrip())
+        if update['status'] is not None:
+            self.update_status(update['status'])
+        if update['finished']:
+            self.start_button.configure(state="normal", text="Start Extraction")
+            self.update_progress(0)
+            error = update['error']
+            if error is None:
+                self.update_status("Extraction completed successfully!")
+                messagebox.showinfo("Success", "Raw extraction has finished successfully.")
+            else:
+                self.update_status(f"Error: {error}")
+                error_message = "A critical error occurred:\n\n" + "".join(traceback.format_exception(type(error), error, error.__traceback__))
+                messagebox.showerror("Critical Error", error_message)
 
     def start_extraction_thread(self):
-        # Run the extraction in a separate thread to keep the GUI responsive
-        threading.Thread(target=self.run_extraction, daemon=True).start()
-    
-    def run_extraction(self):
-        """The core extraction logic, adapted from the console script."""
         trpfd_path = self.trpfd_path.get()
         trpfs_path = self.trpfs_path.get()
         output_path_base = self.output_dir.get()
@@ -162,73 +132,37 @@ class BrutalSlicerApp(ctk.CTk):
         if not os.path.isfile(trpfs_path):
             messagebox.showerror("Error", f"TRPFS file not found:\n{trpfs_path}")
             return
+        try:
+            workers = int(self.workers_entry.get())
+            if workers < 1:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Error", "Workers must be a positive whole number.")
+            return
+        patterns = self.filter_entry.get().split()
+        unpack_trpak = self.unpack_trpak_var.get()
 
         self.start_button.configure(state="disabled", text="Extracting...")
         self.update_progress(0)
 
+        # Run the extraction in a separate thread to keep the GUI responsive; the
+        # worker only talks to the window through the channel
+        events = EventChannel()
+        events.pump(self, self.apply_events)
+        threading.Thread(target=self.run_extraction, args=(events, trpfd_path, trpfs_path, output_path_base, workers, patterns, unpack_trpak), daemon=True).start()
+    
+    def run_extraction(self, events, trpfd_path, trpfs_path, output_path_base, workers, patterns, unpack_trpak=False):
+        """Runs the headless TRPFS extraction and reports its progress through `events`."""
         try:
-            # --- Step 1: Parse metadata files ---
-            self.update_status("[Step 1/3] Parsing metadata files...")
-            name_index = NameIndex(trpfd_path)
-            data_map = DataArchiveMap(trpfs_path)
-            os.makedirs(output_path_base, exist_ok=True)
-            self.update_status(f"  > Found {len(name_index.pack_infos)} package names in .trpfd")
-            
-            # --- Step 2: Create and sort the package map ---
-            self.update_status("[Step 2/3] Mapping and sorting packages...")
-            pack_map = []
-            for info in name_index.pack_infos:
-                offset = data_map.pack_hash_to_offset.get(info['hash'])
-                if offset is not None:
-                    pack_map.append({'name': info['name'], 'offset': offset})
-            
-            # Sorting by offset is KEY to calculating the size of each pack
-            pack_map.sort(key=lambda p: p['offset'])
-            total_packs = len(pack_map)
-            self.update_status(f"  > Successfully mapped and sorted {total_packs} packages.")
-
-            # --- Step 3: Begin full raw extraction ---
-            self.update_status(f"[Step 3/3] Starting full raw extraction of {total_packs} packages...")
-
-            with open(trpfs_path, 'rb') as f_trpfs:
-                for i in range(total_packs):
-                    current_pack = pack_map[i]
-                    start_offset = current_pack['offset']
-                    
-                    # Determine the end of the block
-                    if i + 1 < total_packs:
-                        next_pack = pack_map[i+1]
-                        end_offset = next_pack['offset']
-                    else:
-                        # The last pack goes to the end of the file
-                        end_offset = os.path.getsize(trpfs_path)
-                    
-                    slice_size = end_offset - start_offset
-                    pack_name = current_pack['name']
-                    
-                    progress_val = (i + 1) / total_packs
-                    self.update_progress(progress_val)
-                    self.update_status(f"Extracting {i+1}/{total_packs}: {pack_name} ({slice_size/1024:.1f} KB)")
-
-                    f_trpfs.seek(start_offset)
-                    pack_data = f_trpfs.read(slice_size)
-                    
-                    output_file_path = os.path.join(output_path_base, pack_name.replace('/', os.sep))
-                    os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
-                    with open(output_file_path, 'wb') as out_f:
-                        out_f.write(pack_data)
-
-            self.update_status("Extraction completed successfully!")
-            messagebox.showinfo("Success", "Full raw extraction has finished successfully.")
+            def on_progress(done, total, pack, bytes_done, total_bytes):
+                events.progress(bytes_done, total_bytes, f"Extracting {done}/{total}: {pack['name']} ({pack['size']/1024:.1f} KB)")
 
-        except Exception as e:
-            error_message = f"A critical error occurred:\n\n{traceback.format_exc()}"
-            self.update_status(f"Error: {e}")
-            messagebox.showerror("Critical Error", error_message)
+            extract_trpfs(trpfd_path, trpfs_path, output_path_base, patterns, workers, on_progress, events.status,
+                          unpack_trpak=unpack_trpak)
+            events.finish()
 
-        finally:
-            self.start_button.configure(state="normal", text="Start Extraction")
-            self.update_progress(0)
+        except Exception as e:
+            events.finish(e)
 
 
 if __name__ == "__main__":
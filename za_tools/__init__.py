@@ -0,0 +1,22 @@
+"""GUI-free core of the Pokemon Legends Z-A tools: PFS0 (NSP), NCA/RomFS and TRPFS operations."""
+
+from .dedup import OutputWriter
+from .diff import diff_trpfs, write_patch_set
+from .events import EventChannel, RateMeter
+from .fileio import PositionalReader, RangeReader
+from .hashing import fnv1a_64_hash, fnv1a_64_hash_many
+from .hactool import HactoolCancelled, HactoolError, find_hactool, list_romfs, run_hactool_logic, verify_nca
+from .inventory import inventory_packs, select_from_catalog, write_catalog
+from .index_cache import PackIndex, load_pack_index
+from .nca import NcaError, NcaReader, extract_nca_romfs, list_nca_romfs, load_keyset, verify_nca_romfs
+from .pack_table import PackTable
+from .packer import pack_directory, update_trpfs
+from .pfs0 import extract_pfs0, list_pfs0, read_pfs0_header, unpack_pfs0_logic, verify_pfs0
+from .pipeline import NspGame, extract_nsp_trpfs
+from .profiling import PROFILER, enable_output
+from .romfs import RomFS, RomFSError
+from .selection import select_packs
+from .slicer import DEFAULT_WORKERS, extract_packs, extract_trpfs, gap_report, load_selected_packs, verify_trpfs
+from .trpak import extract_trpak, list_trpak, parse_trpak
+from .trpfs import DataArchiveMap, NameIndex, TrpfsError, build_pack_map, build_pack_table, scan_gaps
+from .vfs import PackFile, TrpfsFS
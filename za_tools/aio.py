@@ -0,0 +1,109 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Blocking file operations kept in flight at once. Creating many small files is
+# latency-bound on network and overlay filesystems, so this is well above the
+# number of cores.
+DEFAULT_QUEUE_DEPTH = 64
+# Small jobs are handed to a thread in batches of up to this many bytes (and
+# BATCH_MAX_JOBS jobs), so the event loop is not woken once per tiny file
+BATCH_BYTES = 1024 * 1024
+BATCH_MAX_JOBS = 32
+
+def available():
+    """True if run_jobs can start an event loop here (not inside an already running one)."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return True
+    return False
+
+# --- DIRECTORIES ---
+def _mkdir(path):
+    try:
+        os.mkdir(path)
+    except FileExistsError:
+        pass
+
+def directory_levels(directories, root):
+    """Returns every directory needed for `directories` under `root`, grouped by depth, shallowest first.
+
+    The directories of one level do not depend on each other, so each level can be
+    created with all its mkdir calls in flight at once.
+    """
+    root = os.path.normpath(root)
+    needed = set()
+    for directory in directories:
+        directory = os.path.normpath(directory)
+        while directory != root and directory not in needed and len(directory) > len(root):
+            needed.add(directory)
+            directory = os.path.dirname(directory)
+    levels = {}
+    for directory in needed:
+        levels.setdefault(directory.count(os.sep), []).append(directory)
+    return [sorted(levels[depth]) for depth in sorted(levels)]
+
+# --- ENGINE ---
+def _mkdirs(paths):
+    for path in paths:
+        _mkdir(path)
+
+def _run_batch(batch):
+    return [(key, function(*args)) for key, function, args, _ in batch]
+
+def _next_batch(jobs):
+    """Takes jobs from the shared iterator until BATCH_BYTES or BATCH_MAX_JOBS is reached."""
+    batch = []
+    nbytes = 0
+    for job in jobs:
+        batch.append(job)
+        nbytes += job[3]
+        if nbytes >= BATCH_BYTES or len(batch) >= BATCH_MAX_JOBS:
+            break
+    return batch
+
+async def _run(jobs, queue_depth, on_done, levels):
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=queue_depth) as pool:
+        for level in levels:
+            await asyncio.gather(*(loop.run_in_executor(pool, _mkdirs, level[i::queue_depth])
+                                   for i in range(min(queue_depth, len(level)))))
+
+        async def lane():
+            # Lanes share one iterator, so jobs are only produced as a lane frees up
+            while True:
+                batch = _next_batch(jobs)
+                if not batch:
+                    return
+                for key, result in await loop.run_in_executor(pool, _run_batch, batch):
+                    if on_done:
+                        on_done(key, result)
+
+        lanes = [asyncio.ensure_future(lane()) for _ in range(queue_depth)]
+        try:
+            await asyncio.gather(*lanes)
+        except BaseException:
+            for task in lanes:
+                task.cancel()
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+
+def run_jobs(jobs, queue_depth=DEFAULT_QUEUE_DEPTH, on_done=None, directories=(), root=None):
+    """Runs blocking `jobs` with up to `queue_depth` threads working on them at once.
+
+    Each job is a (key, function, args, nbytes) tuple. An asyncio loop drives
+    `queue_depth` lanes; each lane hands the next jobs (one large one, or small ones
+    up to BATCH_BYTES) to a thread pool of the same size, so file creates, writes and
+    closes overlap instead of waiting on each other. `jobs` may be a lazy iterator; it
+    is consumed in the calling thread. `directories` under `root` are created first,
+    one depth level at a time with the mkdirs of a level spread over the pool.
+    `on_done(key, result)` is called in the calling thread as jobs finish; the first
+    exception stops the run and is raised. Check available() first: this cannot run
+    inside a running event loop.
+    """
+    levels = []
+    if directories:
+        os.makedirs(root, exist_ok=True)
+        levels = directory_levels(directories, root)
+    asyncio.run(_run(iter(jobs), max(1, queue_depth), on_done, levels))
@@ -0,0 +1,98 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .nca import extract_nca_romfs
+from .pfs0 import extract_pfs0
+from .pipeline import extract_nsp_trpfs
+
+BATCH_EXTENSIONS = ('.nsp', '.nca')
+DEFAULT_IO_JOBS = 2
+DEFAULT_CPU_JOBS = max(1, min(4, os.cpu_count() or 1))
+
+# --- JOB PLANNING ---
+def collect_inputs(paths):
+    """Expands directories (recursively) and '@list.txt' files into a sorted list of .nsp/.nca paths."""
+    inputs = []
+    for path in paths:
+        if path.startswith('@'):
+            with open(path[1:], encoding='utf-8') as f:
+                inputs.extend(collect_inputs([line.strip() for line in f if line.strip()]))
+        elif os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                inputs.extend(os.path.join(root, name) for name in files if name.lower().endswith(BATCH_EXTENSIONS))
+        else:
+            inputs.append(path)
+    return sorted(dict.fromkeys(os.path.normpath(p) for p in inputs))
+
+def plan_batch(inputs, output_dir, slice_nsp=False):
+    """Returns one job dict per input with its kind and a unique output directory.
+
+    NSPs are unpacked ('pfs0', disk-bound) or, with `slice_nsp`, sliced into TRPFS packs
+    ('slice'); NCAs get their RomFS extracted ('nca'). The last two are decryption-bound.
+    Inputs with the same file name (e.g. base game and update) get '-2', '-3'... suffixes.
+    """
+    jobs = []
+    used = set()
+    for path in inputs:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        name, n = stem, 1
+        while name.lower() in used:
+            n += 1
+            name = f"{stem}-{n}"
+        used.add(name.lower())
+        if path.lower().endswith('.nca'):
+            kind = 'nca'
+        else:
+            kind = 'slice' if slice_nsp else 'pfs0'
+        jobs.append({'input': path, 'kind': kind, 'output': os.path.join(output_dir, name)})
+    return jobs
+
+# --- JOB RUNNER ---
+def _run_job(job, keyset, patterns, slice_workers):
+    """Runs one job and returns the number of bytes it wrote (the input size for NCAs)."""
+    os.makedirs(job['output'], exist_ok=True)
+    if job['kind'] == 'pfs0':
+        result = extract_pfs0(job['input'], job['output'])
+        if result['errors']:
+            raise IOError(f"{len(result['errors'])} entries failed, first: {result['errors'][0]['error']}")
+        return sum(entry['size'] for entry in result['extracted'])
+    if keyset is None:
+        raise ValueError("a keys file is needed to decrypt this input")
+    if job['kind'] == 'nca':
+        extract_nca_romfs(job['input'], keyset, job['output'], patterns)
+        return os.path.getsize(job['input'])
+    packs, _ = extract_nsp_trpfs(job['input'], keyset, job['output'], patterns, slice_workers)
+    return sum(pack['size'] for pack in packs)
+
+def run_batch(jobs, keyset=None, io_jobs=DEFAULT_IO_JOBS, cpu_jobs=DEFAULT_CPU_JOBS, patterns=None,
+              progress_callback=None, slice_workers=2):
+    """Runs the planned jobs concurrently and returns one result dict per job, in job order.
+
+    At most `io_jobs` disk-bound jobs (plain NSP unpacking) and `cpu_jobs` decrypting
+    jobs run at the same time, so large copies do not oversubscribe the disk while the
+    CPU-bound jobs keep the cores busy. A failing job does not stop the others; its
+    error is recorded. `progress_callback(done, total, result)` is called from the
+    calling thread as jobs finish.
+    """
+    def run(job):
+        start = time.perf_counter()
+        result = {'input': job['input'], 'kind': job['kind'], 'output': job['output'], 'ok': True, 'error': None, 'bytes': 0}
+        try:
+            result['bytes'] = _run_job(job, keyset, patterns, slice_workers)
+        except Exception as e:
+            result['ok'] = False
+            result['error'] = str(e)
+        result['seconds'] = time.perf_counter() - start
+        return result
+
+    results = [None] * len(jobs)
+    # One pool per resource, so queued jobs of one kind never hold back the other
+    with ThreadPoolExecutor(max_workers=max(1, io_jobs)) as io_pool, \
+            ThreadPoolExecutor(max_workers=max(1, cpu_jobs)) as cpu_pool:
+        futures = {(io_pool if job['kind'] == 'pfs0' else cpu_pool).submit(run, job): i for i, job in enumerate(jobs)}
+        for done, future in enumerate(as_completed(futures), 1):
+            results[futures[future]] = future.result()
+            if progress_callback:
+                progress_callback(done, len(jobs), results[futures[future]])
+    return results
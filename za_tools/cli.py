@@ -0,0 +1,450 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from . import aio, batch, diff, hactool, inventory, nca, packer, pfs0, pipeline, profiling, selftest, slicer, trpak, verify, vfs
+from .dedup import DEDUP_MODES, OutputWriter
+from .keys import MissingKeyError
+from .selection import compile_patterns, select_packs
+
+# --- INPUT DETECTION ---
+def detect_format(path):
+    """Returns 'pfs0', 'trpfs', 'trpak' or 'nca' for an input file, based on its magic and extension."""
+    with open(path, 'rb') as f:
+        magic = f.read(8)
+    if magic[:4] == b"PFS0":
+        return 'pfs0'
+    if magic == b"ONEPACK\0" or path.lower().endswith(('.trpfs', '.trpfd')):
+        return 'trpfs'
+    if path.lower().endswith('.nca'):
+        return 'nca'
+    if path.lower().endswith('.trpak'):
+        return 'trpak'
+    raise ValueError(f"Unrecognised input format: {path}")
+
+def _trpfs_pair(path, trpfd=None):
+    """Resolves the (data.trpfd, data.trpfs) pair from either file and an optional explicit data.trpfd."""
+    if path.lower().endswith('.trpfd'):
+        trpfd = path
+        trpfs = os.path.splitext(path)[0] + '.trpfs'
+    else:
+        trpfs = path
+        trpfd = trpfd or os.path.splitext(path)[0] + '.trpfd'
+    for candidate in (trpfd, trpfs):
+        if not os.path.isfile(candidate):
+            raise FileNotFoundError(f"File not found: {candidate}")
+    return trpfd, trpfs
+
+def _trpfs_paths(args):
+    """Resolves the (data.trpfd, data.trpfs) pair from the input and the optional --trpfd."""
+    return _trpfs_pair(args.input, args.trpfd)
+
+def _trpak_names(args):
+    return trpak.load_name_list(args.names) if args.names else None
+
+def _keyset(args):
+    return nca.load_keyset(args.keys, args.title_keys)
+
+def _hactool_args(args):
+    hactool_path = args.hactool or hactool.find_hactool(os.getcwd())
+    if not hactool_path:
+        raise FileNotFoundError("hactool was not found; pass --hactool")
+    return hactool_path, args.keys
+
+# --- OUTPUT ---
+def _emit(args, data, text_lines):
+    if args.json:
+        json.dump(data, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        for line in text_lines:
+            print(line)
+
+def _report_failed(report):
+    return any(report.get(key) for key in ('missing', 'size_mismatch', 'hash_mismatch', 'cnmt_mismatch'))
+
+def _report_lines(report):
+    lines = [f"OK: {len(report['ok'])}"]
+    for name in report['missing']:
+        lines.append(f"MISSING: {name}")
+    for item in report['size_mismatch']:
+        lines.append(f"SIZE MISMATCH: {item['name']} (expected {item['expected']}, found {item['actual']})")
+    for item in report.get('hash_mismatch', []):
+        lines.append(f"HASH MISMATCH: {item['name']}")
+    if 'cnmt_checked' in report:
+        lines.append(f"CNMT SHA-256 checked: {report['cnmt_checked']}")
+    for item in report.get('cnmt_mismatch', []):
+        lines.append(f"CNMT MISMATCH: {item['name']} (expected {item['expected']}, found {item['actual']})")
+    for name in report.get('skipped', []):
+        lines.append(f"SKIPPED: {name}")
+    return lines
+
+# --- COMMANDS ---
+def cmd_list(args):
+    kind = detect_format(args.input)
+    if kind == 'pfs0':
+        entries = pfs0.list_pfs0(args.input)
+        _emit(args, entries, [f"{e['offset']:#014x} {e['size']:>14} {e['filename']}" for e in entries])
+    elif kind == 'trpfs':
+        trpfd, trpfs = _trpfs_paths(args)
+        packs = slicer.load_selected_packs(trpfd, trpfs, args.patterns, not args.no_cache)
+        _emit(args, packs, [f"{p['offset']:#014x} {p['size']:>12} {p['name']}" for p in packs])
+    elif kind == 'trpak':
+        entries = trpak.list_trpak(args.input, _trpak_names(args))
+        _emit(args, entries, [f"{e['hash']:016x} {e['codec']:>9} {e['data_size']:>12} -> {e['size']:>12} {e['name'] or ''}" for e in entries])
+    elif args.hactool:
+        paths = hactool.list_romfs(*_hactool_args(args), args.input)
+        _emit(args, paths, paths)
+    else:
+        entries = [e for e in nca.list_nca_romfs(args.input, _keyset(args)) if compile_patterns(args.patterns)(e['path'])]
+        _emit(args, entries, [f"{e['size']:>14} {e['path']}" for e in entries])
+    return 0
+
+def _output_writer(args):
+    if args.dedup or args.sparse:
+        return OutputWriter(args.dedup, args.sparse)
+    return None
+
+def _saved_line(stats):
+    if 'bytes_saved' not in stats:
+        return []
+    return [f"Saved {stats['bytes_saved'] / (1024 * 1024):.1f} MB on disk ({stats['linked']} duplicates linked)"]
+
+def cmd_extract(args):
+    kind = detect_format(args.input)
+    os.makedirs(args.output, exist_ok=True)
+    log = (lambda message: None) if args.json else print
+    if kind == 'pfs0':
+        result = pfs0.extract_pfs0(args.input, args.output, log, output_writer=_output_writer(args),
+                                   queue_depth=args.queue_depth)
+        if args.json:
+            _emit(args, result, [])
+        return 1 if result['errors'] else 0
+    if kind == 'trpfs':
+        trpfd, trpfs = _trpfs_paths(args)
+
+        def progress(done, total, pack, bytes_done, total_bytes):
+            log(f"[{done}/{total}] {pack['name']} ({pack['size']/1024:.1f} KB)")
+
+        packs, stats = slicer.extract_trpfs(trpfd, trpfs, args.output, args.patterns, args.jobs,
+                                            progress, log, not args.no_cache, not args.no_manifest, args.force,
+                                            args.unpack_trpak, _trpak_names(args), _output_writer(args), args.queue_depth)
+        if args.unpack_trpak:
+            _emit(args, {'selected': len(packs), 'output': args.output, **stats},
+                  [f"Unpacked {stats['extracted']} files from {len(packs)} packs to {args.output} ({len(stats['errors'])} errors)"]
+                  + [f"ERROR: {e['pack']}: {e.get('hash', '')} {e['error']}" for e in stats['errors']])
+            return 1 if stats['errors'] else 0
+        _emit(args, {'selected': len(packs), 'bytes': sum(p['size'] for p in packs), 'output': args.output, **stats},
+              [f"Extracted {len(packs)} packs to {args.output} ({stats['written']} written, {stats['skipped']} up to date)"]
+              + _saved_line(stats))
+        return 0
+    if kind == 'trpak':
+        result = trpak.extract_trpak(args.input, args.output, _trpak_names(args))
+        _emit(args, result, [f"Extracted {len(result['extracted'])} files to {args.output}"]
+              + [f"ERROR: {e['hash']} ({e['codec']}): {e['error']}" for e in result['errors']])
+        return 1 if result['errors'] else 0
+    if args.hactool:
+        def progress(written, total):
+            log(f"[{written / (1024 * 1024):.0f}/{total / (1024 * 1024):.0f} MB]")
+
+        romfs = hactool.run_hactool_logic(*_hactool_args(args), args.input, args.output, log, progress)
+    else:
+        def progress(done, total, entry, bytes_done, total_bytes):
+            log(f"[{done}/{total}] {entry['path']} ({entry['size']/1024:.1f} KB)")
+
+        romfs = nca.extract_nca_romfs(args.input, _keyset(args), args.output, args.patterns, log, progress)
+    _emit(args, {'romfs': romfs}, [])
+    return 0
+
+def cmd_verify(args):
+    kind = detect_format(args.input)
+    if kind == 'trpak':
+        raise ValueError("verify does not support standalone .trpak files")
+    if kind == 'pfs0':
+        report = pfs0.verify_pfs0(args.input, args.output, args.hash, args.jobs)
+    elif kind == 'trpfs':
+        trpfd, trpfs = _trpfs_paths(args)
+        report = slicer.verify_trpfs(trpfd, trpfs, args.output, args.patterns, not args.no_cache, args.hash, args.jobs)
+    elif args.hactool:
+        ok, output = hactool.verify_nca(*_hactool_args(args), args.input)
+        _emit(args, {'ok': ok, 'output': output}, [output])
+        return 0 if ok else 1
+    else:
+        report = nca.verify_nca_romfs(args.input, _keyset(args), args.output, args.patterns)
+        _emit(args, report, report['header_problems'] + _report_lines(report))
+        return 1 if report['header_problems'] or _report_failed(report) else 0
+    _emit(args, report, _report_lines(report))
+    return 1 if _report_failed(report) else 0
+
+def cmd_slice(args):
+    if detect_format(args.input) != 'pfs0':
+        raise ValueError("slice needs an NSP (PFS0) file")
+    os.makedirs(args.output, exist_ok=True)
+    log = (lambda message: None) if args.json else print
+
+    def progress(done, total, pack, bytes_done, total_bytes):
+        log(f"[{done}/{total}] {pack['name']} ({pack['size']/1024:.1f} KB)")
+
+    packs, stats = pipeline.extract_nsp_trpfs(args.input, _keyset(args), args.output, args.patterns, args.jobs,
+                                              progress, log, not args.no_manifest, args.force, _output_writer(args),
+                                              args.queue_depth)
+    _emit(args, {'selected': len(packs), 'bytes': sum(p['size'] for p in packs), 'output': args.output, **stats},
+          [f"Extracted {len(packs)} packs to {args.output} ({stats['written']} written, {stats['skipped']} up to date)"]
+          + _saved_line(stats))
+    return 0
+
+def cmd_batch(args):
+    jobs = batch.plan_batch(batch.collect_inputs(args.inputs), args.output, args.slice)
+    if not jobs:
+        raise ValueError("no .nsp or .nca inputs found")
+    needs_keys = any(job['kind'] != 'pfs0' for job in jobs)
+    keyset = _keyset(args) if needs_keys else None
+    log = (lambda message: None) if args.json else print
+    start = time.perf_counter()
+
+    def progress(done, total, result):
+        state = "ok" if result['ok'] else f"FAILED: {result['error']}"
+        rate = result['bytes'] / 1e6 / result['seconds'] if result['seconds'] else 0
+        log(f"[{done}/{total}] {result['input']} -> {result['output']}: {state} ({result['seconds']:.1f} s, {rate:.0f} MB/s)")
+
+    results = batch.run_batch(jobs, keyset, args.io_jobs, args.cpu_jobs, args.patterns, progress)
+    failed = [r for r in results if not r['ok']]
+    elapsed = time.perf_counter() - start
+    total_bytes = sum(r['bytes'] for r in results)
+    _emit(args, {'jobs': results, 'failed': len(failed), 'seconds': elapsed, 'bytes': total_bytes},
+          [f"{len(results) - len(failed)} of {len(results)} jobs succeeded in {elapsed:.1f} s "
+           f"({total_bytes / 1e6:.0f} MB, {total_bytes / 1e6 / elapsed if elapsed else 0:.0f} MB/s)"])
+    return 1 if failed else 0
+
+def cmd_inventory(args):
+    kind = detect_format(args.input)
+    if kind == 'trpfs':
+        trpfd, trpfs = _trpfs_paths(args)
+        packs = slicer.load_selected_packs(trpfd, trpfs, args.patterns, not args.no_cache)
+        rows = inventory.inventory_packs(trpfs, packs, args.jobs)
+    elif kind == 'pfs0':
+        with pipeline.NspGame(args.input, _keyset(args)) as game:
+            pack_index = game.pack_index()
+            packs = select_packs(pack_index, args.patterns) if args.patterns else pack_index.pack_map()
+            rows = inventory.inventory_packs(game.trpfs_reader, packs, args.jobs)
+    else:
+        raise ValueError("inventory needs data.trpfs (or data.trpfd) or an NSP")
+    if args.output:
+        inventory.write_catalog(args.output, rows, args.input)
+    if args.type:
+        rows = [row for row in rows if inventory.content_types(row) & set(args.type)]
+        _emit(args, rows, [f"{row['offset']:#014x} {row['size']:>12} {','.join(sorted(inventory.content_types(row) & set(args.type))):>6} "
+                           f"{row['name']}" for row in rows])
+        return 0
+    summary = inventory.summarize_types(rows)
+    _emit(args, summary, [f"{type_name:>8} {entry['count']:>8} files {entry['bytes'] / (1024 * 1024):>12.1f} MB"
+                          for type_name, entry in summary.items()]
+          + ([f"Catalog written to {args.output}"] if args.output else []))
+    return 0
+
+def cmd_diff(args):
+    old_trpfd, old_trpfs = _trpfs_pair(args.old, args.old_trpfd)
+    new_trpfd, new_trpfs = _trpfs_pair(args.new, args.new_trpfd)
+    report = diff.diff_trpfs(old_trpfd, old_trpfs, new_trpfd, new_trpfs, args.patterns, args.jobs, not args.no_cache)
+    lines = [f"+ {pack['name']} ({pack['size']} bytes)" for pack in report['added']]
+    lines += [f"- {pack['name']}" for pack in report['removed']]
+    lines += [f"M {pack['name']} ({pack['old_size']} -> {pack['size']} bytes, {pack['changed_bytes']} changed)"
+              for pack in report['changed']]
+    lines.append(f"{len(report['added'])} added, {len(report['removed'])} removed, "
+                 f"{len(report['changed'])} changed, {report['unchanged']} unchanged")
+    if args.patch:
+        stats = diff.write_patch_set(new_trpfs, report, args.patch, args.jobs)
+        report['patch'] = {'output': args.patch, **stats}
+        lines.append(f"Patch set: {stats['written']} packs written to {args.patch}")
+    _emit(args, report, lines)
+    return 0
+
+def cmd_gaps(args):
+    if detect_format(args.input) != 'trpfs':
+        raise ValueError("gaps needs data.trpfs (or data.trpfd)")
+    trpfd, trpfs = _trpfs_paths(args)
+    report = slicer.gap_report(trpfd, trpfs)
+    lines = [f"{pack['offset']:#014x} {pack['size']:>12} unnamed {pack['name']}" for pack in report['unnamed']]
+    lines += [f"{region['offset']:#014x} {region['size']:>12} {region['kind']}" for region in report['regions']]
+    lines.append(f"{len(report['unnamed'])} unnamed packs, {len(report['gap_packs'])} packs in gaps, "
+                 f"{report['padding_bytes']} bytes of padding, {report['table_bytes']} bytes of old file tables, "
+                 f"{report['stale_bytes']} bytes of replaced packs, "
+                 f"{report['unaccounted_bytes']} bytes unaccounted for")
+    if args.output:
+        packs = report['unnamed'] + report['gap_packs']
+        stats = slicer.extract_packs(trpfs, packs, args.output, args.jobs)
+        report['extracted'] = {'output': args.output, **stats}
+        lines.append(f"Extracted {stats['written']} packs to {args.output}")
+    _emit(args, report, lines)
+    return 0
+
+def cmd_pack(args):
+    if not os.path.isdir(args.input):
+        raise NotADirectoryError(f"Not a directory: {args.input}")
+    trpfd = args.trpfd or os.path.splitext(args.output)[0] + '.trpfd'
+    log = (lambda message: None) if args.json else print
+
+    def progress(done, total, pack, bytes_done, total_bytes):
+        log(f"[{done}/{total}] {pack['name']} ({pack['size']/1024:.1f} KB)")
+
+    if args.update:
+        stats = packer.update_trpfs(args.input, args.output, trpfd, args.align, progress)
+        _emit(args, stats, [f"Updated {args.output}: {stats['added']} added, {stats['replaced']} replaced, "
+                            f"{stats['unchanged']} unchanged ({stats['appended_bytes']} bytes appended)"])
+        return 0
+    reference = _trpfs_pair(args.reference, args.reference_trpfd) if args.reference else None
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    packs = packer.pack_directory(args.input, args.output, trpfd, reference, args.align, progress)
+    _emit(args, {'packs': len(packs), 'bytes': sum(p['size'] for p in packs), 'trpfs': args.output, 'trpfd': trpfd},
+          [f"Packed {len(packs)} packs into {args.output} and {trpfd}"])
+    return 0
+
+def cmd_selftest(args):
+    results = selftest.run_selftest()
+    _emit(args, [{'check': name, 'passed': passed, 'error': error} for name, passed, error in results],
+          [f"{'PASS' if passed else 'FAIL'}: {name}" + (f" ({error})" if error else "") for name, passed, error in results])
+    return 0 if all(passed for _, passed, _ in results) else 1
+
+def cmd_mount(args):
+    if detect_format(args.input) != 'trpfs':
+        raise ValueError("mount only supports data.trpfs")
+    trpfd, trpfs = _trpfs_paths(args)
+    vfs.mount(trpfd, trpfs, args.mountpoint)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="za_tools", description="Headless tools for Pokemon Legends Z-A game files (NSP/PFS0, NCA, TRPFS).")
+    parser.add_argument('--json', action='store_true', help="print machine-readable JSON instead of text")
+    parser.add_argument('--profile', metavar='PATH', help=f"write per-stage timings, byte and syscall counts as JSON to PATH ('-' for stderr); also ${profiling.PROFILE_ENV}")
+    parser.add_argument('--trace', metavar='PATH', help=f"write a Chrome trace of every stage to PATH (chrome://tracing, Perfetto); also ${profiling.TRACE_ENV}")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    commands = {
+        'list': (cmd_list, "list the contents of an NSP, NCA RomFS or data.trpfs"),
+        'extract': (cmd_extract, "extract an NSP, an NCA RomFS or (selected) TRPFS packs"),
+        'verify': (cmd_verify, "check an extraction against its source (or verify NCA hashes)"),
+    }
+    for name, (func, help_text) in commands.items():
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.set_defaults(func=func)
+        cmd.add_argument('input', help=".nsp, .nca, .trpak, data.trpfs or data.trpfd")
+        if name != 'list':
+            cmd.add_argument('-o', '--output', required=name == 'extract', default=None, help="output directory")
+        cmd.add_argument('patterns', nargs='*', help="TRPFS only: exact names, prefixes or globs such as 'arc/pokemon/**'")
+        cmd.add_argument('--trpfd', help="TRPFS only: path to data.trpfd (default: next to data.trpfs)")
+        cmd.add_argument('--no-cache', action='store_true', help="TRPFS only: rebuild the pack index instead of using the on-disk cache")
+        cmd.add_argument('--hactool', help="NCA only: use this hactool executable instead of the built-in reader")
+        cmd.add_argument('--keys', default="prod.keys", help="NCA only: keys file (default: prod.keys)")
+        cmd.add_argument('--title-keys', help="NCA only: title.keys file for titles with a rights ID")
+        if name == 'extract':
+            cmd.add_argument('-j', '--jobs', type=int, default=slicer.DEFAULT_WORKERS, help="TRPFS only: number of extraction workers")
+            cmd.add_argument('--no-manifest', action='store_true', help="TRPFS only: do not keep a resume manifest in the output directory")
+            cmd.add_argument('--force', action='store_true', help="TRPFS only: rewrite every pack even if the manifest says it is up to date")
+            cmd.add_argument('--unpack-trpak', action='store_true', help="TRPFS only: decode the inner files of each pack instead of writing .trpak slices")
+            cmd.add_argument('--dedup', choices=DEDUP_MODES, help="NSP/TRPFS: write identical files once and link the copies")
+            cmd.add_argument('--sparse', action='store_true', help="NSP/TRPFS: leave all-zero blocks as holes in the output files")
+            cmd.add_argument('--queue-depth', type=int, nargs='?', const=aio.DEFAULT_QUEUE_DEPTH, help=f"NSP/TRPFS: keep this many file writes in flight through the async engine (default {aio.DEFAULT_QUEUE_DEPTH}); for network and overlay filesystems")
+        if name == 'verify':
+            cmd.add_argument('--hash', action='store_true', help="NSP/TRPFS: also hash every file against its source (and the CNMT SHA-256 of NCAs)")
+            cmd.add_argument('-j', '--jobs', type=int, default=verify.DEFAULT_HASH_WORKERS, help="number of hashing processes")
+        if name != 'verify':
+            cmd.add_argument('--names', help="TRPAK: text file of inner file paths used to name extracted files")
+
+    slice_cmd = sub.add_parser('slice', help="slice TRPFS packs straight out of an NSP, without intermediate files")
+    slice_cmd.set_defaults(func=cmd_slice)
+    slice_cmd.add_argument('input', help=".nsp containing the game's program NCA")
+    slice_cmd.add_argument('-o', '--output', required=True, help="output directory")
+    slice_cmd.add_argument('patterns', nargs='*', help="exact pack names, prefixes or globs such as 'arc/pokemon/**'")
+    slice_cmd.add_argument('--keys', default="prod.keys", help="keys file (default: prod.keys)")
+    slice_cmd.add_argument('--title-keys', help="title.keys file, if the NSP has no ticket")
+    slice_cmd.add_argument('-j', '--jobs', type=int, default=slicer.DEFAULT_WORKERS, help="number of extraction workers")
+    slice_cmd.add_argument('--no-manifest', action='store_true', help="do not keep a resume manifest in the output directory")
+    slice_cmd.add_argument('--force', action='store_true', help="rewrite every pack even if the manifest says it is up to date")
+    slice_cmd.add_argument('--dedup', choices=DEDUP_MODES, help="write identical packs once and link the copies")
+    slice_cmd.add_argument('--sparse', action='store_true', help="leave all-zero blocks as holes in the output files")
+    slice_cmd.add_argument('--queue-depth', type=int, nargs='?', const=aio.DEFAULT_QUEUE_DEPTH, help=f"keep this many pack writes in flight through the async engine (default {aio.DEFAULT_QUEUE_DEPTH})")
+
+    batch_cmd = sub.add_parser('batch', help="extract many .nsp/.nca files (or folders of them) concurrently")
+    batch_cmd.set_defaults(func=cmd_batch, patterns=[])
+    batch_cmd.add_argument('inputs', nargs='+', help=".nsp/.nca files, folders to scan, or @list.txt")
+    batch_cmd.add_argument('-o', '--output', required=True, help="output directory; each input gets its own folder")
+    batch_cmd.add_argument('--slice', action='store_true', help="slice TRPFS packs out of each NSP instead of unpacking it")
+    batch_cmd.add_argument('--pattern', dest='patterns', action='append', default=[], help="NCA/--slice: only extract matching paths (repeatable)")
+    batch_cmd.add_argument('--io-jobs', type=int, default=batch.DEFAULT_IO_JOBS, help="concurrent disk-bound jobs (plain NSP unpacking)")
+    batch_cmd.add_argument('--cpu-jobs', type=int, default=batch.DEFAULT_CPU_JOBS, help="concurrent decrypting jobs (NCA RomFS, --slice)")
+    batch_cmd.add_argument('--keys', default="prod.keys", help="keys file (default: prod.keys)")
+    batch_cmd.add_argument('--title-keys', help="title.keys file for titles with a rights ID")
+
+    inventory_cmd = sub.add_parser('inventory', help="classify TRPFS packs and the files inside them by magic number and build an SQLite catalog")
+    inventory_cmd.set_defaults(func=cmd_inventory)
+    inventory_cmd.add_argument('input', help="data.trpfs, data.trpfd or an .nsp containing the game")
+    inventory_cmd.add_argument('patterns', nargs='*', help="exact pack names, prefixes or globs such as 'arc/pokemon/**'")
+    inventory_cmd.add_argument('-o', '--output', help="SQLite catalog to write (tables 'packs' and 'files', see README)")
+    inventory_cmd.add_argument('--type', action='append', help="list the packs holding files of this type instead of the summary (repeatable)")
+    inventory_cmd.add_argument('--trpfd', help="path to data.trpfd (default: next to data.trpfs)")
+    inventory_cmd.add_argument('--no-cache', action='store_true', help="rebuild the pack index instead of using the on-disk cache")
+    inventory_cmd.add_argument('--keys', default="prod.keys", help="NSP only: keys file (default: prod.keys)")
+    inventory_cmd.add_argument('--title-keys', help="NSP only: title.keys file, if the NSP has no ticket")
+    inventory_cmd.add_argument('-j', '--jobs', type=int, default=slicer.DEFAULT_WORKERS, help="number of reader threads")
+
+    diff_cmd = sub.add_parser('diff', help="compare two versions of data.trpfs pack by pack, without extracting")
+    diff_cmd.set_defaults(func=cmd_diff)
+    diff_cmd.add_argument('old', help="old data.trpfs (or data.trpfd)")
+    diff_cmd.add_argument('new', help="new data.trpfs (or data.trpfd)")
+    diff_cmd.add_argument('patterns', nargs='*', help="only compare matching packs")
+    diff_cmd.add_argument('--old-trpfd', help="path to the old data.trpfd (default: next to the old data.trpfs)")
+    diff_cmd.add_argument('--new-trpfd', help="path to the new data.trpfd (default: next to the new data.trpfs)")
+    diff_cmd.add_argument('--patch', help="also slice the added and changed packs into this directory, with a patch.json")
+    diff_cmd.add_argument('--no-cache', action='store_true', help="rebuild the pack indexes instead of using the on-disk cache")
+    diff_cmd.add_argument('-j', '--jobs', type=int, default=verify.DEFAULT_HASH_WORKERS, help="number of hashing processes")
+
+    gaps_cmd = sub.add_parser('gaps', help="report the parts of data.trpfs no named pack covers, and extract the packs found there")
+    gaps_cmd.set_defaults(func=cmd_gaps, patterns=[])
+    gaps_cmd.add_argument('input', help="data.trpfs or data.trpfd")
+    gaps_cmd.add_argument('-o', '--output', help="extract unnamed packs (by hash) and packs found in gaps (by offset) here")
+    gaps_cmd.add_argument('--trpfd', help="path to data.trpfd (default: next to data.trpfs)")
+    gaps_cmd.add_argument('-j', '--jobs', type=int, default=slicer.DEFAULT_WORKERS, help="number of extraction workers")
+
+    pack_cmd = sub.add_parser('pack', help="build data.trpfs and data.trpfd from a directory of packs")
+    pack_cmd.set_defaults(func=cmd_pack, patterns=[])
+    pack_cmd.add_argument('input', help="directory of packs; their relative paths become the pack names")
+    pack_cmd.add_argument('-o', '--output', required=True, help="data.trpfs to write (or to update with --update)")
+    pack_cmd.add_argument('--trpfd', help="data.trpfd to write (default: next to the output)")
+    pack_cmd.add_argument('--reference', help="original data.trpfs (or data.trpfd): keep its pack order and table fields")
+    pack_cmd.add_argument('--reference-trpfd', help="path to the original data.trpfd (default: next to --reference)")
+    pack_cmd.add_argument('--update', action='store_true', help="update the output in place, appending only new and changed packs")
+    pack_cmd.add_argument('--align', type=int, default=1, help="start every written pack at a multiple of this many bytes")
+
+    selftest_cmd = sub.add_parser('selftest', help="check the built-in decryption against local test vectors and round-trip a packed archive")
+    selftest_cmd.set_defaults(func=cmd_selftest, patterns=[])
+
+    mount_cmd = sub.add_parser('mount', help="mount data.trpfs read-only through FUSE (needs fusepy)")
+    mount_cmd.set_defaults(func=cmd_mount, patterns=[], no_cache=False)
+    mount_cmd.add_argument('input', help="data.trpfs or data.trpfd")
+    mount_cmd.add_argument('mountpoint', help="empty directory to mount on")
+    mount_cmd.add_argument('--trpfd', help="path to data.trpfd (default: next to data.trpfs)")
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    # Patterns may follow options (e.g. 'extract data.trpfs -o out arc/pokemon/**'), which
+    # argparse leaves unparsed when subcommands are involved
+    args, extra = parser.parse_known_args(argv)
+    unknown = [arg for arg in extra if arg.startswith('-')]
+    if unknown:
+        parser.error(f"unrecognized arguments: {' '.join(unknown)}")
+    args.patterns = args.patterns + extra
+    if args.profile or args.trace:
+        profiling.enable_output(args.profile, args.trace)
+    try:
+        if args.command == 'verify' and args.output is None and detect_format(args.input) not in ('nca', 'trpak'):
+            parser.error("verify needs --output for NSP and TRPFS inputs")
+        return args.func(args)
+    except (OSError, ValueError, RuntimeError, MissingKeyError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        print("Interrupted", file=sys.stderr)
+        return 130
@@ -0,0 +1,165 @@
+import ctypes
+import ctypes.util
+import os
+import zlib
+
+try:
+    import lz4.frame
+except ImportError:  # lz4 is optional; LZ4 frames are reported as unsupported without it
+    lz4 = None
+
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# TRPAK per-file compression field values
+COMPRESSION_NONE = -1
+COMPRESSION_OODLE = 3
+
+LZ4_FRAME_MAGIC = b"\x04\x22\x4d\x18"
+# Oodle decodes in blocks of this many raw bytes; a stored block is never much larger
+OODLE_BLOCK_SIZE = 256 * 1024
+
+OODLE_LIBRARY_NAMES = [
+    "oo2core_9_win64.dll", "oo2core_8_win64.dll", "oo2core_7_win64.dll",
+    "liboo2corelinux64.so.9", "liboo2corelinux64.so",
+    "liboo2coremac64.2.9.dylib",
+]
+
+class CompressionError(IOError):
+    """Raised when an inner file uses a codec that cannot be decoded here."""
+
+# --- CODEC DETECTION ---
+def _looks_like_zlib(head):
+    return len(head) >= 2 and head[0] & 0x0F == 8 and head[0] >> 4 <= 7 and ((head[0] << 8) | head[1]) % 31 == 0
+
+def detect_codec(compression_type, head, stored_size, raw_size):
+    """Identifies how an inner file is stored: 'none', 'oodle', 'zlib', 'lz4-frame' or 'unknown'."""
+    if compression_type == COMPRESSION_OODLE:
+        return 'oodle'
+    if stored_size == raw_size:
+        return 'none'
+    head = bytes(head[:4])
+    if head == LZ4_FRAME_MAGIC:
+        return 'lz4-frame'
+    if _looks_like_zlib(head):
+        return 'zlib'
+    return 'unknown'
+
+# --- OODLE ---
+_oodle_decompress = None
+
+def load_oodle():
+    """Loads OodleLZ_Decompress from an oo2core library, if one can be found.
+
+    The library is not redistributable, so it is looked up in ZA_TOOLS_OODLE_LIB, the
+    working directory, the repository root and the system library path.
+    """
+    global _oodle_decompress
+    if _oodle_decompress is not None:
+        return _oodle_decompress
+
+    candidates = []
+    if os.environ.get('ZA_TOOLS_OODLE_LIB'):
+        candidates.append(os.environ['ZA_TOOLS_OODLE_LIB'])
+    for directory in (os.getcwd(), os.path.dirname(os.path.dirname(os.path.abspath(__file__)))):
+        candidates.extend(os.path.join(directory, name) for name in OODLE_LIBRARY_NAMES)
+    found = ctypes.util.find_library("oo2core")
+    if found:
+        candidates.append(found)
+
+    for candidate in candidates:
+        if not os.path.isfile(candidate) and os.sep in candidate:
+            continue
+        try:
+            library = ctypes.CDLL(candidate)
+        except OSError:
+            continue
+        decompress = library.OodleLZ_Decompress
+        decompress.restype = ctypes.c_int64
+        decompress.argtypes = [ctypes.c_void_p, ctypes.c_int64, ctypes.c_void_p, ctypes.c_int64,
+                               ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_void_p, ctypes.c_int64,
+                               ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int64, ctypes.c_int]
+        _oodle_decompress = decompress
+        return decompress
+    return None
+
+def _oodle_decode(view, raw_size):
+    """Decodes the first `raw_size` bytes of the Oodle data in `view` into a new ctypes buffer."""
+    decompress = load_oodle()
+    if decompress is None:
+        raise CompressionError("Oodle-compressed file, but no oo2core library was found (set ZA_TOOLS_OODLE_LIB)")
+    view = memoryview(view)
+    # The decoder reads the stored bytes in place when the buffer is writable; a
+    # read-only mapping is copied once
+    source_type = ctypes.c_char * len(view)
+    source = source_type.from_buffer_copy(view) if view.readonly else source_type.from_buffer(view)
+    target = ctypes.create_string_buffer(raw_size)
+    decoded = decompress(source, len(view), target, raw_size, 1, 0, 0, None, 0, None, None, None, 0, 3)
+    if decoded != raw_size:
+        raise CompressionError(f"Oodle decompression failed ({decoded} of {raw_size} bytes)")
+    return target
+
+def _oodle_to_file(view, out_f, raw_size):
+    out_f.write(memoryview(_oodle_decode(view, raw_size))[:raw_size])
+
+# --- PARTIAL DECODING ---
+def head_input_size(codec, stored_size):
+    """How many stored bytes decode_head needs for `codec`: all of the first block for Oodle, a few KB otherwise."""
+    return min(stored_size, 2 * OODLE_BLOCK_SIZE if codec == 'oodle' else 4096)
+
+def decode_head(codec, data, raw_size, length):
+    """Returns up to `length` decoded bytes from the start of the stored `data`, or None if that cannot be done here.
+
+    `data` needs to hold head_input_size() stored bytes. zlib and LZ4 frames are
+    decoded only as far as `length`; Oodle has to decode its whole first block.
+    """
+    try:
+        if codec == 'none':
+            return bytes(data[:length])
+        if codec == 'zlib':
+            return zlib.decompressobj().decompress(data, length)
+        if codec == 'lz4-frame' and lz4 is not None:
+            return lz4.frame.LZ4FrameDecompressor().decompress(data, max_length=length)
+        if codec == 'oodle' and load_oodle() is not None:
+            return bytes(memoryview(_oodle_decode(data, min(raw_size, OODLE_BLOCK_SIZE)))[:length])
+    except (zlib.error, RuntimeError, CompressionError):
+        pass
+    return None
+
+# --- STREAMING DECOMPRESSION ---
+def decompress_to_file(codec, view, out_f, raw_size):
+    """Writes the decoded contents of `view` to `out_f`.
+
+    Stored, zlib and LZ4-frame data is processed in STREAM_CHUNK_SIZE pieces so only
+    one chunk of input and output is held at a time. Oodle has no streaming API and
+    is decoded per inner file. Returns the number of bytes written.
+    """
+    if codec == 'none':
+        for start in range(0, len(view), STREAM_CHUNK_SIZE):
+            out_f.write(view[start:start + STREAM_CHUNK_SIZE])
+        return len(view)
+
+    if codec == 'oodle':
+        _oodle_to_file(view, out_f, raw_size)
+        return raw_size
+
+    if codec == 'zlib':
+        decoder = zlib.decompressobj()
+    elif codec == 'lz4-frame':
+        if lz4 is None:
+            raise CompressionError("LZ4-compressed file, but the 'lz4' package is not installed")
+        decoder = lz4.frame.LZ4FrameDecompressor()
+    else:
+        raise CompressionError("Unknown compression")
+
+    written = 0
+    for start in range(0, len(view), STREAM_CHUNK_SIZE):
+        chunk = decoder.decompress(view[start:start + STREAM_CHUNK_SIZE])
+        out_f.write(chunk)
+        written += len(chunk)
+    if codec == 'zlib':
+        tail = decoder.flush()
+        out_f.write(tail)
+        written += len(tail)
+    if written != raw_size:
+        raise CompressionError(f"Decompressed size {written} does not match the expected {raw_size}")
+    return written
@@ -0,0 +1,67 @@
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:  # cryptography is optional; pycryptodome is tried next
+    Cipher = None
+
+try:
+    from Crypto.Cipher import AES as _PyCryptodomeAES
+except ImportError:
+    _PyCryptodomeAES = None
+
+class CryptoUnavailableError(RuntimeError):
+    """Raised when neither 'cryptography' nor 'pycryptodome' is installed."""
+
+def crypto_available():
+    return Cipher is not None or _PyCryptodomeAES is not None
+
+def _require_backend():
+    if not crypto_available():
+        raise CryptoUnavailableError("NCA decryption needs the 'cryptography' (or 'pycryptodome') package")
+
+# --- AES PRIMITIVES ---
+def aes_ecb(key, data, encrypt=False):
+    _require_backend()
+    if Cipher is not None:
+        cipher = Cipher(algorithms.AES(key), modes.ECB())
+        ctx = cipher.encryptor() if encrypt else cipher.decryptor()
+        return ctx.update(data) + ctx.finalize()
+    cipher = _PyCryptodomeAES.new(key, _PyCryptodomeAES.MODE_ECB)
+    return cipher.encrypt(data) if encrypt else cipher.decrypt(data)
+
+def aes_ctr(key, counter_block):
+    """Returns an object whose update(data) en/decrypts with AES-CTR from the 16-byte `counter_block`."""
+    _require_backend()
+    if Cipher is not None:
+        return Cipher(algorithms.AES(key), modes.CTR(counter_block)).decryptor()
+    return _PyCryptodomeAES.new(key, _PyCryptodomeAES.MODE_CTR, nonce=b'', initial_value=counter_block)
+
+def _gf_double(tweak):
+    value = int.from_bytes(tweak, 'little') << 1
+    if value >> 128:
+        value = (value & ((1 << 128) - 1)) ^ 0x87
+    return value.to_bytes(16, 'little')
+
+def _xor(a, b):
+    return (int.from_bytes(a, 'little') ^ int.from_bytes(b, 'little')).to_bytes(16, 'little')
+
+def aes_xts(key, data, sector, sector_size=0x200, encrypt=False, big_endian_tweak=True):
+    """AES-XTS over whole sectors starting at `sector`, built on AES-ECB.
+
+    Nintendo uses the sector number as a big-endian tweak; standard XTS (and the
+    IEEE 1619 test vectors) use little-endian, selected with big_endian_tweak=False.
+    Data must be a multiple of 16 bytes; it is only used for the small NCA header.
+    """
+    key1, key2 = key[:len(key) // 2], key[len(key) // 2:]
+    out = bytearray()
+    for start in range(0, len(data), sector_size):
+        unit = data[start:start + sector_size]
+        tweak = aes_ecb(key2, sector.to_bytes(16, 'big' if big_endian_tweak else 'little'), encrypt=True)
+        masks = []
+        for _ in range(len(unit) // 16):
+            masks.append(tweak)
+            tweak = _gf_double(tweak)
+        whitened = b''.join(_xor(unit[i * 16:i * 16 + 16], mask) for i, mask in enumerate(masks))
+        processed = aes_ecb(key1, whitened, encrypt=encrypt)
+        out += b''.join(_xor(processed[i * 16:i * 16 + 16], mask) for i, mask in enumerate(masks))
+        sector += 1
+    return bytes(out)
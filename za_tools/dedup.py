@@ -0,0 +1,166 @@
+import os
+import threading
+from collections import Counter
+
+from .fileio import COPY_CHUNK_SIZE
+from .hashing import CONTENT_HASH_NAME, content_hasher
+from .profiling import count
+
+try:
+    import fcntl
+except ImportError:  # Windows: no reflinks, duplicates fall back to hardlinks or copies
+    fcntl = None
+
+DEDUP_MODES = ('hardlink', 'reflink')
+# _IOW(0x94, 9, int): clone all extents of one file into another (btrfs, XFS, bcachefs)
+FICLONE = 0x40049409
+SPARSE_BLOCK_SIZE = 64 * 1024
+_ZERO_BLOCK = bytes(SPARSE_BLOCK_SIZE)
+
+# --- LOW-LEVEL WRITES ---
+def _write_all(fd, view):
+    while view:
+        written = os.write(fd, view)
+        count('write', written)
+        view = view[written:]
+
+def write_sparse(reader, out_fd, offset, size, hasher=None):
+    """Copies a slice like RangeReader.copy_to, but seeks over all-zero SPARSE_BLOCK_SIZE blocks.
+
+    The file is extended to `size` at the end, so skipped blocks become holes on
+    filesystems that support them (and read back as zeros everywhere else).
+    Returns the number of bytes skipped.
+    """
+    skipped = 0
+    copied = 0
+    while copied < size:
+        chunk = reader.pread(min(size - copied, COPY_CHUNK_SIZE), offset + copied)
+        if not chunk:
+            raise IOError(f"Unexpected end of input at offset {offset + copied}")
+        if hasher is not None:
+            hasher.update(chunk)
+        view = memoryview(chunk)
+        pending = 0
+        for start in range(0, len(view) - SPARSE_BLOCK_SIZE + 1, SPARSE_BLOCK_SIZE):
+            if view[start:start + SPARSE_BLOCK_SIZE] == _ZERO_BLOCK:
+                _write_all(out_fd, view[pending:start])
+                os.lseek(out_fd, SPARSE_BLOCK_SIZE, os.SEEK_CUR)
+                skipped += SPARSE_BLOCK_SIZE
+                pending = start + SPARSE_BLOCK_SIZE
+        _write_all(out_fd, view[pending:])
+        copied += len(chunk)
+    os.ftruncate(out_fd, size)
+    return skipped
+
+def _remove(path):
+    # Never write into an existing output: after a deduplicated run it may be a
+    # hardlink shared with other packs
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+def _reflink(source_path, output_path):
+    if fcntl is None:
+        raise OSError("reflinks are not supported on this platform")
+    src_fd = os.open(source_path, os.O_RDONLY)
+    try:
+        out_fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        try:
+            fcntl.ioctl(out_fd, FICLONE, src_fd)
+        except OSError:
+            os.close(out_fd)
+            os.unlink(output_path)
+            raise
+        os.close(out_fd)
+    finally:
+        os.close(src_fd)
+
+# --- OUTPUT WRITER ---
+class OutputWriter:
+    """Writes extracted slices to disk, optionally deduplicated and sparse. Shared by all workers.
+
+    With `dedup`, slices with the same size and content hash are written once; later
+    copies become hardlinks ('hardlink') or reflinks ('reflink', copy-on-write clones on
+    btrfs/XFS). When a link cannot be made (other filesystem, no support) the slice is
+    written normally. Only slices whose size occurs more than once in `plan()` are
+    hashed up front, so unique packs cost nothing extra. With `sparse`, all-zero
+    blocks are left as holes. `stats` counts the linked files and the bytes saved.
+    """
+    def __init__(self, dedup=None, sparse=False, hash_name=CONTENT_HASH_NAME):
+        if dedup is not None and dedup not in DEDUP_MODES:
+            raise ValueError(f"Unknown dedup mode: {dedup} (expected one of {', '.join(DEDUP_MODES)})")
+        self.dedup = dedup
+        self.sparse = sparse
+        self.hash_name = hash_name
+        self.stats = {'linked': 0, 'linked_bytes': 0, 'sparse_bytes': 0}
+        self._candidate_sizes = None
+        self._written = {}
+        self._lock = threading.Lock()
+
+    @property
+    def bytes_saved(self):
+        return self.stats['linked_bytes'] + self.stats['sparse_bytes']
+
+    def plan(self, sizes):
+        """Declares the sizes of every slice about to be written; sizes seen once are never hashed."""
+        self._candidate_sizes = {size for size, count in Counter(sizes).items() if count > 1 and size}
+
+    def _copy(self, reader, offset, size, output_path, hasher):
+        out_fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o666)
+        count('open')
+        try:
+            if self.sparse:
+                skipped = write_sparse(reader, out_fd, offset, size, hasher)
+                with self._lock:
+                    self.stats['sparse_bytes'] += skipped
+            else:
+                reader.copy_to(out_fd, offset, size, hasher)
+        finally:
+            os.close(out_fd)
+
+    def _link(self, source_path, output_path):
+        try:
+            if self.dedup == 'hardlink':
+                os.link(source_path, output_path)
+            else:
+                _reflink(source_path, output_path)
+        except OSError:
+            return False
+        count(self.dedup)
+        return True
+
+    def write(self, reader, offset, size, output_path, hash_name=None):
+        """Writes `size` bytes of `reader` at `offset` to `output_path`.
+
+        Returns the content digest when `hash_name` is given, else None.
+        """
+        _remove(output_path)
+        is_candidate = self.dedup and (self._candidate_sizes is None or size in self._candidate_sizes)
+        if not is_candidate:
+            hasher = content_hasher(hash_name) if hash_name else None
+            self._copy(reader, offset, size, output_path, hasher)
+            return hasher.hexdigest() if hasher else None
+
+        digest = reader.hash_range(offset, size, content_hasher(hash_name or self.hash_name)).hexdigest()
+        key = (size, hash_name or self.hash_name, digest)
+        with self._lock:
+            first = self._written.get(key)
+            if first is None:
+                record = self._written[key] = {'path': output_path, 'done': threading.Event(), 'ok': False}
+        if first is not None:
+            # Another worker may still be writing the first copy
+            first['done'].wait()
+            if first['ok'] and self._link(first['path'], output_path):
+                with self._lock:
+                    self.stats['linked'] += 1
+                    self.stats['linked_bytes'] += size
+                return digest if hash_name else None
+            self._copy(reader, offset, size, output_path, None)
+            return digest if hash_name else None
+        try:
+            self._copy(reader, offset, size, output_path, None)
+            record['ok'] = True
+        finally:
+            record['done'].set()
+        return digest if hash_name else None
@@ -0,0 +1,100 @@
+import json
+import os
+from array import array
+
+from .hashing import CONTENT_HASH_NAME
+from .index_cache import source_key
+from .manifest import source_id
+from .pack_table import join_hashes
+from .slicer import DEFAULT_WORKERS, extract_packs, load_selected_packs
+from .verify import DEFAULT_HASH_WORKERS, hash_ranges
+
+# Common packs are compared in slices of this size, so one large pack is hashed by
+# several processes and the report can say how much of it changed
+DIFF_CHUNK_SIZE = 16 * 1024 * 1024
+PATCH_MANIFEST = 'patch.json'
+
+# --- PACK TABLE JOIN ---
+def join_pack_maps(old_packs, new_packs):
+    """Joins two pack lists by name hash. Returns (added, removed, common) with common as (old, new) pairs."""
+    new_hashes = array('Q', (pack['hash'] for pack in new_packs))
+    old_rows, new_rows = join_hashes(array('Q', (pack['hash'] for pack in old_packs)), new_hashes,
+                                     array('Q', range(len(new_packs))))
+    common = [(old_packs[i], new_packs[j]) for i, j in zip(old_rows, new_rows)]
+    matched_old = set(old_rows)
+    matched_new = set(new_rows)
+    removed = [pack for i, pack in enumerate(old_packs) if i not in matched_old]
+    added = [pack for j, pack in enumerate(new_packs) if j not in matched_new]
+    return added, removed, common
+
+def _chunks(size):
+    return [(start, min(DIFF_CHUNK_SIZE, size - start)) for start in range(0, size, DIFF_CHUNK_SIZE)] or [(0, 0)]
+
+# --- DIFF ---
+def diff_trpfs(old_trpfd, old_trpfs, new_trpfd, new_trpfs, patterns=None, workers=DEFAULT_HASH_WORKERS,
+               use_cache=True, hash_name=CONTENT_HASH_NAME):
+    """Compares two versions of data.trpfs pack by pack, without extracting either.
+
+    Both pack tables are joined by FNV-1a name hash. Packs only in the new version are
+    'added', packs only in the old one 'removed'. Common packs of different sizes are
+    'changed'; the others are hashed in DIFF_CHUNK_SIZE slices straight from both
+    files (mmap, across `workers` processes) and 'changed' if any slice differs.
+
+    Returns a report dict: 'added' and 'changed' hold the new pack dicts (changed ones
+    with 'old_size' and 'changed_bytes' added), 'removed' the old pack dicts and
+    'unchanged' a count. The pack dicts can be passed to write_patch_set.
+    """
+    old_packs = load_selected_packs(old_trpfd, old_trpfs, patterns, use_cache)
+    new_packs = load_selected_packs(new_trpfd, new_trpfs, patterns, use_cache)
+    added, removed, common = join_pack_maps(old_packs, new_packs)
+
+    report = {'added': added, 'removed': removed, 'changed': [], 'unchanged': 0, 'hash_algorithm': hash_name}
+    same_file = os.path.samefile(old_trpfs, new_trpfs)
+    to_hash = []
+    for old, new in common:
+        if old['size'] != new['size']:
+            report['changed'].append(dict(new, old_size=old['size'], changed_bytes=new['size']))
+        elif same_file and old['offset'] == new['offset']:
+            report['unchanged'] += 1
+        else:
+            to_hash.append((old, new))
+
+    jobs = []
+    for old, new in to_hash:
+        for start, length in _chunks(new['size']):
+            jobs.append((old_trpfs, old['offset'] + start, length, hash_name))
+            jobs.append((new_trpfs, new['offset'] + start, length, hash_name))
+    digests = iter(hash_ranges(jobs, workers))
+    for old, new in to_hash:
+        changed_bytes = 0
+        for _, length in _chunks(new['size']):
+            if next(digests) != next(digests):
+                changed_bytes += length
+        if changed_bytes:
+            report['changed'].append(dict(new, old_size=old['size'], changed_bytes=changed_bytes))
+        else:
+            report['unchanged'] += 1
+    for key in ('added', 'removed', 'changed'):
+        report[key].sort(key=lambda pack: pack['name'])
+    return report
+
+# --- PATCH SET ---
+def write_patch_set(new_trpfs, report, output_dir, workers=DEFAULT_WORKERS, progress_callback=None):
+    """Slices only the added and changed packs of a diff_trpfs report out of the new data.trpfs.
+
+    The packs go to `output_dir` under their usual paths, next to a PATCH_MANIFEST
+    (patch.json) listing the added, changed and removed pack names and the source the
+    slices were cut from. Returns the extract_packs stats.
+    """
+    packs = sorted(report['added'] + report['changed'], key=lambda pack: pack['offset'])
+    os.makedirs(output_dir, exist_ok=True)
+    stats = extract_packs(new_trpfs, packs, output_dir, workers, progress_callback)
+    patch = {
+        'source': source_id(source_key(new_trpfs)),
+        'added': [pack['name'] for pack in report['added']],
+        'changed': [pack['name'] for pack in report['changed']],
+        'removed': [pack['name'] for pack in report['removed']],
+    }
+    with open(os.path.join(output_dir, PATCH_MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(patch, f, indent=2)
+    return stats
@@ -0,0 +1,121 @@
+import queue
+import time
+
+DRAIN_INTERVAL_MS = 100
+RATE_WINDOW = 5.0
+
+# --- THROUGHPUT ---
+class RateMeter:
+    """Throughput and ETA over a sliding window of (time, bytes done) samples."""
+    def __init__(self, window=RATE_WINDOW):
+        self.window = window
+        self._samples = []
+
+    def reset(self):
+        self._samples = []
+
+    def add(self, bytes_done, now=None):
+        now = time.monotonic() if now is None else now
+        self._samples.append((now, bytes_done))
+        while len(self._samples) > 2 and now - self._samples[1][0] >= self.window:
+            self._samples.pop(0)
+
+    def rate(self):
+        """Returns bytes per second over the window, or None until there are two samples."""
+        if len(self._samples) < 2:
+            return None
+        (t0, b0), (t1, b1) = self._samples[0], self._samples[-1]
+        return (b1 - b0) / (t1 - t0) if t1 > t0 else None
+
+    def eta(self, total_bytes):
+        """Returns the seconds left until `total_bytes`, or None while the rate is unknown."""
+        rate = self.rate()
+        if not rate or not self._samples:
+            return None
+        return max(0.0, (total_bytes - self._samples[-1][1]) / rate)
+
+def format_eta(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+def format_throughput(meter, total_bytes):
+    """Returns e.g. '85.2 MB/s, ETA 1:23', or '' while the rate is unknown."""
+    rate = meter.rate()
+    if rate is None:
+        return ""
+    eta = meter.eta(total_bytes)
+    return f"{rate / (1024 * 1024):.1f} MB/s" + (f", ETA {format_eta(eta)}" if eta is not None else "")
+
+# --- WORKER TO UI CHANNEL ---
+class EventChannel:
+    """Thread-safe channel from a worker thread to the Tk main loop.
+
+    The worker calls log/status/progress/finish, which only put an event on a queue
+    and never touch a widget. The main loop drains the queue every DRAIN_INTERVAL_MS
+    (see pump) and gets one coalesced update per tick: all new log lines, the latest
+    status, the latest progress and the finish result, so the UI redraws at most ~10
+    times a second however many packs the worker goes through.
+    """
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self.meter = RateMeter()
+
+    def log(self, message):
+        self._queue.put(('log', message))
+
+    def status(self, message):
+        self._queue.put(('status', message))
+
+    def progress(self, bytes_done, total_bytes, text=None):
+        self._queue.put(('progress', (bytes_done, total_bytes, text)))
+
+    def finish(self, error=None, result=None):
+        """Marks the work as done; `error` is the exception that stopped it, if any, `result` what it returned."""
+        self._queue.put(('finish', (error, result)))
+
+    def drain(self):
+        """Returns the coalesced update for everything queued since the last call.
+
+        The dict has 'log' (list of lines), 'status', 'progress' ((bytes_done,
+        total_bytes, text) or None), 'throughput' (text for the status line),
+        'finished', 'error' and 'result'.
+        """
+        update = {'log': [], 'status': None, 'progress': None, 'throughput': "", 'finished': False, 'error': None,
+                  'result': None}
+        while True:
+            try:
+                kind, value = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'log':
+                update['log'].append(value)
+            elif kind == 'status':
+                update['status'] = value
+            elif kind == 'progress':
+                update['progress'] = value
+            else:
+                update['finished'] = True
+                update['error'], update['result'] = value
+        if update['progress'] is not None:
+            bytes_done, total_bytes, _ = update['progress']
+            self.meter.add(bytes_done)
+            update['throughput'] = format_throughput(self.meter, total_bytes)
+        return update
+
+    def pump(self, widget, apply, interval_ms=DRAIN_INTERVAL_MS):
+        """Drains the channel on `widget`'s Tk timer and calls `apply(update)` on the main thread.
+
+        Stops rescheduling after the update that carries the finish event.
+        """
+        self.meter.reset()
+
+        def tick():
+            update = self.drain()
+            if update['log'] or update['status'] is not None or update['progress'] is not None or update['finished']:
+                apply(update)
+            if not update['finished']:
+                widget.after(interval_ms, tick)
+
+        widget.after(interval_ms, tick)
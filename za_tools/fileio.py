@@ -0,0 +1,194 @@
+import io
+import os
+import sys
+import threading
+
+from .profiling import count
+
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+# --- STREAM COPY HELPERS ---
+def _copy_with_buffer(src, dst, offset, size, buf):
+    view = memoryview(buf)
+    src.seek(offset)
+    remaining = size
+    while remaining:
+        n = src.readinto(view[:min(remaining, len(buf))])
+        if not n:
+            raise IOError(f"Unexpected end of input at offset {offset + size - remaining}")
+        dst.write(view[:n])
+        count('read', n)
+        count('write', n)
+        remaining -= n
+
+def copy_file_slice(src, dst, offset, size, buf=None):
+    """Copies `size` bytes starting at `offset` of `src` into `dst` without loading the slice into memory.
+
+    Uses os.copy_file_range or os.sendfile when both ends are real files, otherwise
+    falls back to a bounded read/write loop through a reusable buffer.
+    """
+    try:
+        src_fd = src.fileno()
+        dst_fd = dst.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        src_fd = dst_fd = None
+
+    if src_fd is not None:
+        dst.flush()
+        copied = 0
+        try:
+            if hasattr(os, 'copy_file_range'):
+                while copied < size:
+                    n = os.copy_file_range(src_fd, dst_fd, min(size - copied, 1 << 30), offset + copied)
+                    count('copy_file_range', n)
+                    if n == 0:
+                        break
+                    copied += n
+            elif hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+                while copied < size:
+                    n = os.sendfile(dst_fd, src_fd, offset + copied, min(size - copied, 1 << 30))
+                    count('sendfile', n)
+                    if n == 0:
+                        break
+                    copied += n
+        except OSError:
+            # Cross-device or unsupported filesystem: continue with plain copies
+            pass
+        dst.seek(0, os.SEEK_END)
+        if copied == size:
+            return
+        offset += copied
+        size -= copied
+
+    _copy_with_buffer(src, dst, offset, size, buf if buf is not None else bytearray(min(size, COPY_CHUNK_SIZE)))
+
+# --- POSITIONAL READERS ---
+class RangeReader:
+    """The PositionalReader interface over any `pread(size, offset)` function.
+
+    Used for sources that are not plain files, e.g. data.trpfs inside the decrypted
+    RomFS of an NSP. Every copy goes through one bounded chunk per call, so memory
+    stays at COPY_CHUNK_SIZE per worker whatever the slice size. `key` identifies the
+    source for extraction manifests.
+    """
+    def __init__(self, pread, size, key=None):
+        self._pread = pread
+        self.size = size
+        self.key = key
+
+    def pread(self, size, offset):
+        return self._pread(size, offset)
+
+    def _copy_chunks(self, out_fd, offset, size, hasher):
+        copied = 0
+        while copied < size:
+            chunk = self.pread(min(size - copied, COPY_CHUNK_SIZE), offset + copied)
+            if not chunk:
+                raise IOError(f"Unexpected end of input at offset {offset + copied}")
+            if hasher is not None:
+                hasher.update(chunk)
+            view = memoryview(chunk)
+            while view:
+                written = os.write(out_fd, view)
+                count('write', written)
+                view = view[written:]
+            copied += len(chunk)
+
+    def copy_to(self, out_fd, offset, size, hasher=None):
+        """Copies a slice of the source into `out_fd`, feeding each chunk to `hasher` if given."""
+        self._copy_chunks(out_fd, offset, size, hasher)
+
+    def hash_range(self, offset, size, hasher):
+        """Feeds a slice of the source to `hasher` in bounded chunks and returns the hasher."""
+        done = 0
+        while done < size:
+            chunk = self.pread(min(size - done, COPY_CHUNK_SIZE), offset + done)
+            if not chunk:
+                raise IOError(f"Unexpected end of input at offset {offset + done}")
+            hasher.update(chunk)
+            done += len(chunk)
+        return hasher
+
+    def open(self):
+        """Returns a buffered, seekable binary file object over the source."""
+        return io.BufferedReader(_RangeStream(self), COPY_CHUNK_SIZE // 64)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class _RangeStream(io.RawIOBase):
+    def __init__(self, reader):
+        self._reader = reader
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        data = self._reader.pread(min(len(b), max(0, self._reader.size - self._pos)), self._pos)
+        b[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._pos, os.SEEK_END: self._reader.size}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+class PositionalReader(RangeReader):
+    """A single read-only descriptor shared by all workers.
+
+    Reads are positional (os.pread / copy_file_range with an explicit source offset),
+    so threads never fight over a shared file position. Platforms without pread
+    fall back to a lock around lseek + read.
+    """
+    def __init__(self, fname):
+        self.fd = os.open(fname, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        super().__init__(self._pread_fd, os.fstat(self.fd).st_size)
+        self._lock = None if hasattr(os, 'pread') else threading.Lock()
+        self._copy_file_range = hasattr(os, 'copy_file_range')
+
+    def _pread_fd(self, size, offset):
+        if self._lock is None:
+            data = os.pread(self.fd, size, offset)
+        else:
+            with self._lock:
+                os.lseek(self.fd, offset, os.SEEK_SET)
+                data = os.read(self.fd, size)
+        count('pread', len(data))
+        return data
+
+    def copy_to(self, out_fd, offset, size, hasher=None):
+        """Copies a slice of the source into `out_fd` (written at its current position).
+
+        When `hasher` is given the data has to pass through Python, so the zero-copy
+        path is skipped and every chunk is fed to `hasher.update` on the way.
+        """
+        copied = 0
+        if self._copy_file_range and hasher is None:
+            try:
+                while copied < size:
+                    n = os.copy_file_range(self.fd, out_fd, min(size - copied, 1 << 30), offset + copied)
+                    count('copy_file_range', n)
+                    if n == 0:
+                        break
+                    copied += n
+            except OSError:
+                # Cross-device or unsupported filesystem: finish with plain reads
+                pass
+        self._copy_chunks(out_fd, offset + copied, size - copied, hasher)
+
+    def close(self):
+        os.close(self.fd)
@@ -0,0 +1,122 @@
+import struct
+
+# PagedBuffer reads its file in pages of this size and keeps at most PAGE_CACHE of them
+PAGE_SIZE = 4096
+PAGE_CACHE = 256
+
+class FlatBufferError(ValueError):
+    """Raised when a FlatBuffer offset points outside its buffer."""
+
+class PagedBuffer:
+    """Read-only view of a source of `size` bytes that only reads the pages it is asked for.
+
+    Lets the reader parse FlatBuffers inside a file that cannot be memory-mapped (e.g.
+    one decrypted on the fly) without reading the data between their tables. Pages
+    come from `pread(size, offset)`, e.g. a PositionalReader's. Supports len(),
+    slicing and unpack_from().
+    """
+    def __init__(self, pread, size):
+        self._pread = pread
+        self._size = size
+        self._pages = {}
+
+    def __len__(self):
+        return self._size
+
+    def _page(self, index):
+        page = self._pages.get(index)
+        if page is None:
+            if len(self._pages) >= PAGE_CACHE:
+                self._pages.clear()
+            page = self._pages[index] = self._pread(PAGE_SIZE, index * PAGE_SIZE)
+        return page
+
+    def __getitem__(self, key):
+        start, stop, _ = key.indices(self._size)
+        if stop <= start:
+            return b''
+        first = start // PAGE_SIZE
+        data = b''.join(self._page(i) for i in range(first, (stop - 1) // PAGE_SIZE + 1))
+        return data[start - first * PAGE_SIZE:stop - first * PAGE_SIZE]
+
+    def unpack_from(self, fmt, pos):
+        size = struct.calcsize(fmt)
+        if pos < 0 or pos + size > self._size:
+            raise struct.error(f"unpack_from requires {size} bytes at {pos}")
+        return struct.unpack(fmt, self[pos:pos + size])
+
+def _unpack_from(fmt, buf, pos):
+    if isinstance(buf, PagedBuffer):
+        return buf.unpack_from(fmt, pos)
+    return struct.unpack_from(fmt, buf, pos)
+
+def _unpack(fmt, buf, pos):
+    try:
+        return _unpack_from(fmt, buf, pos)[0]
+    except struct.error:
+        raise FlatBufferError(f"FlatBuffer read out of bounds at {pos:#x}") from None
+
+class Table:
+    """Read-only view of a FlatBuffers table at absolute position `pos` in `buf`.
+
+    Only what the Trinity formats need is implemented: scalars, offsets to tables,
+    vectors of scalars, vectors of tables and strings. Fields are addressed by their
+    schema index.
+    """
+    def __init__(self, buf, pos):
+        self.buf = buf
+        self.pos = pos
+        self.vtable = pos - _unpack('<i', buf, pos)
+        self.vtable_size = _unpack('<H', buf, self.vtable)
+        self.inline_size = _unpack('<H', buf, self.vtable + 2)
+
+    def field_offset(self, index):
+        entry = 4 + index * 2
+        if entry >= self.vtable_size:
+            return 0
+        return _unpack('<H', self.buf, self.vtable + entry)
+
+    def scalar(self, index, fmt, default=0):
+        offset = self.field_offset(index)
+        return _unpack(fmt, self.buf, self.pos + offset) if offset else default
+
+    def _indirect(self, index):
+        offset = self.field_offset(index)
+        if not offset:
+            return None
+        pos = self.pos + offset
+        return pos + _unpack('<I', self.buf, pos)
+
+    def table(self, index):
+        pos = self._indirect(index)
+        return Table(self.buf, pos) if pos is not None else None
+
+    def vector(self, index):
+        """Returns (start, length) of a vector field; (0, 0) when the field is absent."""
+        pos = self._indirect(index)
+        if pos is None:
+            return 0, 0
+        return pos + 4, _unpack('<I', self.buf, pos)
+
+    def scalar_vector(self, index, fmt):
+        start, length = self.vector(index)
+        if not length:
+            return ()
+        try:
+            return _unpack_from(f'<{length}{fmt}', self.buf, start)
+        except struct.error:
+            raise FlatBufferError(f"FlatBuffer vector out of bounds at {start:#x}") from None
+
+    def tables(self, index):
+        start, length = self.vector(index)
+        return [Table(self.buf, start + i * 4 + _unpack('<I', self.buf, start + i * 4)) for i in range(length)]
+
+    def string(self, index, default=None):
+        start, length = self.vector(index)
+        if start == 0:
+            return default
+        return bytes(self.buf[start:start + length]).decode('utf-8', 'replace')
+
+def root_table(buf, base=0):
+    """Returns the root table of the FlatBuffer that starts at `base` in `buf`."""
+    return Table(buf, base + _unpack('<I', buf, base))
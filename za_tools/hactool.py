@@ -0,0 +1,215 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+from .profiling import stage
+
+LOG_FLUSH_INTERVAL = 0.25
+PROGRESS_INTERVAL = 1.0
+
+class HactoolError(RuntimeError):
+    """Raised when hactool exits with an error; the message includes a hint when one is known."""
+
+class HactoolCancelled(HactoolError):
+    """Raised when a hactool run is cancelled; the process is stopped and partial output removed."""
+
+# --- HACTOOL DISCOVERY ---
+def find_hactool(search_dir=None):
+    """Returns the hactool executable next to `search_dir` or on PATH, or None."""
+    if search_dir:
+        for name in ("hactool.exe", "hactool"):
+            candidate = os.path.join(search_dir, name)
+            if os.path.isfile(candidate):
+                return candidate
+    return shutil.which("hactool") or shutil.which("hactool.exe")
+
+def romfs_output_dir(nca_path, output_dir):
+    """Returns the '<nca name>_romfs' directory used for an NCA's extracted RomFS, by hactool and the built-in reader alike."""
+    nca_basename = os.path.basename(os.path.normpath(nca_path))
+    return os.path.normpath(os.path.join(output_dir, os.path.splitext(nca_basename)[0] + "_romfs"))
+
+def _start_hactool(command):
+    return subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding='utf-8',
+        errors='replace',
+        creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+    )
+
+def _run_hactool(command):
+    process = _start_hactool(command)
+    stdout, stderr = process.communicate()
+    return process.returncode, stdout, stderr
+
+def _pump_lines(stream, name, lines):
+    for line in stream:
+        lines.put((name, line.rstrip('\n')))
+    lines.put((name, None))
+
+def _directory_size(path):
+    total = 0
+    pending = [path]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    else:
+                        total += entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            # Directory not created yet, or removed while scanning
+            pass
+    return total
+
+def _stop_process(process):
+    process.terminate()
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+def _run_hactool_streaming(command, log_callback, output_path=None, progress_callback=None, cancel_event=None):
+    """Runs hactool while streaming its output and progress. Returns (returncode, stderr).
+
+    Both pipes are read line by line on helper threads. Lines reach `log_callback` in
+    batches (one call per LOG_FLUSH_INTERVAL), so a chatty run does not flood the UI,
+    and `progress_callback(bytes_written)` reports the size of `output_path` every
+    PROGRESS_INTERVAL. Setting `cancel_event` terminates hactool and raises
+    HactoolCancelled.
+    """
+    process = _start_hactool(command)
+    lines = queue.Queue()
+    for stream, name in ((process.stdout, 'stdout'), (process.stderr, 'stderr')):
+        threading.Thread(target=_pump_lines, args=(stream, name, lines), daemon=True).start()
+
+    pending, stderr_lines = [], []
+    open_streams = 2
+    last_flush = last_progress = time.monotonic()
+    try:
+        while open_streams:
+            try:
+                name, line = lines.get(timeout=0.1)
+                if line is None:
+                    open_streams -= 1
+                else:
+                    pending.append(line)
+                    if name == 'stderr':
+                        stderr_lines.append(line)
+            except queue.Empty:
+                pass
+            if cancel_event is not None and cancel_event.is_set():
+                raise HactoolCancelled("Hactool was cancelled.")
+            now = time.monotonic()
+            if pending and now - last_flush >= LOG_FLUSH_INTERVAL:
+                log_callback("\n".join(pending))
+                pending = []
+                last_flush = now
+            if progress_callback and output_path and now - last_progress >= PROGRESS_INTERVAL:
+                progress_callback(_directory_size(output_path))
+                last_progress = now
+    except BaseException:
+        # Cancelled, Ctrl+C or a failing callback: never leave hactool running
+        if process.poll() is None:
+            _stop_process(process)
+        raise
+    finally:
+        if pending:
+            log_callback("\n".join(pending))
+    process.wait()
+    if progress_callback and output_path:
+        progress_callback(_directory_size(output_path))
+    return process.returncode, "\n".join(stderr_lines)
+
+def _error_hint(stderr):
+    if "key" in stderr.lower():
+        return "Hint: This error might be caused by an invalid or incomplete keys file (prod.keys)."
+    if "Is NCA file a gamecard image?" in stderr or "PFS0 magic is invalid" in stderr:
+        return "Hint: This NCA file likely does not contain a RomFS section (e.g., it could be an update or metadata). Try the largest NCA file from the game."
+    return None
+
+# --- CORE HACTOOL LOGIC ---
+def run_hactool_logic(hactool_path, keys_path, nca_path, output_dir, log_callback, progress_callback=None, cancel_event=None):
+    """Extracts the RomFS of an NCA with hactool.
+
+    hactool's output is logged live, and `progress_callback(bytes_written, nca_size)` is
+    driven by the size of the RomFS directory (the RomFS is slightly smaller than the
+    NCA, so it approaches but may not reach the total). Setting `cancel_event` stops
+    hactool, removes a partially written RomFS directory and raises HactoolCancelled.
+
+    Returns the RomFS output directory, or None if hactool succeeded but the NCA had no
+    RomFS section. Raises HactoolError on a non-zero exit and FileNotFoundError if
+    hactool itself is missing.
+    """
+    hactool_path = os.path.normpath(hactool_path)
+    keys_path = os.path.normpath(keys_path)
+    nca_path = os.path.normpath(nca_path)
+    romfs_output_path = romfs_output_dir(nca_path, output_dir)
+
+    command = [
+        hactool_path,
+        "-k", keys_path,
+        "--romfsdir", romfs_output_path,
+        nca_path
+    ]
+
+    log_callback(f"Target directory for RomFS: {romfs_output_path}\n")
+    formatted_command = ' '.join(f'"{c}"' for c in command)
+    log_callback(f"Running command:\n{formatted_command}\n")
+
+    existed_before = os.path.exists(romfs_output_path)
+    nca_size = os.path.getsize(nca_path)
+    progress = (lambda written: progress_callback(written, nca_size)) if progress_callback else None
+
+    log_callback("--- HACTOOL OUTPUT ---")
+    try:
+        with stage('hactool.run', nca_size):
+            returncode, stderr = _run_hactool_streaming(command, log_callback, romfs_output_path, progress, cancel_event)
+    except (HactoolCancelled, KeyboardInterrupt):
+        if not existed_before:
+            shutil.rmtree(romfs_output_path, ignore_errors=True)
+            log_callback("\nCancelled; the partial RomFS directory was removed.")
+        else:
+            log_callback("\nCancelled; the RomFS directory existed before this run and was left in place.")
+        raise
+    log_callback("----------------------")
+
+    if returncode != 0:
+        hint = _error_hint(stderr)
+        if hint:
+            log_callback("\n" + hint)
+        raise HactoolError(f"Hactool exited with an error (code: {returncode}). Check the logs.")
+
+    log_callback("\nOperation finished!")
+    if os.path.exists(romfs_output_path) and os.listdir(romfs_output_path):
+        return romfs_output_path
+    log_callback("\nINFO: Hactool finished successfully, but the RomFS directory was not created. This NCA file probably did not contain a RomFS partition.")
+    return None
+
+def list_romfs(hactool_path, keys_path, nca_path):
+    """Returns the RomFS file paths of an NCA as reported by 'hactool --listromfs'."""
+    returncode, stdout, stderr = _run_hactool([hactool_path, "-k", keys_path, "--listromfs", nca_path])
+    if returncode != 0:
+        raise HactoolError(_error_hint(stderr) or stderr.strip() or f"Hactool exited with code {returncode}")
+    paths = []
+    for line in stdout.splitlines():
+        line = line.strip()
+        if line.startswith("rom:"):
+            line = line[4:]
+        if line.startswith('/'):
+            paths.append(line)
+    return paths
+
+def verify_nca(hactool_path, keys_path, nca_path):
+    """Runs hactool's hash and signature verification. Returns (ok, output)."""
+    returncode, stdout, stderr = _run_hactool([hactool_path, "-k", keys_path, "-y", nca_path])
+    output = (stdout + stderr).strip()
+    ok = returncode == 0 and "(FAIL)" not in output
+    return ok, output
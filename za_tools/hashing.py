@@ -0,0 +1,77 @@
+import hashlib
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the batched hasher falls back to the scalar loop
+    np = None
+
+try:
+    import xxhash
+except ImportError:  # xxhash is optional; BLAKE2b from hashlib is used instead
+    xxhash = None
+
+# --- FNV-1a HASHING IMPLEMENTATION ---
+def fnv1a_64_hash(data: bytes) -> int:
+    """Computes the 64-bit FNV-1a hash of the given data."""
+    PRIME = 0x100000001b3
+    BASIS = 0xcbf29ce484222645
+    h = BASIS
+    for byte in data:
+        h ^= byte
+        h = (h * PRIME) & 0xFFFFFFFFFFFFFFFF
+    return h
+
+FNV_BATCH_THRESHOLD = 64
+
+def fnv1a_64_hash_many(names):
+    """Computes the 64-bit FNV-1a hash of every byte string in `names` in one call.
+
+    With NumPy available the names are hashed one byte position at a time across all
+    names, so the Python-level loop runs once per byte position instead of once per
+    byte. Names are ordered longest first and stored back to back as uint8, with no
+    padding: each step gathers byte c of the names still longer than c (a prefix of
+    the rows) and widens only those to uint64, so memory stays close to the size of
+    the names even with one very long outlier. Results are bit-identical to
+    fnv1a_64_hash.
+    """
+    names = list(names)
+    count = len(names)
+    if np is None or count < FNV_BATCH_THRESHOLD:
+        return [fnv1a_64_hash(name) for name in names]
+
+    lengths = np.fromiter(map(len, names), dtype=np.int64, count=count)
+    order = np.argsort(-lengths, kind='stable')
+    max_len = int(lengths[order[0]])
+    if max_len == 0:
+        return [0xcbf29ce484222645] * count
+
+    data = np.frombuffer(b''.join(names[i] for i in order.tolist()), dtype=np.uint8)
+    # positions[r] = where the next byte of row r is; every row starts at its name
+    positions = np.zeros(count, dtype=np.int64)
+    np.cumsum(lengths[order][:-1], out=positions[1:])
+    # active[c] = number of names longer than c, i.e. rows still hashing at byte c
+    active = count - np.cumsum(np.bincount(lengths, minlength=max_len + 1))[:max_len]
+
+    prime = np.uint64(0x100000001b3)
+    hashes = np.full(count, 0xcbf29ce484222645, dtype=np.uint64)
+    for rows in active.tolist():
+        head = hashes[:rows]
+        row_positions = positions[:rows]
+        head ^= data.take(row_positions).astype(np.uint64)
+        head *= prime
+        row_positions += 1
+
+    result = np.empty(count, dtype=np.uint64)
+    result[order] = hashes
+    return result.tolist()
+
+# --- CONTENT HASHING ---
+CONTENT_HASH_NAME = 'xxh3_128' if xxhash is not None else 'blake2b-128'
+
+def content_hasher(name=CONTENT_HASH_NAME):
+    """Returns a new hashlib-style object for the fast content hash `name`."""
+    if name == 'xxh3_128' and xxhash is not None:
+        return xxhash.xxh3_128()
+    if name == 'blake2b-128':
+        return hashlib.blake2b(digest_size=16)
+    raise ValueError(f"Unsupported content hash: {name}")
@@ -0,0 +1,193 @@
+import bisect
+import hashlib
+import mmap
+import os
+import struct
+from array import array
+
+from .hashing import fnv1a_64_hash
+from .pack_table import PackTable
+from .profiling import stage
+from .trpfs import NameIndex, DataArchiveMap, build_pack_table
+
+# --- INDEX CACHE ---
+INDEX_CACHE_MAGIC = b"ZATRPIDX"
+INDEX_CACHE_VERSION = 4
+INDEX_CACHE_DIR = os.environ.get('ZA_TOOLS_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'za_tools')
+SOURCE_HEADER_HASH_BYTES = 64 * 1024
+
+# magic, version, pack count, string blob size, then (size, mtime_ns, header digest) for .trpfd and .trpfs
+_CACHE_HEADER = struct.Struct('<8sIIQ QQ16s QQ16s')
+# hash, offset, size, name offset, name length -- records are sorted by hash
+_CACHE_RECORD = struct.Struct('<QQQII')
+
+def source_key(fname):
+    """Identifies one version of a game file by size, mtime and a digest of its first bytes."""
+    st = os.stat(fname)
+    with open(fname, 'rb') as f:
+        digest = hashlib.blake2b(f.read(SOURCE_HEADER_HASH_BYTES), digest_size=16).digest()
+    return st.st_size, st.st_mtime_ns, digest
+
+def _cache_path(trpfd_path, trpfs_path, cache_dir):
+    key = os.path.abspath(trpfd_path) + '\0' + os.path.abspath(trpfs_path)
+    return os.path.join(cache_dir, hashlib.blake2b(key.encode('utf-8'), digest_size=12).hexdigest() + '.idx')
+
+class _HashColumn:
+    """Sequence view over the hash field of the cache records, for bisect."""
+    def __init__(self, index):
+        self._index = index
+
+    def __len__(self):
+        return len(self._index)
+
+    def __getitem__(self, i):
+        return struct.unpack_from('<Q', self._index._buf, self._index._records_start + i * _CACHE_RECORD.size)[0]
+
+class _NameColumn:
+    """Sequence view over pack names in sorted order, for bisect."""
+    def __init__(self, index):
+        self._index = index
+
+    def __len__(self):
+        return len(self._index)
+
+    def __getitem__(self, i):
+        return self._index._name(self._index._by_name(i))
+
+class PackIndex:
+    """Read-only pack table backed by a serialized index (usually an mmap of the cache file).
+
+    Records are sorted by name hash for O(log n) lookups, followed by two permutations
+    that list them by offset and by name, and finally a blob holding every pack name.
+    """
+    def __init__(self, buf):
+        self._buf = buf
+        fields = _CACHE_HEADER.unpack_from(buf, 0)
+        magic, version, self.count, blob_size = fields[:4]
+        if magic != INDEX_CACHE_MAGIC or version != INDEX_CACHE_VERSION:
+            raise IOError("Not a valid TRPFS index cache")
+        self.trpfd_key = fields[4:7]
+        self.trpfs_key = fields[7:10]
+        self._records_start = _CACHE_HEADER.size
+        self._order_start = self._records_start + self.count * _CACHE_RECORD.size
+        self._name_order_start = self._order_start + self.count * 4
+        self._blob_start = self._name_order_start + self.count * 4
+        if len(buf) < self._blob_start + blob_size:
+            raise IOError("TRPFS index cache is truncated")
+
+    def __len__(self):
+        return self.count
+
+    def _name(self, i):
+        name_off, name_len = struct.unpack_from('<II', self._buf, self._records_start + i * _CACHE_RECORD.size + 24)
+        start = self._blob_start + name_off
+        return bytes(self._buf[start:start + name_len]).decode('utf-8')
+
+    def _by_name(self, i):
+        return struct.unpack_from('<I', self._buf, self._name_order_start + i * 4)[0]
+
+    def _record(self, i):
+        pack_hash, offset, size, _, _ = _CACHE_RECORD.unpack_from(self._buf, self._records_start + i * _CACHE_RECORD.size)
+        return {'name': self._name(i), 'hash': pack_hash, 'offset': offset, 'size': size}
+
+    def lookup_hash(self, pack_hash):
+        """Returns the pack dict for a name hash, or None."""
+        i = bisect.bisect_left(_HashColumn(self), pack_hash)
+        if i < self.count and _HashColumn(self)[i] == pack_hash:
+            return self._record(i)
+        return None
+
+    def lookup(self, name):
+        """Returns the pack dict for an exact pack path, or None."""
+        return self.lookup_hash(fnv1a_64_hash(name.encode('utf-8')))
+
+    def __iter__(self):
+        """Iterates packs in offset order."""
+        for (i,) in struct.iter_unpack('<I', self._buf[self._order_start:self._name_order_start]):
+            yield self._record(i)
+
+    def iter_prefix(self, prefix):
+        """Yields packs whose name starts with `prefix`, in name order, via a bisect over the sorted names."""
+        names = _NameColumn(self)
+        i = bisect.bisect_left(names, prefix)
+        while i < self.count:
+            record = self._by_name(i)
+            if not self._name(record).startswith(prefix):
+                break
+            yield self._record(record)
+            i += 1
+
+    def pack_map(self):
+        """Returns the offset-sorted list of pack dicts expected by extract_packs."""
+        return list(self)
+
+    def close(self):
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+
+def serialize_pack_index(pack_table, trpfd_key, trpfs_key):
+    """Serializes a PackTable (see build_pack_table) into the cache format.
+
+    An offset-sorted list of pack dicts is accepted too.
+    """
+    if not isinstance(pack_table, PackTable):
+        pack_table = PackTable.from_pack_map(pack_table)
+    count = len(pack_table)
+    by_hash = pack_table.hash_order()
+
+    out = bytearray(_CACHE_HEADER.size + count * (_CACHE_RECORD.size + 8) + len(pack_table.name_blob))
+    _CACHE_HEADER.pack_into(out, 0, INDEX_CACHE_MAGIC, INDEX_CACHE_VERSION, count, len(pack_table.name_blob), *trpfd_key, *trpfs_key)
+    position = array('I', bytes(4 * count))
+    names = pack_table.name_offsets
+    for i, row in enumerate(by_hash):
+        _CACHE_RECORD.pack_into(out, _CACHE_HEADER.size + i * _CACHE_RECORD.size, pack_table.hashes[row], pack_table.offsets[row],
+                                pack_table.sizes[row], names[row], names[row + 1] - names[row])
+        position[row] = i
+
+    # Rows are already in offset order; map them (and the name order) to record numbers
+    order_start = _CACHE_HEADER.size + count * _CACHE_RECORD.size
+    struct.pack_into(f'<{count}I', out, order_start, *(position[row] for row in range(count)))
+    struct.pack_into(f'<{count}I', out, order_start + 4 * count, *(position[row] for row in pack_table.name_order()))
+    out[order_start + 8 * count:] = pack_table.name_blob
+    return bytes(out)
+
+def _map_cache_file(path):
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def load_pack_index(trpfd_path, trpfs_path, cache_dir=None, use_cache=True):
+    """Returns a PackIndex for the given game files, reusing the on-disk cache when it is current.
+
+    The cache is keyed on the size, mtime and header digest of both files, so it is
+    rebuilt automatically whenever the game files change. If the cache directory is
+    not writable the freshly built index is simply kept in memory.
+    """
+    cache_dir = cache_dir or INDEX_CACHE_DIR
+    trpfd_key = source_key(trpfd_path)
+    trpfs_key = source_key(trpfs_path)
+    path = _cache_path(trpfd_path, trpfs_path, cache_dir)
+
+    if use_cache and os.path.isfile(path):
+        try:
+            index = PackIndex(_map_cache_file(path))
+            if index.trpfd_key == trpfd_key and index.trpfs_key == trpfs_key:
+                return index
+            index.close()
+        except (IOError, ValueError, struct.error):
+            pass
+
+    with stage('trpfs.parse'):
+        pack_table = build_pack_table(NameIndex(trpfd_path), DataArchiveMap(trpfs_path), trpfs_key[0])
+    data = serialize_pack_index(pack_table, trpfd_key, trpfs_key)
+
+    if use_cache:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            return PackIndex(_map_cache_file(path))
+        except OSError:
+            pass
+    return PackIndex(data)
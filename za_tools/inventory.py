@@ -0,0 +1,188 @@
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from .compression import decode_head, detect_codec, head_input_size
+from .fileio import PositionalReader
+from .flatbuffers import FlatBufferError, PagedBuffer, root_table
+from .magic import SNIFF_BYTES, sniff_type
+from .selection import compile_patterns
+from .slicer import DEFAULT_WORKERS
+from .trpak import TrpakError, parse_trpak
+
+# Enough for every magic in MAGIC_TYPES and the root table of a TRPAK
+INVENTORY_HEAD_BYTES = 64
+INVENTORY_BATCH = 1024
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS packs (
+    name TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    type TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS packs_type ON packs (type);
+CREATE TABLE IF NOT EXISTS files (
+    pack TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    codec TEXT NOT NULL,
+    type TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_type ON files (type);
+CREATE INDEX IF NOT EXISTS files_pack ON files (pack);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# --- CLASSIFICATION ---
+def _is_trpak_head(head, size):
+    """True if `head` starts a FlatBuffer whose root table has the two TRPAK fields inside `size` bytes."""
+    try:
+        root = root_table(head)
+        if root.vtable_size < 8:
+            return False
+        for index in (0, 1):
+            field = root.field_offset(index)
+            if not field or root.pos + field + 4 > len(head):
+                return False
+            target = root.pos + field + int.from_bytes(head[root.pos + field:root.pos + field + 4], 'little')
+            if target + 4 > size:
+                return False
+        return True
+    except FlatBufferError:
+        return False
+
+def classify_head(head, size):
+    """Returns the content type of a slice from its first bytes: a MAGIC_TYPES extension, 'trpak' or 'bin'."""
+    kind = sniff_type(head[:SNIFF_BYTES], None)
+    if kind is not None:
+        return kind
+    return 'trpak' if _is_trpak_head(head, size) else 'bin'
+
+def classify_inner_files(buf, pack):
+    """Classifies the inner files of the TRPAK `pack` in `buf` by the start of their decoded data.
+
+    Returns one {'hash', 'size', 'codec', 'type'} dict per file. Only the file table and
+    the first bytes of each file are decoded (for Oodle, its first block). A file
+    whose codec cannot be decoded here (Oodle without an oo2core library, LZ4 without
+    the lz4 package) gets its codec as type.
+    """
+    files = []
+    for entry in parse_trpak(buf, pack['offset'], pack['offset'] + pack['size']):
+        start = entry['data_offset']
+        codec = detect_codec(entry['compression'], buf[start:start + SNIFF_BYTES], entry['data_size'], entry['size'])
+        head = decode_head(codec, buf[start:start + head_input_size(codec, entry['data_size'])], entry['size'], SNIFF_BYTES)
+        files.append({'hash': entry['hash'], 'size': entry['size'], 'codec': codec,
+                      'type': sniff_type(head) if head is not None else codec})
+    return files
+
+def content_types(row):
+    """The types an inventory row holds: those of its inner files for a TRPAK, else its own type."""
+    return {inner['type'] for inner in row['files']} if row['files'] else {row['type']}
+
+# --- INVENTORY ---
+def _classify_batch(reader, packs):
+    # One page cache per batch: neighbouring packs share pages and batches run in parallel
+    buf = PagedBuffer(reader.pread, reader.size)
+    results = []
+    for pack in packs:
+        kind = classify_head(buf[pack['offset']:pack['offset'] + min(pack['size'], INVENTORY_HEAD_BYTES)], pack['size'])
+        files = []
+        if kind == 'trpak':
+            try:
+                files = classify_inner_files(buf, pack)
+            except TrpakError:
+                kind = 'bin'
+        results.append((kind, files))
+    return results
+
+def inventory_packs(trpfs_source, packs, workers=DEFAULT_WORKERS, progress_callback=None):
+    """Classifies every pack, and every file inside a TRPAK pack, by its magic number.
+
+    Returns the pack dicts with a 'type' key (a MAGIC_TYPES extension, 'trpak' or
+    'bin') and a 'files' list (see classify_inner_files; empty unless the pack is a
+    TRPAK). Only the start of each slice, TRPAK file tables and the first bytes of
+    inner files are read, with positional reads spread over a thread pool in batches
+    of INVENTORY_BATCH packs, so a full game is classified without reading its bulk
+    (Oodle files cost one decoded block each). `trpfs_source` is a path or an open
+    reader (as for extract_packs). `progress_callback(done, total)` is called from
+    the calling thread after each batch.
+    """
+    own_reader = not hasattr(trpfs_source, 'pread')
+    rows = [dict(pack) for pack in packs]
+    batches = [rows[i:i + INVENTORY_BATCH] for i in range(0, len(rows), INVENTORY_BATCH)]
+    done = 0
+    reader_context = PositionalReader(trpfs_source) if own_reader else nullcontext(trpfs_source)
+    with reader_context as reader, ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for batch, kinds in zip(batches, pool.map(lambda batch: _classify_batch(reader, batch), batches)):
+            for row, (kind, files) in zip(batch, kinds):
+                row['type'] = kind
+                row['files'] = files
+            done += len(batch)
+            if progress_callback:
+                progress_callback(done, len(rows))
+    return rows
+
+def summarize_types(rows):
+    """Returns {type: {'count', 'bytes'}} sorted by total size, largest first.
+
+    The files inside TRPAK packs are counted with their decoded size; other packs
+    count as one file of their own type.
+    """
+    summary = {}
+    for row in rows:
+        for kind, size in ([(inner['type'], inner['size']) for inner in row['files']] or [(row['type'], row['size'])]):
+            entry = summary.setdefault(kind, {'count': 0, 'bytes': 0})
+            entry['count'] += 1
+            entry['bytes'] += size
+    return dict(sorted(summary.items(), key=lambda item: item[1]['bytes'], reverse=True))
+
+# --- SQLITE CATALOG ---
+def write_catalog(db_path, rows, source=None):
+    """Writes inventory rows to the SQLite catalog at `db_path`, replacing its previous contents.
+
+    Table `packs` has name, hash (16 hex digits), offset, size and type, indexed by
+    type; `files` has the pack name, hash, decoded size, codec and type of every
+    file inside a TRPAK; `meta` records the source file. Query it with
+    select_from_catalog or any SQLite client, e.g.
+    SELECT DISTINCT pack FROM files WHERE type = 'bntx'.
+    """
+    db = sqlite3.connect(db_path)
+    try:
+        with db:
+            db.executescript(CATALOG_SCHEMA)
+            db.execute("DELETE FROM packs")
+            db.execute("DELETE FROM files")
+            db.executemany("INSERT INTO packs VALUES (?, ?, ?, ?, ?)",
+                           ((row['name'], f"{row['hash']:016x}", row['offset'], row['size'], row['type']) for row in rows))
+            db.executemany("INSERT INTO files VALUES (?, ?, ?, ?, ?)",
+                           ((row['name'], f"{inner['hash']:016x}", inner['size'], inner['codec'], inner['type'])
+                            for row in rows for inner in row['files']))
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('source', ?)", (os.path.abspath(source) if source else '',))
+    finally:
+        db.close()
+
+def select_from_catalog(db_path, types=None, patterns=None):
+    """Returns the catalog pack rows (dicts, in offset order) that match `types` and `patterns`.
+
+    A pack matches `types` when its own type or that of a file inside it is listed.
+    """
+    query = "SELECT name, hash, offset, size, type FROM packs"
+    params = []
+    if types:
+        placeholders = ', '.join('?' * len(types))
+        query += f" WHERE type IN ({placeholders}) OR name IN (SELECT pack FROM files WHERE type IN ({placeholders}))"
+        params.extend(types)
+        params.extend(types)
+    query += " ORDER BY offset"
+    db = sqlite3.connect(db_path)
+    try:
+        rows = [{'name': name, 'hash': int(pack_hash, 16), 'offset': offset, 'size': size, 'type': kind}
+                for name, pack_hash, offset, size, kind in db.execute(query, params)]
+    finally:
+        db.close()
+    if patterns:
+        matches = compile_patterns(patterns)
+        rows = [row for row in rows if matches(row['name'])]
+    return rows
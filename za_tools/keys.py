@@ -0,0 +1,46 @@
+import struct
+
+from .crypto import aes_ecb
+
+KEY_AREA_KEY_NAMES = ("key_area_key_application", "key_area_key_ocean", "key_area_key_system")
+
+class MissingKeyError(KeyError):
+    """Raised when a key needed for decryption is not in the keys file."""
+    def __str__(self):
+        return f"Key '{self.args[0]}' is missing from the keys file"
+
+# --- KEYS FILES ---
+def load_keys(fname):
+    """Parses a prod.keys / title.keys style file ('name = hex' per line) into {name: bytes}."""
+    keyset = {}
+    with open(fname, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line = line.split('#', 1)[0].split(';', 1)[0]
+            if '=' not in line:
+                line = line.replace(',', '=', 1)
+            if '=' not in line:
+                continue
+            name, value = (part.strip() for part in line.split('=', 1))
+            try:
+                keyset[name.lower()] = bytes.fromhex(value)
+            except ValueError:
+                continue
+    return keyset
+
+def get_key(keyset, name):
+    try:
+        return keyset[name]
+    except KeyError:
+        raise MissingKeyError(name) from None
+
+# --- TITLE KEYS ---
+def parse_ticket(data):
+    """Returns (rights_id, encrypted_title_key) from an RSA-2048 signed ticket (.tik)."""
+    signature_type = struct.unpack_from('<I', data, 0)[0]
+    if signature_type != 0x10004:
+        raise ValueError(f"Unsupported ticket signature type {signature_type:#x}")
+    return bytes(data[0x2A0:0x2B0]), bytes(data[0x180:0x190])
+
+def decrypt_title_key(keyset, encrypted_title_key, master_key_revision):
+    """Decrypts a common ticket title key with titlekek_XX."""
+    return aes_ecb(get_key(keyset, f"titlekek_{master_key_revision:02x}"), encrypted_title_key)
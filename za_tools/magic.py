@@ -0,0 +1,33 @@
+# --- CONTENT TYPE SNIFFING ---
+# (magic prefix, extension), checked in order
+MAGIC_TYPES = [
+    (b"BNTX", "bntx"),
+    (b"BNSH", "bnsh"),
+    (b"FRES", "bfres"),
+    (b"VFXB", "ptcl"),
+    (b"SARC", "sarc"),
+    (b"Yaz0", "szs"),
+    (b"FFNT", "bffnt"),
+    (b"BARS", "bars"),
+    (b"BWAV", "bwav"),
+    (b"AAMP", "aamp"),
+    (b"BY\x03\x00", "byml"),
+    (b"YB\x00\x03", "byml"),
+    (b"MsgStdBn", "msbt"),
+    (b"OTTO", "otf"),
+    (b"\x00\x01\x00\x00", "ttf"),
+    (b"PFS0", "pfs0"),
+    (b"ONEPACK\x00", "trpfs"),
+    (b"\x28\xb5\x2f\xfd", "zst"),
+    (b"\x04\x22\x4d\x18", "lz4"),
+]
+
+SNIFF_BYTES = max(len(magic) for magic, _ in MAGIC_TYPES)
+
+def sniff_type(head, default="bin"):
+    """Returns a file extension for data starting with `head`, based on its magic number."""
+    head = bytes(head[:SNIFF_BYTES])
+    for magic, extension in MAGIC_TYPES:
+        if head.startswith(magic):
+            return extension
+    return default
@@ -0,0 +1,79 @@
+import json
+import os
+
+MANIFEST_NAME = '.za_manifest.jsonl'
+
+def source_id(key):
+    """Turns a (size, mtime_ns, digest) source key into the short string stored per entry."""
+    size, mtime_ns, digest = key
+    return f"{size}:{mtime_ns}:{digest.hex()}"
+
+class ExtractionManifest:
+    """Append-only journal of extracted packs, kept next to the output.
+
+    Every completed pack is appended as one JSON line (name, offset, size, content hash
+    when one was computed, the output file's mtime_ns and the identity of the
+    data.trpfs it came from) and flushed immediately, so an interrupted run loses at
+    most the packs that were in flight. Later lines override earlier ones; close()
+    compacts the journal to one line per pack.
+    """
+    def __init__(self, output_dir, hash_name):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.hash_name = hash_name
+        self.entries = {}
+        self._journal = None
+        self._load()
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            header = None
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn last line from an interrupted run
+                    break
+                if header is None:
+                    header = record
+                    if header.get('hash_algorithm') != self.hash_name:
+                        # Digests from another algorithm cannot be compared; start over
+                        return
+                    continue
+                self.entries[record['name']] = record
+
+    def get(self, name):
+        return self.entries.get(name)
+
+    def open(self):
+        self._write_compacted()
+        self._journal = open(self.path, 'a', encoding='utf-8')
+
+    def record(self, pack, digest, source, mtime_ns=None):
+        entry = {'name': pack['name'], 'offset': pack['offset'], 'size': pack['size'], 'hash': digest, 'source': source,
+                 'mtime_ns': mtime_ns}
+        self.entries[pack['name']] = entry
+        self._journal.write(json.dumps(entry, separators=(',', ':')) + "\n")
+        self._journal.flush()
+
+    def _write_compacted(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'hash_algorithm': self.hash_name}) + "\n")
+            for entry in self.entries.values():
+                f.write(json.dumps(entry, separators=(',', ':')) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+            self._write_compacted()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,242 @@
+import hashlib
+import io
+import os
+import struct
+import threading
+
+from .crypto import aes_ctr, aes_ecb, aes_xts
+from .hactool import romfs_output_dir
+from .keys import KEY_AREA_KEY_NAMES, decrypt_title_key, get_key, load_keys
+from .profiling import count, stage
+from .romfs import RomFS, extract_romfs_files
+from .selection import compile_patterns
+
+NCA_HEADER_SIZE = 0xC00
+MEDIA_UNIT_SIZE = 0x200
+FS_HEADER_OFFSET = 0x400
+FS_HEADER_SIZE = 0x200
+
+FS_TYPE_ROMFS = 0
+FS_TYPE_PFS0 = 1
+HASH_TYPE_SHA256 = 2
+HASH_TYPE_IVFC = 3
+ENCRYPTION_NONE = 1
+ENCRYPTION_XTS = 2
+ENCRYPTION_CTR = 3
+ENCRYPTION_BKTR = 4
+
+CONTENT_TYPES = ("Program", "Meta", "Control", "Manual", "Data", "PublicData")
+
+class NcaError(IOError):
+    """Raised when an NCA cannot be parsed or decrypted."""
+
+# --- NCA READER ---
+class NcaReader:
+    """Reads and decrypts an NCA in place, without hactool.
+
+    `source` is a path or an open binary file; `base_offset` allows reading an NCA that
+    sits inside a larger file (e.g. an NSP entry) without copying it out. `keyset` comes
+    from keys.load_keys(prod.keys), optionally merged with title.keys. Sections are
+    decrypted on demand in bounded chunks.
+    """
+    def __init__(self, source, keyset, title_key=None, base_offset=0):
+        self._own_file = not hasattr(source, 'read')
+        self._f = open(source, 'rb') if self._own_file else source
+        self._lock = threading.Lock()
+        self.base_offset = base_offset
+        self.keyset = keyset
+
+        raw_header = self._read_raw(0, NCA_HEADER_SIZE)
+        if len(raw_header) < NCA_HEADER_SIZE:
+            raise NcaError("File is too small to be an NCA")
+        self.header = aes_xts(get_key(keyset, 'header_key'), raw_header, 0)
+        self.magic = self.header[0x200:0x204]
+        if self.magic != b"NCA3":
+            raise NcaError(f"Unsupported or undecryptable NCA (magic {self.magic!r}); check header_key")
+
+        h = self.header
+        self.content_type = h[0x205]
+        self.key_area_key_index = h[0x207]
+        self.size, self.title_id = struct.unpack_from('<QQ', h, 0x208)
+        revision = max(h[0x206], h[0x220])
+        self.master_key_revision = revision - 1 if revision > 0 else 0
+        self.rights_id = bytes(h[0x230:0x240])
+        self._title_key = title_key
+        self._section_key = None
+
+        self.sections = []
+        for i in range(4):
+            media_start, media_end = struct.unpack_from('<II', h, 0x240 + i * 0x10)
+            if media_end <= media_start:
+                continue
+            fs_header = h[FS_HEADER_OFFSET + i * FS_HEADER_SIZE:FS_HEADER_OFFSET + (i + 1) * FS_HEADER_SIZE]
+            self.sections.append({
+                'index': i,
+                'offset': media_start * MEDIA_UNIT_SIZE,
+                'size': (media_end - media_start) * MEDIA_UNIT_SIZE,
+                'fs_type': fs_header[2],
+                'hash_type': fs_header[3],
+                'encryption_type': fs_header[4],
+                'ctr': bytes(fs_header[0x140:0x148])[::-1],
+                'fs_header': fs_header,
+            })
+
+    @property
+    def content_type_name(self):
+        return CONTENT_TYPES[self.content_type] if self.content_type < len(CONTENT_TYPES) else str(self.content_type)
+
+    def _read_raw(self, offset, size):
+        position = self.base_offset + offset
+        if hasattr(os, 'pread'):
+            try:
+                data = os.pread(self._f.fileno(), size, position)
+                count('pread', len(data))
+                return data
+            except (AttributeError, io.UnsupportedOperation):
+                pass
+        with self._lock:
+            self._f.seek(position)
+            data = self._f.read(size)
+        count('read', len(data))
+        return data
+
+    def section_key(self):
+        """Returns the AES-CTR key for the sections: the title key for rights-ID titles, else key area slot 2."""
+        if self._section_key is not None:
+            return self._section_key
+        if any(self.rights_id):
+            if self._title_key is None:
+                encrypted = self.keyset.get(self.rights_id.hex())
+                if encrypted is None:
+                    raise NcaError(f"NCA uses rights ID {self.rights_id.hex()}; supply its title key (title.keys or the NSP ticket)")
+                self._title_key = decrypt_title_key(self.keyset, encrypted, self.master_key_revision)
+            self._section_key = self._title_key
+        else:
+            kaek_name = f"{KEY_AREA_KEY_NAMES[self.key_area_key_index]}_{self.master_key_revision:02x}"
+            key_area = aes_ecb(get_key(self.keyset, kaek_name), bytes(self.header[0x300:0x340]))
+            self._section_key = key_area[0x20:0x30]
+        return self._section_key
+
+    def read_section(self, section, offset, size):
+        """Returns `size` decrypted bytes at `offset` within a section (clamped to the section end)."""
+        size = max(0, min(size, section['size'] - offset))
+        if size == 0:
+            return b''
+        position = section['offset'] + offset
+        encryption = section['encryption_type']
+        if encryption == ENCRYPTION_NONE:
+            return self._read_raw(position, size)
+        if encryption != ENCRYPTION_CTR:
+            raise NcaError(f"Section {section['index']} uses unsupported encryption type {encryption}")
+        aligned = position & ~0xF
+        skip = position - aligned
+        raw = self._read_raw(aligned, size + skip)
+        counter = section['ctr'] + (aligned >> 4).to_bytes(8, 'big')
+        with stage('nca.decrypt', len(raw)):
+            return aes_ctr(self.section_key(), counter).update(raw)[skip:skip + size]
+
+    def verify_headers(self):
+        """Checks each FS header against the SHA-256 stored in the NCA header. Returns a list of problems."""
+        problems = []
+        for section in self.sections:
+            expected = self.header[0x280 + section['index'] * 0x20:0x2A0 + section['index'] * 0x20]
+            if hashlib.sha256(section['fs_header']).digest() != expected:
+                problems.append(f"FS header {section['index']} hash mismatch")
+        return problems
+
+    # --- SECTION CONTENTS ---
+    def romfs_section(self):
+        for section in self.sections:
+            if section['fs_type'] == FS_TYPE_ROMFS and section['hash_type'] == HASH_TYPE_IVFC:
+                return section
+        return None
+
+    def romfs(self):
+        """Returns a RomFS over the decrypted RomFS section, or None if the NCA has none."""
+        section = self.romfs_section()
+        if section is None:
+            return None
+        # IVFC: the last (6th) level holds the actual RomFS image
+        level_offset = struct.unpack_from('<Q', section['fs_header'], 0x18 + 5 * 0x18)[0]
+        return RomFS(lambda size, offset: self.read_section(section, offset, size), level_offset)
+
+    def pfs0_region(self):
+        """Returns (section, offset, size) of the PFS0 image in the first PFS0 section, or None."""
+        for section in self.sections:
+            if section['fs_type'] == FS_TYPE_PFS0 and section['hash_type'] == HASH_TYPE_SHA256:
+                offset, size = struct.unpack_from('<QQ', section['fs_header'], 0x40)
+                return section, offset, size
+        return None
+
+    def close(self):
+        if self._own_file:
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# --- HIGH-LEVEL OPERATIONS ---
+def load_keyset(keys_path, title_keys_path=None):
+    """Loads prod.keys and, if given, title.keys into one keyset."""
+    keyset = load_keys(keys_path)
+    if title_keys_path:
+        keyset.update(load_keys(title_keys_path))
+    return keyset
+
+def list_nca_romfs(nca_path, keyset):
+    """Returns the RomFS file entries (path, offset, size) of an NCA; empty if it has no RomFS."""
+    with NcaReader(nca_path, keyset) as nca:
+        romfs = nca.romfs()
+        return romfs.files if romfs else []
+
+def extract_nca_romfs(nca_path, keyset, output_dir, patterns=None, log_callback=None, progress_callback=None):
+    """Extracts (selected) RomFS files of an NCA into '<output_dir>/<nca name>_romfs'.
+
+    Files are decrypted and written in bounded chunks. Returns the RomFS output
+    directory, or None if the NCA has no RomFS section.
+    """
+    log = log_callback or (lambda message: None)
+    romfs_output_path = romfs_output_dir(nca_path, output_dir)
+    with stage('nca.headers'):
+        nca = NcaReader(nca_path, keyset)
+    with nca:
+        log(f"NCA3 {nca.content_type_name}, title {nca.title_id:016x}, {len(nca.sections)} sections")
+        with stage('nca.romfs_tables'):
+            romfs = nca.romfs()
+        if romfs is None:
+            log("INFO: This NCA file does not contain a RomFS section.")
+            return None
+        matches = compile_patterns(patterns)
+        entries = [entry for entry in romfs.files if matches(entry['path'])]
+        log(f"Extracting {len(entries)} of {len(romfs.files)} RomFS files to {romfs_output_path}")
+        extract_romfs_files(romfs, romfs_output_path, entries, progress_callback)
+    return romfs_output_path
+
+def verify_nca_romfs(nca_path, keyset, output_dir=None, patterns=None):
+    """Checks the FS header hashes and, with `output_dir`, the sizes of an extracted RomFS.
+
+    `patterns` limits the size check to the files an `extract` with the same patterns wrote.
+    Returns a report dict with 'ok', 'missing', 'size_mismatch' and 'header_problems'.
+    """
+    report = {'ok': [], 'missing': [], 'size_mismatch': [], 'header_problems': []}
+    with NcaReader(nca_path, keyset) as nca:
+        report['header_problems'] = nca.verify_headers()
+        romfs = nca.romfs()
+        if output_dir is None or romfs is None:
+            return report
+        base = romfs_output_dir(nca_path, output_dir)
+        wanted = compile_patterns(patterns)
+        for entry in romfs.files:
+            if not wanted(entry['path']):
+                continue
+            path = os.path.join(base, entry['path'].replace('/', os.sep))
+            if not os.path.isfile(path):
+                report['missing'].append(entry['path'])
+            elif os.path.getsize(path) != entry['size']:
+                report['size_mismatch'].append({'name': entry['path'], 'expected': entry['size'], 'actual': os.path.getsize(path)})
+            else:
+                report['ok'].append(entry['path'])
+    return report
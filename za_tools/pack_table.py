@@ -0,0 +1,148 @@
+import bisect
+from array import array
+
+from .hashing import fnv1a_64_hash
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; the joins fall back to plain Python
+    np = None
+
+# --- PACK TABLE ---
+class _HashView:
+    """Sequence view over the table's hashes in sorted order, for bisect."""
+    def __init__(self, table):
+        self._table = table
+        self._order = table.hash_order()
+
+    def __len__(self):
+        return len(self._order)
+
+    def __getitem__(self, i):
+        return self._table.hashes[self._order[i]]
+
+class _NameView:
+    """Sequence view over the table's names in sorted order, for bisect."""
+    def __init__(self, table):
+        self._table = table
+        self._order = table.name_order()
+
+    def __len__(self):
+        return len(self._order)
+
+    def __getitem__(self, i):
+        return self._table.name(self._order[i])
+
+class PackTable:
+    """Pack table held in parallel columns instead of one dict per pack.
+
+    Rows are in offset order. `hashes`, `offsets` and `sizes` are array('Q') columns and
+    every name lives in one UTF-8 blob, row i spanning name_offsets[i]:name_offsets[i + 1].
+    Pack dicts are only created for the rows that are actually looked up or iterated,
+    through the same API as PackIndex.
+    """
+    def __init__(self, hashes, offsets, sizes, name_blob, name_offsets):
+        self.hashes = hashes
+        self.offsets = offsets
+        self.sizes = sizes
+        self.name_blob = name_blob
+        self.name_offsets = name_offsets
+        self._by_hash = None
+        self._by_name = None
+
+    @classmethod
+    def from_pack_map(cls, pack_map):
+        """Builds a table from an offset-sorted list of pack dicts."""
+        encoded = [pack['name'].encode('utf-8') for pack in pack_map]
+        name_offsets = array('Q', [0])
+        for name in encoded:
+            name_offsets.append(name_offsets[-1] + len(name))
+        return cls(array('Q', (p['hash'] for p in pack_map)), array('Q', (p['offset'] for p in pack_map)),
+                   array('Q', (p['size'] for p in pack_map)), b''.join(encoded), name_offsets)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def name(self, i):
+        return self.name_blob[self.name_offsets[i]:self.name_offsets[i + 1]].decode('utf-8')
+
+    def __getitem__(self, i):
+        return {'name': self.name(i), 'hash': self.hashes[i], 'offset': self.offsets[i], 'size': self.sizes[i]}
+
+    def __iter__(self):
+        """Iterates packs in offset order."""
+        for i in range(len(self)):
+            yield self[i]
+
+    def hash_order(self):
+        """Returns the row numbers sorted by name hash."""
+        if self._by_hash is None:
+            self._by_hash = argsort(self.hashes)
+        return self._by_hash
+
+    def name_order(self):
+        """Returns the row numbers sorted by name (UTF-8 byte order, which is also code point order)."""
+        if self._by_name is None:
+            blob, bounds = self.name_blob, self.name_offsets
+            self._by_name = array('I', sorted(range(len(self)), key=lambda i: blob[bounds[i]:bounds[i + 1]]))
+        return self._by_name
+
+    def lookup_hash(self, pack_hash):
+        """Returns the pack dict for a name hash, or None."""
+        hashes = _HashView(self)
+        i = bisect.bisect_left(hashes, pack_hash)
+        if i < len(hashes) and hashes[i] == pack_hash:
+            return self[hashes._order[i]]
+        return None
+
+    def lookup(self, name):
+        """Returns the pack dict for an exact pack path, or None."""
+        return self.lookup_hash(fnv1a_64_hash(name.encode('utf-8')))
+
+    def iter_prefix(self, prefix):
+        """Yields packs whose name starts with `prefix`, in name order."""
+        names = _NameView(self)
+        i = bisect.bisect_left(names, prefix)
+        while i < len(names) and names[i].startswith(prefix):
+            yield self[names._order[i]]
+            i += 1
+
+    def pack_map(self):
+        """Returns the offset-sorted list of pack dicts expected by extract_packs."""
+        return list(self)
+
+    def close(self):
+        pass
+
+# --- COLUMN HELPERS ---
+def argsort(column):
+    """Returns the indices that sort an array('Q') column, as array('I'); ties keep their order."""
+    if np is not None and len(column):
+        return array('I', np.argsort(np.frombuffer(column, dtype=np.uint64), kind='stable').astype(np.uint32).tobytes())
+    return array('I', sorted(range(len(column)), key=column.__getitem__))
+
+def join_hashes(name_hashes, data_hashes, data_offsets):
+    """For every hash in `name_hashes`, finds its offset in the (data_hashes, data_offsets) columns.
+
+    Returns (rows, offsets): the indices into `name_hashes` that were found and their
+    offsets, both as arrays. When a hash appears twice in the data columns the last
+    one wins, as with a dict.
+    """
+    if np is not None and len(name_hashes) and len(data_hashes):
+        wanted = np.frombuffer(name_hashes, dtype=np.uint64)
+        keys = np.frombuffer(data_hashes, dtype=np.uint64)
+        values = np.frombuffer(data_offsets, dtype=np.uint64)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        pos = np.searchsorted(sorted_keys, wanted, side='right') - 1
+        found = (pos >= 0) & (sorted_keys[np.maximum(pos, 0)] == wanted)
+        rows = np.nonzero(found)[0]
+        return array('I', rows.astype(np.uint32).tobytes()), array('Q', values[order[pos[found]]].tobytes())
+    lookup = dict(zip(data_hashes, data_offsets))
+    rows, offsets = array('I'), array('Q')
+    for i, pack_hash in enumerate(name_hashes):
+        offset = lookup.get(pack_hash)
+        if offset is not None:
+            rows.append(i)
+            offsets.append(offset)
+    return rows, offsets
@@ -0,0 +1,360 @@
+import os
+import struct
+from array import array
+
+from .diff import PATCH_MANIFEST
+from .fileio import PositionalReader
+from .flatbuffers import FlatBufferError, root_table
+from .hashing import CONTENT_HASH_NAME, content_hasher, fnv1a_64_hash_many
+from .manifest import MANIFEST_NAME
+from .trpfs import (DEAD_PACK, DEAD_TABLE, EXTENT_RECORD_MAGIC, EXTENT_SIDECAR_SUFFIX, TRPFD_VECTOR_OFFSET, TRPFS_MAGIC,
+                    TRPFS_TABLE_SKIP, DataArchiveMap, NameIndex, TrpfsError, build_pack_table)
+
+# Whole buffers are handed to the OS at offsets that are multiples of the buffer size
+WRITE_BUFFER_SIZE = 8 * 1024 * 1024
+TRPFS_HEADER_SIZE = 16
+# Files our own tools leave in an output directory; never packed
+IGNORED_FILES = (MANIFEST_NAME, PATCH_MANIFEST)
+
+# --- STREAMING WRITER ---
+class _AlignedWriter:
+    """Sequential writer over a descriptor that only issues WRITE_BUFFER_SIZE-aligned writes.
+
+    Data is gathered in one preallocated buffer (input files are read straight into
+    it with readinto) and flushed when it is full, so a multi-gigabyte archive is
+    written in large, aligned blocks with no per-pack allocations.
+    """
+    def __init__(self, fd, position):
+        self.fd = fd
+        self.position = position
+        os.lseek(fd, position, os.SEEK_SET)
+        self._buf = bytearray(WRITE_BUFFER_SIZE)
+        self._view = memoryview(self._buf)
+        self._fill = 0
+        # The first flush stops at the next buffer boundary, later ones are whole buffers
+        self._limit = WRITE_BUFFER_SIZE - position % WRITE_BUFFER_SIZE
+
+    def _flush_full(self):
+        if self._fill == self._limit:
+            self.flush()
+            self._limit = WRITE_BUFFER_SIZE
+
+    def write(self, data):
+        data = memoryview(data)
+        while data:
+            n = min(len(data), self._limit - self._fill)
+            self._view[self._fill:self._fill + n] = data[:n]
+            self._fill += n
+            self.position += n
+            data = data[n:]
+            self._flush_full()
+
+    def copy_from(self, f, size):
+        """Appends `size` bytes read from the binary file object `f`."""
+        while size:
+            n = f.readinto(self._view[self._fill:self._fill + min(size, self._limit - self._fill)])
+            if not n:
+                raise IOError(f"Unexpected end of input, {size} bytes short")
+            self._fill += n
+            self.position += n
+            size -= n
+            self._flush_full()
+
+    def pad_to(self, alignment):
+        if alignment > 1 and self.position % alignment:
+            self.write(bytes(alignment - self.position % alignment))
+
+    def flush(self):
+        view = self._view[:self._fill]
+        while view:
+            view = view[os.write(self.fd, view):]
+        self._fill = 0
+
+# --- INPUT ---
+def collect_pack_files(input_dir):
+    """Returns {pack name: file path} for every file under `input_dir`, names '/'-separated and relative."""
+    packs = {}
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            name = os.path.relpath(path, input_dir).replace(os.sep, '/')
+            if name not in IGNORED_FILES:
+                packs[name] = path
+    return packs
+
+def _check_unique(names, hashes, name_index=None):
+    """Raises ValueError if two names share an FNV-1a hash, among `names` or with a name in `name_index`.
+
+    A name whose hash is in the archive's table but not in `name_index` is taken as
+    the real name of that unnamed pack.
+    """
+    seen = {}
+    if name_index is not None:
+        wanted = set(hashes)
+        seen = {pack_hash: name_index.name(i) for i, pack_hash in enumerate(name_index.hashes) if pack_hash in wanted}
+    for name, pack_hash in zip(names, hashes):
+        if seen.setdefault(pack_hash, name) != name:
+            raise ValueError(f"FNV-1a hash collision between '{seen[pack_hash]}' and '{name}'")
+
+# --- TABLES ---
+def build_trpfd_names(names):
+    """Builds the .trpfd name table read by NameIndex: the vector offset at 0x1C, then length-prefixed strings.
+
+    Only the name vector is written; other fields of the game's own .trpfd are not
+    reproduced.
+    """
+    vector_start = TRPFD_VECTOR_OFFSET + 4
+    strings_start = vector_start + 4 + 4 * len(names)
+    vector = [len(names)]
+    strings = bytearray()
+    for i, name in enumerate(names):
+        vector.append(strings_start + len(strings) - (vector_start + 4 + 4 * i))
+        encoded = name.encode('utf-8')
+        strings += struct.pack('<I', len(encoded)) + encoded + b'\0'
+        strings += bytes(-len(strings) % 4)
+    return (bytes(TRPFD_VECTOR_OFFSET) + struct.pack('<I', vector_start - TRPFD_VECTOR_OFFSET)
+            + struct.pack(f'<{len(vector)}I', *vector) + bytes(strings))
+
+def relocate_preamble(preamble, old_count, new_count):
+    """Returns a table `preamble` copied from a table of `old_count` packs, fixed for `new_count` packs.
+
+    The file table is a FlatBuffer: the preamble holds its root offset, vtable and root
+    table, whose fields point at the offset vector (right after the preamble) and at
+    the hash vector, which follows the offsets and so moves 8 bytes per pack. Fields
+    are recognised by the vector they point at, so their order need not be known. A
+    preamble that is not a FlatBuffer (e.g. zeros) is returned unchanged.
+    """
+    old_hashes = TRPFS_TABLE_SKIP + 8 + 8 * old_count
+    if not preamble or old_count == new_count:
+        return preamble
+    patched = bytearray(preamble)
+    try:
+        root = root_table(preamble)
+        for index in range(max(0, (root.vtable_size - 4) // 2)):
+            pos = root.pos + root.field_offset(index)
+            if pos != root.pos and pos + 4 <= len(preamble) and pos + struct.unpack_from('<I', preamble, pos)[0] == old_hashes:
+                struct.pack_into('<I', patched, pos, old_hashes + 8 * (new_count - old_count) - pos)
+    except FlatBufferError:
+        return preamble
+    return bytes(patched)
+
+def build_trpfs_table(offsets, hashes, preamble=None, gap=None, preamble_count=None):
+    """Builds the file table that DataArchiveMap reads at the header's table offset.
+
+    `preamble` (TRPFS_TABLE_SKIP bytes before the pack count) and `gap` (the 4 bytes
+    before the hash count) are unknown fields, zero unless copied from an original
+    table of `preamble_count` packs (see relocate_preamble).
+    """
+    if preamble_count is not None:
+        preamble = relocate_preamble(preamble, preamble_count, len(offsets))
+    return ((preamble or bytes(TRPFS_TABLE_SKIP)) + struct.pack(f'<I{len(offsets)}Q', len(offsets), *offsets)
+            + (gap or bytes(4)) + struct.pack(f'<I{len(hashes)}Q', len(hashes), *hashes))
+
+def build_extent_sidecar(table_offset, archive_size, sizes, dead_regions=()):
+    """Builds the extent sidecar stored next to data.trpfs (see trpfs.EXTENT_SIDECAR_SUFFIX).
+
+    `sizes` are the exact pack sizes in file table order and `dead_regions` the
+    (offset, size, kind) ranges no pack uses any more. The table offset and size of
+    the archive tie the sidecar to this version of it; data.trpfs itself keeps the
+    game's format byte for byte.
+    """
+    dead = [value for region in dead_regions for value in region]
+    return (struct.pack('<8sQQII', EXTENT_RECORD_MAGIC, table_offset, archive_size, len(sizes), len(dead_regions))
+            + struct.pack(f'<{len(sizes)}Q{len(dead)}Q', *sizes, *dead))
+
+def _read_table_extras(trpfs_path):
+    """Returns (table offset, preamble, gap, pack count) of an existing data.trpfs."""
+    with open(trpfs_path, 'rb') as f:
+        header = f.read(TRPFS_HEADER_SIZE)
+        if header[:8] != TRPFS_MAGIC:
+            raise TrpfsError("Invalid .trpfs signature")
+        table_offset = struct.unpack_from('<Q', header, 8)[0]
+        f.seek(table_offset)
+        preamble = f.read(TRPFS_TABLE_SKIP)
+        pack_count = struct.unpack('<I', f.read(4))[0]
+        f.seek(table_offset + TRPFS_TABLE_SKIP + 4 + 8 * pack_count)
+        gap = f.read(4)
+    return table_offset, preamble, gap, pack_count
+
+def _write_file_atomic(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _remove_if_exists(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+# --- FULL BUILD ---
+def pack_directory(input_dir, trpfs_path, trpfd_path, reference=None, alignment=1, progress_callback=None):
+    """Builds data.trpfs and data.trpfd from a directory of packs (e.g. a modified extraction).
+
+    Pack names are the '/'-separated paths under `input_dir`. With `reference` (the
+    (trpfd, trpfs) pair of the original game) packs keep the original order and the
+    unknown table fields are copied (with the preamble fixed for the new pack count);
+    other packs follow in name order. Packs start at multiples of `alignment`. The
+    archive is written to a temporary file and renamed into place, and the exact pack
+    sizes go to its extent sidecar. Returns the offset-sorted pack dicts.
+    """
+    files = collect_pack_files(input_dir)
+    names = list(files)
+    preamble = gap = preamble_count = None
+    if reference is not None:
+        ref_trpfd, ref_trpfs = reference
+        ref_index = NameIndex(ref_trpfd)
+        ref_map = DataArchiveMap(ref_trpfs)
+        ref_offsets = dict(zip(ref_map.hashes, ref_map.offsets))
+        ref_names = {ref_index.name(i): ref_index.hashes[i] for i in range(len(ref_index))}
+        # Original packs in their original (offset) order, then the new ones by name
+        names.sort(key=lambda name: (0, ref_offsets[ref_names[name]], name) if ref_names.get(name) in ref_offsets
+                   else (1, 0, name))
+        _, preamble, gap, preamble_count = _read_table_extras(ref_trpfs)
+    hashes = fnv1a_64_hash_many(name.encode('utf-8') for name in names)
+    _check_unique(names, hashes)
+
+    sizes = [os.path.getsize(files[name]) for name in names]
+    total_bytes = sum(sizes)
+    packs = []
+    tmp_path = trpfs_path + '.tmp'
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o666)
+    try:
+        writer = _AlignedWriter(fd, 0)
+        writer.write(TRPFS_MAGIC + bytes(8))
+        bytes_done = 0
+        for i, (name, pack_hash, size) in enumerate(zip(names, hashes, sizes)):
+            writer.pad_to(alignment)
+            packs.append({'name': name, 'hash': pack_hash, 'offset': writer.position, 'size': size})
+            with open(files[name], 'rb', buffering=0) as f:
+                writer.copy_from(f, size)
+            bytes_done += size
+            if progress_callback:
+                progress_callback(i + 1, len(names), packs[-1], bytes_done, total_bytes)
+        table_offset = writer.position
+        writer.write(build_trpfs_table([p['offset'] for p in packs], hashes, preamble, gap, preamble_count))
+        writer.flush()
+        archive_size = writer.position
+        os.lseek(fd, 8, os.SEEK_SET)
+        os.write(fd, struct.pack('<Q', table_offset))
+    finally:
+        os.close(fd)
+    # The old sidecar goes first so it never sits next to the new archive
+    _remove_if_exists(trpfs_path + EXTENT_SIDECAR_SUFFIX)
+    os.replace(tmp_path, trpfs_path)
+    _write_file_atomic(trpfs_path + EXTENT_SIDECAR_SUFFIX,
+                       build_extent_sidecar(table_offset, archive_size, [p['size'] for p in packs]))
+    _write_file_atomic(trpfd_path, build_trpfd_names(names))
+    return packs
+
+# --- INCREMENTAL UPDATE ---
+def _same_content(reader, pack, path):
+    """True if the file at `path` holds exactly the bytes of `pack` in the archive.
+
+    Pack sizes are exact (see DataArchiveMap.pack_sizes), so the file must have the
+    same size and content.
+    """
+    size = os.path.getsize(path)
+    if size != pack['size']:
+        return False
+    with open(path, 'rb') as f:
+        file_hasher = content_hasher(CONTENT_HASH_NAME)
+        for chunk in iter(lambda: f.read(WRITE_BUFFER_SIZE), b''):
+            file_hasher.update(chunk)
+    return reader.hash_range(pack['offset'], size, content_hasher(CONTENT_HASH_NAME)).digest() == file_hasher.digest()
+
+def update_trpfs(input_dir, trpfs_path, trpfd_path, alignment=1, progress_callback=None):
+    """Updates data.trpfs/data.trpfd in place with the packs in `input_dir` that are new or changed.
+
+    Unchanged packs (same size and content) are left alone. Changed and new packs are
+    appended after the current end of the file, followed by a new file table; the
+    header's table offset is switched last, so an interrupted update leaves the old
+    archive readable. data.trpfd is only rewritten when new names were added.
+
+    Replaced packs and the old table stay in the file as unreferenced gaps; the new
+    extent sidecar lists them as dead regions together with the exact size of every
+    pack, so later updates and extractions never take them for part of a pack (they
+    are listed by slicer.gap_report); rebuild with pack_directory to compact. The
+    copied table preamble is fixed for the new pack count. Returns {'added',
+    'replaced', 'unchanged', 'appended_bytes'}.
+    """
+    name_index = NameIndex(trpfd_path)
+    data_map = DataArchiveMap(trpfs_path)
+    table_offset, preamble, gap, preamble_count = _read_table_extras(trpfs_path)
+    # The packs end where the table starts, not at the end of the file
+    sizes = data_map.pack_sizes(table_offset)
+    table = build_pack_table(name_index, data_map, table_offset, sizes=sizes)
+    files = collect_pack_files(input_dir)
+
+    offsets = array('Q', data_map.offsets)
+    hashes = array('Q', data_map.hashes)
+    dead_regions = list(data_map.dead_regions) + [(table_offset, data_map.table_end - table_offset, DEAD_TABLE)]
+    slot = {pack_hash: i for i, pack_hash in enumerate(hashes)}
+    known_names = set(name_index.hashes)
+    new_names = []
+    stats = {'added': 0, 'replaced': 0, 'unchanged': 0, 'appended_bytes': 0}
+
+    changed = []
+    with PositionalReader(trpfs_path) as reader:
+        for name, path in files.items():
+            pack = table.lookup(name)
+            if pack is not None and _same_content(reader, pack, path):
+                stats['unchanged'] += 1
+            else:
+                changed.append((name, path, pack))
+    if not changed:
+        return stats
+    changed_hashes = fnv1a_64_hash_many(name.encode('utf-8') for name, _, _ in changed)
+    _check_unique([name for name, _, _ in changed], changed_hashes, name_index)
+
+    total_bytes = sum(os.path.getsize(path) for _, path, _ in changed)
+    fd = os.open(trpfs_path, os.O_RDWR | getattr(os, 'O_BINARY', 0))
+    try:
+        writer = _AlignedWriter(fd, os.fstat(fd).st_size)
+        bytes_done = 0
+        for i, ((name, path, pack), pack_hash) in enumerate(zip(changed, changed_hashes)):
+            writer.pad_to(alignment)
+            size = os.path.getsize(path)
+            entry = {'name': name, 'hash': pack_hash, 'offset': writer.position, 'size': size}
+            if pack_hash in slot:
+                index = slot[pack_hash]
+                if sizes[index]:
+                    dead_regions.append((offsets[index], sizes[index], DEAD_PACK))
+                offsets[index] = writer.position
+                sizes[index] = size
+                stats['replaced'] += 1
+            else:
+                slot[pack_hash] = len(hashes)
+                offsets.append(writer.position)
+                hashes.append(pack_hash)
+                sizes.append(size)
+                stats['added'] += 1
+            if pack_hash not in known_names:
+                new_names.append(name)
+            with open(path, 'rb', buffering=0) as f:
+                writer.copy_from(f, size)
+            bytes_done += size
+            stats['appended_bytes'] += size
+            if progress_callback:
+                progress_callback(i + 1, len(changed), entry, bytes_done, total_bytes)
+        new_table_offset = writer.position
+        writer.write(build_trpfs_table(offsets, hashes, preamble, gap, preamble_count))
+        writer.flush()
+        archive_size = writer.position
+        os.fsync(fd)
+        os.lseek(fd, 8, os.SEEK_SET)
+        os.write(fd, struct.pack('<Q', new_table_offset))
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+    # Until this is written, the old sidecar no longer matches the table offset and is ignored
+    _write_file_atomic(trpfs_path + EXTENT_SIDECAR_SUFFIX,
+                       build_extent_sidecar(new_table_offset, archive_size, sizes, sorted(dead_regions)))
+
+    if new_names:
+        names = [name_index.name(i) for i in range(len(name_index))] + new_names
+        _write_file_atomic(trpfd_path, build_trpfd_names(names))
+    return stats
@@ -0,0 +1,218 @@
+import io
+import os
+import struct
+
+from . import aio
+from .dedup import OutputWriter
+from .fileio import COPY_CHUNK_SIZE, PositionalReader, RangeReader, copy_file_slice
+from .profiling import stage
+from .verify import DEFAULT_HASH_WORKERS, check_cnmt, compare_hashes, read_cnmt
+
+PFS0_MAGIC = 0x30534650
+PFS0_HEADER_SIZE = 16
+PFS0_ENTRY_SIZE = 24
+
+# --- CORE UNPACKING LOGIC ---
+def read_pfs0_header(f):
+    """Reads only the header, entry table and string table of a PFS0 container.
+
+    Returns (file_entries, data_section_start). The data section itself is never read here.
+    """
+    f.seek(0)
+    header = f.read(PFS0_HEADER_SIZE)
+    if len(header) < PFS0_HEADER_SIZE:
+        raise ValueError("File is too small to be a valid PFS0 container.")
+
+    magic, file_count, string_table_size, _ = struct.unpack('<IIII', header)
+    if magic != PFS0_MAGIC:
+        decoded_magic = header[0:4].decode('ascii', 'ignore')
+        raise ValueError(f"Invalid PFS0 file. Expected 'PFS0', found: '{decoded_magic}'")
+
+    file_entry_table_size = file_count * PFS0_ENTRY_SIZE
+    entry_table = f.read(file_entry_table_size)
+    string_table = f.read(string_table_size)
+    if len(entry_table) < file_entry_table_size or len(string_table) < string_table_size:
+        raise ValueError("PFS0 entry or string table is truncated.")
+
+    file_entries = []
+    for data_offset, size, string_offset, _ in struct.iter_unpack('<QQII', entry_table):
+        end_of_string = string_table.find(b'\x00', string_offset)
+        if end_of_string == -1:
+            end_of_string = len(string_table)
+        filename = string_table[string_offset:end_of_string].decode('utf-8')
+        file_entries.append({'data_offset': data_offset, 'size': size, 'string_offset': string_offset, 'filename': filename})
+
+    data_section_start = PFS0_HEADER_SIZE + file_entry_table_size + string_table_size
+    return file_entries, data_section_start
+
+def _open_source(pfs0_source):
+    if isinstance(pfs0_source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(pfs0_source)
+    if hasattr(pfs0_source, 'read'):
+        return pfs0_source
+    return open(pfs0_source, 'rb')
+
+def list_pfs0(pfs0_source):
+    """Returns the entries of a PFS0 container with their absolute offsets and whether they fit inside it."""
+    f = _open_source(pfs0_source)
+    try:
+        file_entries, data_section_start = read_pfs0_header(f)
+        f.seek(0, os.SEEK_END)
+        container_size = f.tell()
+    finally:
+        if f is not pfs0_source:
+            f.close()
+    for entry in file_entries:
+        entry['offset'] = data_section_start + entry['data_offset']
+        entry['in_bounds'] = entry['offset'] + entry['size'] <= container_size
+    return file_entries
+
+def _file_reader(f, size):
+    """A RangeReader over an open file, for OutputWriter (extraction is single-threaded)."""
+    def pread(n, offset):
+        f.seek(offset)
+        return f.read(n)
+    return RangeReader(pread, size)
+
+def extract_pfs0(pfs0_source, output_dir, log_callback=None, progress_callback=None, output_writer=None,
+                 queue_depth=None):
+    """Extracts every entry of a PFS0 container and returns {'extracted', 'skipped', 'errors'} lists.
+
+    `pfs0_source` may be a path, an open binary file or a bytes object. Entries are
+    streamed to disk in bounded chunks, so memory use does not grow with the container
+    size. `progress_callback(done, total, entry, bytes_done, total_bytes)` is called
+    after each entry. An OutputWriter passed as `output_writer` writes the entries
+    instead (deduplicated and/or sparse); the result then also has 'bytes_saved'.
+    With `queue_depth` and a path, entries are written concurrently through the
+    asyncio engine (za_tools.aio) and reported in completion order.
+    Raises ValueError if the header cannot be parsed.
+    """
+    log = log_callback or (lambda message: None)
+    result = {'extracted': [], 'skipped': [], 'errors': []}
+
+    f = _open_source(pfs0_source)
+    reader = None
+    try:
+        with stage('pfs0.header'):
+            file_entries, data_section_start = read_pfs0_header(f)
+
+        file_count = len(file_entries)
+        log(f"PFS0 header found. File count: {file_count}")
+
+        f.seek(0, os.SEEK_END)
+        container_size = f.tell()
+        buf = bytearray(COPY_CHUNK_SIZE)
+        use_aio = bool(queue_depth) and isinstance(pfs0_source, (str, os.PathLike)) and aio.available()
+        writer = output_writer
+        if use_aio:
+            writer = output_writer or OutputWriter()
+            reader = PositionalReader(pfs0_source)
+        elif output_writer is not None:
+            reader = _file_reader(f, container_size)
+        if writer is not None:
+            writer.plan(entry['size'] for entry in file_entries)
+        total_bytes = sum(entry['size'] for entry in file_entries)
+        done = 0
+        bytes_done = 0
+
+        def finished(entry, error=None):
+            nonlocal done, bytes_done
+            if error is None:
+                log(f"Extracted: {entry['filename']} ({entry['size']} bytes)")
+                result['extracted'].append({'filename': entry['filename'], 'size': entry['size']})
+            else:
+                log(f"Error writing file {entry['filename']}: {error}")
+                result['errors'].append({'filename': entry['filename'], 'error': error})
+            done += 1
+            bytes_done += entry['size']
+            if progress_callback:
+                progress_callback(done, file_count, entry, bytes_done, total_bytes)
+
+        def write_entry(entry, start, output_path):
+            """Returns None, or the error message if the entry could not be written."""
+            try:
+                with stage('pfs0.makedirs'):
+                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                with stage('pfs0.write', entry['size']):
+                    if writer is not None:
+                        writer.write(reader, start, entry['size'], output_path)
+                    else:
+                        with open(output_path, 'wb') as out_f:
+                            copy_file_slice(f, out_f, start, entry['size'], buf)
+            except IOError as e:
+                return str(e)
+            return None
+
+        jobs = []
+        for entry in file_entries:
+            start = data_section_start + entry['data_offset']
+            end = start + entry['size']
+
+            if end > container_size:
+                log(f"Skipped: {entry['filename']} (data is outside the file bounds - likely a reference).")
+                result['skipped'].append(entry['filename'])
+                done += 1
+                bytes_done += entry['size']
+                if progress_callback:
+                    progress_callback(done, file_count, entry, bytes_done, total_bytes)
+                continue
+
+            job = (entry, write_entry, (entry, start, os.path.join(output_dir, entry['filename'])), entry['size'])
+            if use_aio:
+                jobs.append(job)
+            else:
+                finished(entry, write_entry(*job[2]))
+        if jobs:
+            aio.run_jobs(jobs, queue_depth, finished)
+
+        log(f"\nOperation finished. Extracted {len(result['extracted'])} of {file_count} files.")
+        if output_writer is not None:
+            result['bytes_saved'] = output_writer.bytes_saved
+            log(f"Saved {output_writer.bytes_saved / (1024 * 1024):.1f} MB ({output_writer.stats['linked']} linked duplicates, sparse holes).")
+        return result
+    finally:
+        if reader is not None:
+            reader.close()
+        if f is not pfs0_source:
+            f.close()
+
+def unpack_pfs0_logic(pfs0_source, output_dir, queue_depth=None):
+    """Extracts a PFS0 container and returns the operation log as a list of lines."""
+    logs = []
+    try:
+        extract_pfs0(pfs0_source, output_dir, logs.append, queue_depth=queue_depth)
+    except ValueError as e:
+        logs.append(f"Error: Could not process PFS0 header. {e}")
+    return logs
+
+def verify_pfs0(pfs0_source, output_dir, deep=False, workers=DEFAULT_HASH_WORKERS):
+    """Checks an extraction against the container's entry table.
+
+    Returns a report dict with 'ok', 'missing', 'size_mismatch' and 'skipped' lists.
+    With `deep` (needs a path) every extracted file is also hashed across `workers`
+    processes: entries listed in a .cnmt.xml against its SHA-256 ('cnmt_mismatch'),
+    the others against their range of the container ('hash_mismatch').
+    """
+    if deep and not isinstance(pfs0_source, (str, os.PathLike)):
+        raise ValueError("Hash verification needs the container's path")
+    report = {'ok': [], 'missing': [], 'size_mismatch': [], 'skipped': []}
+    entries = list_pfs0(pfs0_source)
+    for entry in entries:
+        path = os.path.join(output_dir, entry['filename'])
+        if not entry['in_bounds']:
+            report['skipped'].append(entry['filename'])
+        elif not os.path.isfile(path):
+            report['missing'].append(entry['filename'])
+        elif os.path.getsize(path) != entry['size']:
+            report['size_mismatch'].append({'name': entry['filename'], 'expected': entry['size'], 'actual': os.path.getsize(path)})
+        else:
+            report['ok'].append(entry['filename'])
+    if deep:
+        by_name = {entry['filename']: entry for entry in entries}
+        listed = read_cnmt(pfs0_source, entries)
+        checks = [(name, os.path.join(output_dir, name), (pfs0_source, by_name[name]['offset'], by_name[name]['size']))
+                  for name in report['ok'] if name not in listed]
+        cnmt_checks = [(name, os.path.join(output_dir, name), listed[name]['sha256']) for name in report['ok'] if name in listed]
+        compare_hashes(report, checks, workers)
+        check_cnmt(report, cnmt_checks, workers)
+    return report
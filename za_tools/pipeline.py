@@ -0,0 +1,122 @@
+import os
+import posixpath
+
+from .hashing import CONTENT_HASH_NAME
+from .index_cache import source_key
+from .keys import parse_ticket
+from .manifest import ExtractionManifest
+from .nca import NcaError, NcaReader
+from .pfs0 import read_pfs0_header
+from .profiling import stage
+from .selection import select_packs
+from .slicer import DEFAULT_WORKERS, extract_packs
+from .trpfs import DataArchiveMap, NameIndex, build_pack_table
+
+CONTENT_TYPE_PROGRAM = 0
+
+# --- LOCATING THE GAME DATA ---
+def _find_trpfs_pair(romfs):
+    """Returns the RomFS entries of (data.trpfd, data.trpfs) from the same folder, or None."""
+    for entry in romfs.files:
+        if posixpath.basename(entry['path']) == 'data.trpfs':
+            trpfd = romfs.find(posixpath.join(posixpath.dirname(entry['path']), 'data.trpfd'))
+            if trpfd is not None:
+                return trpfd, entry
+    return None
+
+class NspGame:
+    """The program NCA of an NSP, read in place, with data.trpfd/data.trpfs located in its RomFS.
+
+    Nothing is written to disk: the NCA is decrypted straight out of the NSP's PFS0
+    entry, and common tickets (.tik) in the NSP supply the title key. `trpfd_reader`
+    and `trpfs_reader` are RangeReaders over the decrypted game files.
+    """
+    def __init__(self, nsp_path, keyset):
+        self.nsp_path = nsp_path
+        self._f = open(nsp_path, 'rb')
+        try:
+            self._locate(keyset)
+        except BaseException:
+            self._f.close()
+            raise
+
+    def _locate(self, keyset):
+        entries, data_start = read_pfs0_header(self._f)
+        keyset = dict(keyset)
+        for entry in entries:
+            if entry['filename'].lower().endswith('.tik'):
+                self._f.seek(data_start + entry['data_offset'])
+                rights_id, encrypted_title_key = parse_ticket(self._f.read(entry['size']))
+                keyset[rights_id.hex()] = encrypted_title_key
+
+        key = source_key(self.nsp_path)
+        for entry in entries:
+            name = entry['filename'].lower()
+            if not name.endswith('.nca') or name.endswith('.cnmt.nca'):
+                continue
+            nca = NcaReader(self._f, keyset, base_offset=data_start + entry['data_offset'])
+            if nca.content_type != CONTENT_TYPE_PROGRAM:
+                continue
+            romfs = nca.romfs()
+            pair = _find_trpfs_pair(romfs) if romfs else None
+            if pair is None:
+                continue
+            self.nca_name = entry['filename']
+            self.nca = nca
+            self.trpfd_entry, self.trpfs_entry = pair
+            self.trpfd_reader = romfs.open_reader(self.trpfd_entry, key)
+            self.trpfs_reader = romfs.open_reader(self.trpfs_entry, key)
+            return
+        raise NcaError("No program NCA with data.trpfd/data.trpfs was found in this NSP")
+
+    def pack_index(self):
+        """Builds the pack table from the decrypted game files (kept in memory, never cached)."""
+        return build_pack_table(NameIndex(self.trpfd_reader.open()), DataArchiveMap(self.trpfs_reader.open()),
+                                self.trpfs_reader.size)
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# --- PIPELINE ---
+def extract_nsp_trpfs(nsp_path, keyset, output_dir, patterns=None, workers=DEFAULT_WORKERS,
+                      progress_callback=None, status_callback=None, incremental=True, force=False, output_writer=None,
+                      queue_depth=None):
+    """Slices TRPFS packs straight out of an NSP, without writing the NCA or the RomFS.
+
+    Each worker reads, decrypts and writes one pack at a time in COPY_CHUNK_SIZE chunks,
+    so the NSP is read once, only the packs are written and memory stays bounded.
+    Takes the same options as extract_trpfs and returns (packs, stats).
+    """
+    status = status_callback or (lambda message: None)
+
+    status("[Step 1/3] Locating the program NCA and data.trpfs inside the NSP...")
+    with stage('nsp.locate'):
+        game = NspGame(nsp_path, keyset)
+    with game:
+        status(f"  > {game.nca_name}: {game.trpfs_entry['path']} ({game.trpfs_entry['size'] / (1024 ** 3):.2f} GB)")
+        with stage('trpfs.index'):
+            pack_index = game.pack_index()
+        try:
+            with stage('trpfs.select'):
+                packs = select_packs(pack_index, patterns) if patterns else pack_index.pack_map()
+        finally:
+            pack_index.close()
+        os.makedirs(output_dir, exist_ok=True)
+
+        status(f"[Step 2/3] Selected {len(packs)} packages.")
+
+        status(f"[Step 3/3] Decrypting and slicing {len(packs)} packages with {workers} workers...")
+        if not incremental:
+            return packs, extract_packs(game.trpfs_reader, packs, output_dir, workers, progress_callback,
+                                        output_writer=output_writer, queue_depth=queue_depth)
+        with ExtractionManifest(output_dir, CONTENT_HASH_NAME) as manifest:
+            stats = extract_packs(game.trpfs_reader, packs, output_dir, workers, progress_callback, manifest, force,
+                                  output_writer, queue_depth)
+        status(f"  > Wrote {stats['written']} packages, {stats['skipped']} were already up to date.")
+        return packs, stats
@@ -0,0 +1,141 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+# ZA_TOOLS_PROFILE=<path> (or '-' for stderr) writes the JSON summary at exit,
+# ZA_TOOLS_TRACE=<path> a Chrome trace; either one turns profiling on
+PROFILE_ENV = 'ZA_TOOLS_PROFILE'
+TRACE_ENV = 'ZA_TOOLS_TRACE'
+
+# --- STAGES ---
+class _NullStage:
+    """What stage() returns while profiling is off: one shared object that does nothing."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_bytes(self, nbytes):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+class _Stage:
+    def __init__(self, profiler, name, nbytes):
+        self._profiler = profiler
+        self.name = name
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._profiler._record(self.name, self._start, time.perf_counter(), self.nbytes)
+        return False
+
+    def add_bytes(self, nbytes):
+        self.nbytes += nbytes
+
+# --- PROFILER ---
+class Profiler:
+    """Per-stage timers, byte counters and syscall counts, shared by every thread of the process.
+
+    Off by default: stage() then returns a shared no-op context manager and count()
+    returns at once, so instrumented code pays one attribute check per call. When
+    enabled, each stage name accumulates calls, seconds (summed over threads, so
+    worker stages can exceed the wall time) and bytes; with `trace` every stage is
+    also kept as a Chrome trace event (load the file in chrome://tracing or Perfetto).
+    Work done in child processes (e.g. verify --hash) is not counted.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.trace = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._stages = {}
+        self._counters = {}
+        self._events = []
+        self._start = time.perf_counter()
+
+    def enable(self, trace=False):
+        if not self.enabled:
+            self.reset()
+        self.enabled = True
+        self.trace = self.trace or trace
+
+    def stage(self, name, nbytes=0):
+        """Times a `with` block under `name`; `nbytes` (or add_bytes() inside the block) counts its data."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, nbytes)
+
+    def count(self, name, nbytes=0, calls=1):
+        """Adds one call (e.g. a syscall) and its bytes to the counter `name`."""
+        if not self.enabled:
+            return
+        with self._lock:
+            counter = self._counters.setdefault(name, [0, 0])
+            counter[0] += calls
+            counter[1] += nbytes
+
+    def _record(self, name, start, end, nbytes):
+        with self._lock:
+            entry = self._stages.setdefault(name, [0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += end - start
+            entry[2] += nbytes
+            if self.trace:
+                self._events.append({'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                                     'ts': (start - self._start) * 1e6, 'dur': (end - start) * 1e6,
+                                     'args': {'bytes': nbytes}})
+
+    def summary(self):
+        """Returns {'wall_seconds', 'stages': {name: {'calls', 'seconds', 'bytes', 'mb_per_s'}}, 'counters': {name: {'calls', 'bytes'}}}."""
+        with self._lock:
+            stages = {name: {'calls': calls, 'seconds': round(seconds, 6), 'bytes': nbytes,
+                             'mb_per_s': round(nbytes / (1024 * 1024) / seconds, 1) if nbytes and seconds else None}
+                      for name, (calls, seconds, nbytes) in sorted(self._stages.items())}
+            counters = {name: {'calls': calls, 'bytes': nbytes} for name, (calls, nbytes) in sorted(self._counters.items())}
+        return {'wall_seconds': round(time.perf_counter() - self._start, 6), 'stages': stages, 'counters': counters}
+
+    def write_summary(self, path):
+        """Writes summary() as JSON to `path`, or to stderr for '-'."""
+        if path == '-':
+            json.dump(self.summary(), sys.stderr, indent=2)
+            sys.stderr.write("\n")
+            return
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def write_trace(self, path):
+        """Writes the recorded stages in the Chrome trace event format."""
+        with self._lock:
+            events = list(self._events)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+PROFILER = Profiler()
+stage = PROFILER.stage
+count = PROFILER.count
+
+def enable_output(summary_path=None, trace_path=None):
+    """Turns profiling on and writes the summary and/or trace when the process exits."""
+    PROFILER.enable(trace=bool(trace_path))
+
+    def write_outputs():
+        if summary_path:
+            PROFILER.write_summary(summary_path)
+        if trace_path:
+            PROFILER.write_trace(trace_path)
+
+    atexit.register(write_outputs)
+
+if os.environ.get(PROFILE_ENV) or os.environ.get(TRACE_ENV):
+    enable_output(os.environ.get(PROFILE_ENV), os.environ.get(TRACE_ENV))
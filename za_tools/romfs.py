@@ -0,0 +1,112 @@
+import os
+import struct
+
+from .fileio import RangeReader
+from .profiling import stage
+
+ROMFS_HEADER = struct.Struct('<10Q')
+ROMFS_DIR_ENTRY = struct.Struct('<6I')
+ROMFS_FILE_ENTRY = struct.Struct('<IIQQII')
+ROMFS_EMPTY = 0xFFFFFFFF
+READ_CHUNK_SIZE = 4 * 1024 * 1024
+
+class RomFSError(IOError):
+    """Raised when the RomFS header or metadata tables are invalid."""
+
+# --- ROMFS PARSER ---
+class RomFS:
+    """Directory and file tables of a RomFS image.
+
+    `pread(size, offset)` reads (already decrypted) bytes of the image's container and
+    `base` is where the image starts in it. Only the header and the two metadata tables
+    are read here; file contents are streamed on demand with iter_file().
+    """
+    def __init__(self, pread, base=0):
+        self._pread = pread
+        self.base = base
+        header = pread(ROMFS_HEADER.size, base)
+        if len(header) < ROMFS_HEADER.size:
+            raise RomFSError("RomFS header is truncated")
+        (header_size, _, _, dir_meta_offset, dir_meta_size,
+         _, _, file_meta_offset, file_meta_size, data_offset) = ROMFS_HEADER.unpack(header)
+        if header_size != ROMFS_HEADER.size:
+            raise RomFSError(f"Unexpected RomFS header size {header_size:#x}")
+        self.data_offset = base + data_offset
+        self._dirs = pread(dir_meta_size, base + dir_meta_offset)
+        self._files = pread(file_meta_size, base + file_meta_offset)
+        if len(self._dirs) < dir_meta_size or len(self._files) < file_meta_size:
+            raise RomFSError("RomFS metadata tables are truncated")
+        self.files = self._walk()
+        self._by_path = {entry['path']: entry for entry in self.files}
+
+    def _name(self, table, start, size):
+        return table[start:start + size].decode('utf-8', 'replace')
+
+    def _walk(self):
+        files = []
+        pending = [(0, '')]
+        try:
+            while pending:
+                dir_off, dir_path = pending.pop()
+                _, _, child_dir, child_file, _, _ = ROMFS_DIR_ENTRY.unpack_from(self._dirs, dir_off)
+
+                file_off = child_file
+                while file_off != ROMFS_EMPTY:
+                    _, sibling, offset, size, _, name_size = ROMFS_FILE_ENTRY.unpack_from(self._files, file_off)
+                    name = self._name(self._files, file_off + ROMFS_FILE_ENTRY.size, name_size)
+                    files.append({'path': dir_path + name, 'offset': self.data_offset + offset, 'size': size})
+                    file_off = sibling
+
+                sub_off = child_dir
+                while sub_off != ROMFS_EMPTY:
+                    _, sibling, _, _, _, name_size = ROMFS_DIR_ENTRY.unpack_from(self._dirs, sub_off)
+                    name = self._name(self._dirs, sub_off + ROMFS_DIR_ENTRY.size, name_size)
+                    pending.append((sub_off, dir_path + name + '/'))
+                    sub_off = sibling
+        except struct.error:
+            raise RomFSError("RomFS metadata entry points outside its table") from None
+        files.sort(key=lambda entry: entry['path'])
+        return files
+
+    def find(self, path):
+        """Returns the file entry for a path such as 'data.trpfs', or None."""
+        return self._by_path.get(path.replace('\\', '/').lstrip('/'))
+
+    def iter_file(self, entry, chunk_size=READ_CHUNK_SIZE):
+        """Yields the contents of a file entry in chunks of at most `chunk_size` bytes."""
+        done = 0
+        while done < entry['size']:
+            chunk = self._pread(min(chunk_size, entry['size'] - done), entry['offset'] + done)
+            if not chunk:
+                raise RomFSError(f"Unexpected end of RomFS data in {entry['path']}")
+            yield chunk
+            done += len(chunk)
+
+    def open_reader(self, entry, key=None):
+        """Returns a RangeReader over one file, so it can be sliced in place like a file on disk."""
+        def pread(size, offset):
+            return self._pread(max(0, min(size, entry['size'] - offset)), entry['offset'] + offset)
+        return RangeReader(pread, entry['size'], key)
+
+def extract_romfs_files(romfs, output_dir, entries=None, progress_callback=None):
+    """Streams RomFS files to `output_dir`. Returns the list of written paths.
+
+    `progress_callback(done, total, entry, bytes_done, total_bytes)` follows the
+    extract_packs convention.
+    """
+    entries = romfs.files if entries is None else entries
+    total_bytes = sum(e['size'] for e in entries)
+    bytes_done = 0
+    written = []
+    for i, entry in enumerate(entries):
+        path = os.path.join(output_dir, entry['path'].replace('/', os.sep))
+        with stage('romfs.makedirs'):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with stage('romfs.write', entry['size']), open(path, 'wb') as out_f:
+            for chunk in romfs.iter_file(entry):
+                out_f.write(chunk)
+        bytes_done += entry['size']
+        written.append(path)
+        if progress_callback:
+            progress_callback(i + 1, len(entries), entry, bytes_done, total_bytes)
+    return written
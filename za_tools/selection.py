@@ -0,0 +1,72 @@
+import re
+
+# --- PACK SELECTION ---
+GLOB_CHARS = '*?['
+
+def _glob_to_regex(pattern):
+    """Translates a pack glob to a regex: '*' and '?' stay inside one path segment, '**' spans segments."""
+    out = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith('**', i):
+            i += 2
+            if pattern.startswith('/', i):
+                # 'a/**/b' also matches 'a/b'
+                out.append('(?:.*/)?')
+                i += 1
+            else:
+                out.append('.*')
+            continue
+        if c == '*':
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            end = pattern.find(']', i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                out.append('[' + body.replace('\\', '\\\\') + ']')
+                i = end
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return re.compile(''.join(out) + r'\Z')
+
+def select_packs(pack_index, patterns):
+    """Resolves exact names, prefixes and globs against a PackIndex.
+
+    A pattern without glob characters is first tried as an exact pack name (hash lookup);
+    otherwise it is treated as a prefix. Glob patterns are narrowed to the range of names
+    sharing their literal prefix before the regex is applied, so only matching names are
+    ever decoded. Returns pack dicts sorted by offset, without duplicates.
+    """
+    selected = {}
+    for pattern in patterns:
+        pattern = pattern.replace('\\', '/')
+        wildcard = min((pattern.find(c) for c in GLOB_CHARS if c in pattern), default=-1)
+        if wildcard == -1:
+            pack = pack_index.lookup(pattern)
+            matches = [pack] if pack is not None else pack_index.iter_prefix(pattern)
+        else:
+            regex = _glob_to_regex(pattern)
+            matches = (p for p in pack_index.iter_prefix(pattern[:wildcard]) if regex.match(p['name']))
+        for pack in matches:
+            selected[pack['hash']] = pack
+    return sorted(selected.values(), key=lambda p: p['offset'])
+
+def compile_patterns(patterns):
+    """Returns a predicate that tells whether a '/'-separated path matches any of `patterns`.
+
+    Uses the same rules as select_packs: plain patterns match the exact path or act as
+    a prefix, glob patterns follow _glob_to_regex. No patterns match everything.
+    """
+    if not patterns:
+        return lambda path: True
+    plain = [p.replace('\\', '/') for p in patterns if not any(c in p for c in GLOB_CHARS)]
+    globs = [_glob_to_regex(p.replace('\\', '/')) for p in patterns if any(c in p for c in GLOB_CHARS)]
+    return lambda path: any(path.startswith(p) for p in plain) or any(r.match(path) for r in globs)
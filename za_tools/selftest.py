@@ -0,0 +1,157 @@
+import os
+import tempfile
+
+from .crypto import aes_ctr, aes_xts
+from .flatbuffers import root_table
+from .nca import NcaReader
+from .packer import pack_directory, update_trpfs
+from .slicer import extract_packs
+from .synthetic import build_nca, build_romfs, random_keyset, write_synthetic_game
+from .trpfs import DataArchiveMap, NameIndex, build_pack_map
+
+# --- TEST VECTORS ---
+# IEEE 1619-2007 XTS-AES-128 vectors 1 and 2: (key, data unit number, plaintext, ciphertext)
+XTS_VECTORS = [
+    ("00" * 32, 0, "00" * 32,
+     "917cf69ebd68b2ec9b9fe9a3eadda692cd43d2f59598ed858c02c2652fbf922e"),
+    ("11" * 16 + "22" * 16, 0x3333333333, "44" * 32,
+     "c454185e6a16936e39334038acef838bfb186fff7480adc4289382ecd6d394f0"),
+]
+
+# NIST SP 800-38A F.5.1 CTR-AES128, first block: (key, counter block, plaintext, ciphertext)
+CTR_VECTORS = [
+    ("2b7e151628aed2a6abf7158809cf4f3c", "f0f1f2f3f4f5f6f7f8f9fafbfcfdfeff",
+     "6bc1bee22e409f96e93d7e117393172a", "874d6191b620e3261bef6864990db6ce"),
+]
+
+def _check_xts():
+    for key, sector, plain, cipher in XTS_VECTORS:
+        key, plain, cipher = bytes.fromhex(key), bytes.fromhex(plain), bytes.fromhex(cipher)
+        if aes_xts(key, cipher, sector, sector_size=len(cipher), big_endian_tweak=False) != plain:
+            return False
+        if aes_xts(key, plain, sector, sector_size=len(plain), encrypt=True, big_endian_tweak=False) != cipher:
+            return False
+    return True
+
+def _check_ctr():
+    for key, counter, plain, cipher in CTR_VECTORS:
+        if aes_ctr(bytes.fromhex(key), bytes.fromhex(counter)).update(bytes.fromhex(plain)) != bytes.fromhex(cipher):
+            return False
+    return True
+
+def _check_nca_round_trip():
+    """Builds an encrypted NCA from known files and reads every file back, including unaligned ranges."""
+    files = {
+        'data.trpfd': os.urandom(3000),
+        'data.trpfs': os.urandom(5 * 1024 * 1024 + 7),
+        'sub/dir/a.bin': b'hello',
+        'sub/b.bin': b'',
+        'sub/dir/deeper/c.bin': os.urandom(70000),
+    }
+    keyset = random_keyset()
+    nca_bytes = build_nca(keyset, build_romfs(files))
+    nca = NcaReader(_BytesSource(nca_bytes), keyset)
+    if nca.verify_headers():
+        return False
+    romfs = nca.romfs()
+    if sorted(e['path'] for e in romfs.files) != sorted(files):
+        return False
+    for entry in romfs.files:
+        if b''.join(romfs.iter_file(entry, chunk_size=65537)) != files[entry['path']]:
+            return False
+    entry = romfs.find('data.trpfs')
+    return nca.read_section(nca.romfs_section(), entry['offset'] + 12345, 1000) == files['data.trpfs'][12345:13345]
+
+def _load_packs(trpfd, trpfs):
+    data_map = DataArchiveMap(trpfs)
+    return build_pack_map(NameIndex(trpfd), data_map, data_map.table_offset)
+
+def _check_trpfs_round_trip():
+    """Extracts a synthetic game, packs it back and compares the tables; then updates two packs in place.
+
+    The updated table must still be a FlatBuffer whose vectors are the new offsets and
+    hashes, with nothing after it. A second update with nothing changed must replace
+    nothing and leave the file as it is, and extracting the updated archive must give
+    back the packed files.
+    """
+    with tempfile.TemporaryDirectory() as work:
+        trpfd, trpfs = write_synthetic_game(os.path.join(work, 'game'), 200, mean_size=4096, trpak=False, seed=1)
+        original = _load_packs(trpfd, trpfs)
+        unpacked = os.path.join(work, 'unpacked')
+        extract_packs(trpfs, original, unpacked, workers=2)
+        new_trpfd, new_trpfs = os.path.join(work, 'new.trpfd'), os.path.join(work, 'new.trpfs')
+        pack_directory(unpacked, new_trpfs, new_trpfd, reference=(trpfd, trpfs))
+        if _load_packs(new_trpfd, new_trpfs) != original:
+            return False
+        with open(trpfs, 'rb') as f, open(new_trpfs, 'rb') as g:
+            if f.read(original[-1]['offset'] + original[-1]['size']) != g.read(original[-1]['offset'] + original[-1]['size']):
+                return False
+
+        changed = original[len(original) // 2]['name']
+        with open(os.path.join(unpacked, *changed.split('/')), 'wb') as f:
+            f.write(b'changed')
+        with open(os.path.join(unpacked, 'added.bin'), 'wb') as f:
+            f.write(b'added')
+        stats = update_trpfs(unpacked, new_trpfs, new_trpfd)
+        if (stats['replaced'], stats['added'], stats['unchanged']) != (1, 1, len(original) - 1):
+            return False
+        updated = {pack['name']: pack for pack in _load_packs(new_trpfd, new_trpfs)}
+        if any(updated[pack['name']]['offset'] != pack['offset'] for pack in original if pack['name'] != changed):
+            return False
+        with open(new_trpfs, 'rb') as f:
+            for name, expected in ((changed, b'changed'), ('added.bin', b'added')):
+                f.seek(updated[name]['offset'])
+                if f.read(len(expected)) != expected:
+                    return False
+            data_map = DataArchiveMap(new_trpfs)
+            f.seek(data_map.table_offset)
+            table = f.read()
+        root = root_table(table)
+        if (len(table) != data_map.table_end - data_map.table_offset
+                or sorted([root.scalar_vector(0, 'Q'), root.scalar_vector(1, 'Q')])
+                != sorted([tuple(data_map.offsets), tuple(data_map.hashes)])):
+            return False
+
+        size = os.path.getsize(new_trpfs)
+        stats = update_trpfs(unpacked, new_trpfs, new_trpfd)
+        if stats['replaced'] or stats['added'] or os.path.getsize(new_trpfs) != size:
+            return False
+        extracted = os.path.join(work, 'extracted')
+        extract_packs(new_trpfs, _load_packs(new_trpfd, new_trpfs), extracted, workers=2)
+        for name in [pack['name'] for pack in original] + ['added.bin']:
+            with open(os.path.join(unpacked, *name.split('/')), 'rb') as f, open(os.path.join(extracted, *name.split('/')), 'rb') as g:
+                if f.read() != g.read():
+                    return False
+    return True
+
+class _BytesSource:
+    """Minimal seekable file over bytes without fileno(), to exercise the non-pread path."""
+    def __init__(self, data):
+        self._data = data
+        self._pos = 0
+
+    def read(self, size=-1):
+        end = len(self._data) if size < 0 else self._pos + size
+        chunk = self._data[self._pos:end]
+        self._pos += len(chunk)
+        return chunk
+
+    def seek(self, pos, whence=0):
+        self._pos = pos
+
+CHECKS = [
+    ("AES-XTS (IEEE 1619 vectors)", _check_xts),
+    ("AES-CTR (NIST SP 800-38A vector)", _check_ctr),
+    ("NCA3 + RomFS round trip", _check_nca_round_trip),
+    ("TRPFS/TRPFD pack + update round trip", _check_trpfs_round_trip),
+]
+
+def run_selftest():
+    """Runs all checks. Returns a list of (name, passed, error message or None)."""
+    results = []
+    for name, check in CHECKS:
+        try:
+            results.append((name, bool(check()), None))
+        except Exception as e:
+            results.append((name, False, f"{type(e).__name__}: {e}"))
+    return results
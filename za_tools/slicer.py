@@ -0,0 +1,275 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+
+from . import aio
+from .dedup import OutputWriter
+from .fileio import PositionalReader
+from .hashing import CONTENT_HASH_NAME, content_hasher
+from .index_cache import load_pack_index, source_key
+from .manifest import ExtractionManifest, source_id
+from .profiling import stage
+from .selection import select_packs
+from .trpak import extract_trpaks_from_trpfs
+from .trpfs import DataArchiveMap, NameIndex, scan_gaps
+from .verify import DEFAULT_HASH_WORKERS, compare_hashes
+
+DEFAULT_WORKERS = min(8, os.cpu_count() or 1)
+# Where gap_report puts packs that have no name: table entries missing from
+# data.trpfd (named by hash) and TRPAKs found in gaps (named by offset)
+UNNAMED_PACK_DIR = '_unnamed'
+GAP_PACK_DIR = '_gaps'
+
+# --- EXTRACTION ENGINE ---
+def _pack_output_path(output_dir, pack_name):
+    return os.path.join(output_dir, pack_name.replace('/', os.sep))
+
+def _write_pack(writer, reader, output_dir, pack):
+    """Writes one pack, unhashed so that copy_file_range can be used. Returns the output's mtime_ns."""
+    path = _pack_output_path(output_dir, pack['name'])
+    with stage('trpfs.write', pack['size']):
+        writer.write(reader, pack['offset'], pack['size'], path)
+    return os.stat(path).st_mtime_ns
+
+def _write_new_pack(writer, reader, output_dir, pack):
+    return None, _write_pack(writer, reader, output_dir, pack), True
+
+def _check_or_write_pack(writer, reader, output_dir, pack, hash_name, entry):
+    """Hashes the source slice and only rewrites the output if its content differs.
+
+    The output is compared by the digest in the manifest entry while its mtime is the
+    recorded one; otherwise (or if no digest was recorded) the output file is hashed.
+    """
+    path = _pack_output_path(output_dir, pack['name'])
+    mtime_ns = os.stat(path).st_mtime_ns
+    with stage('trpfs.hash', pack['size']):
+        digest = reader.hash_range(pack['offset'], pack['size'], content_hasher(hash_name)).hexdigest()
+        expected = entry.get('hash') if entry.get('mtime_ns') == mtime_ns else None
+        if expected is None:
+            with PositionalReader(path) as output:
+                expected = output.hash_range(0, pack['size'], content_hasher(hash_name)).hexdigest()
+    if digest == expected:
+        return digest, mtime_ns, False
+    return digest, _write_pack(writer, reader, output_dir, pack), True
+
+def _plan_pack(pack, output_dir, manifest, current_source):
+    """Decides whether a pack is 'write', 'check' (hash the source, write on change) or 'skip'."""
+    entry = manifest.get(pack['name']) if manifest else None
+    if entry is None or entry['size'] != pack['size']:
+        return 'write'
+    path = _pack_output_path(output_dir, pack['name'])
+    try:
+        st = os.stat(path)
+    except OSError:
+        return 'write'
+    if st.st_size != pack['size']:
+        return 'write'
+    if entry['source'] == current_source and entry['offset'] == pack['offset'] and entry.get('mtime_ns') == st.st_mtime_ns:
+        return 'skip'
+    return 'check'
+
+def extract_packs(trpfs_path, pack_map, output_dir, workers=DEFAULT_WORKERS, progress_callback=None, manifest=None, force=False,
+                  output_writer=None, queue_depth=None):
+    """Slices every pack of `pack_map` out of data.trpfs using a pool of `workers` threads.
+
+    `trpfs_path` may also be an open reader (a RangeReader with a `key`, e.g. data.trpfs
+    inside an NSP); it is left open.
+
+    The directory tree is created once up front and the largest packs are scheduled
+    first so the run does not end waiting on a single big write. `progress_callback`
+    is called as progress_callback(done, total, pack, bytes_done, total_bytes) from the
+    calling thread only, in completion order.
+
+    With an open ExtractionManifest, packs already extracted from the same data.trpfs
+    whose output still has the recorded size and mtime are skipped without being
+    read. Packs are written without hashing; only after a game update (or a change to
+    the output) are packs whose name and size are unchanged hashed, and rewritten if
+    their content differs. `force` rewrites everything. Returns {'written': n,
+    'skipped': n}.
+
+    An OutputWriter with dedup or sparse output can be passed as `output_writer`; the
+    stats then also hold 'linked' and 'bytes_saved'.
+
+    With `queue_depth` the packs go through the asyncio engine (za_tools.aio) instead
+    of the `workers` pool: up to `queue_depth` creates and writes in flight and the
+    directory tree made level by level in parallel, which pays off on network and
+    overlay filesystems. Inside a running event loop it falls back to the pool.
+    """
+    directories = {os.path.dirname(_pack_output_path(output_dir, p['name'])) for p in pack_map}
+    use_aio = bool(queue_depth) and aio.available()
+    if not use_aio:
+        with stage('trpfs.makedirs'):
+            for directory in sorted(directories):
+                os.makedirs(directory, exist_ok=True)
+
+    own_reader = not hasattr(trpfs_path, 'copy_to')
+    if manifest:
+        current_source = source_id(source_key(trpfs_path) if own_reader else trpfs_path.key)
+    else:
+        current_source = None
+    hash_name = manifest.hash_name if manifest else None
+    writer = output_writer or OutputWriter()
+    writer.plan(p['size'] for p in pack_map)
+
+    schedule = sorted(pack_map, key=lambda p: p['size'], reverse=True)
+    total = len(schedule)
+    total_bytes = sum(p['size'] for p in schedule)
+    done = 0
+    bytes_done = 0
+    stats = {'written': 0, 'skipped': 0}
+
+    def finished(pack):
+        nonlocal done, bytes_done
+        done += 1
+        bytes_done += pack['size']
+        if progress_callback:
+            progress_callback(done, total, pack, bytes_done, total_bytes)
+
+    def completed(pack, result):
+        digest, mtime_ns, written = result
+        stats['written' if written else 'skipped'] += 1
+        if manifest:
+            manifest.record(pack, digest, current_source, mtime_ns)
+        finished(pack)
+
+    def planned(reader):
+        """Yields (pack, function, args, size) for the packs to write or check; skipped packs finish here."""
+        for pack in schedule:
+            plan = 'write' if force else _plan_pack(pack, output_dir, manifest, current_source)
+            if plan == 'skip':
+                stats['skipped'] += 1
+                finished(pack)
+            elif plan == 'check':
+                yield pack, _check_or_write_pack, (writer, reader, output_dir, pack, hash_name, manifest.get(pack['name'])), pack['size']
+            else:
+                yield pack, _write_new_pack, (writer, reader, output_dir, pack), pack['size']
+
+    reader_context = PositionalReader(trpfs_path) if own_reader else nullcontext(trpfs_path)
+    with reader_context as reader:
+        if use_aio:
+            with stage('trpfs.aio'):
+                aio.run_jobs(planned(reader), queue_depth, completed, directories, output_dir)
+        else:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                futures = {pool.submit(function, *args): pack for pack, function, args, _ in planned(reader)}
+                try:
+                    for future in as_completed(futures):
+                        completed(futures[future], future.result())
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+    if output_writer is not None:
+        stats['linked'] = writer.stats['linked']
+        stats['bytes_saved'] = writer.bytes_saved
+    return stats
+
+# --- HIGH-LEVEL OPERATIONS ---
+def load_selected_packs(trpfd_path, trpfs_path, patterns=None, use_cache=True):
+    """Returns the offset-sorted pack dicts matching `patterns` (all packs when empty)."""
+    with stage('trpfs.index'):
+        pack_index = load_pack_index(trpfd_path, trpfs_path, use_cache=use_cache)
+    try:
+        with stage('trpfs.select'):
+            return select_packs(pack_index, patterns) if patterns else pack_index.pack_map()
+    finally:
+        pack_index.close()
+
+def extract_trpfs(trpfd_path, trpfs_path, output_dir, patterns=None, workers=DEFAULT_WORKERS,
+                  progress_callback=None, status_callback=None, use_cache=True, incremental=True, force=False,
+                  unpack_trpak=False, trpak_names=None, output_writer=None, queue_depth=None):
+    """Loads the pack index, selects packs and slices them into `output_dir`.
+
+    With `incremental` a manifest is kept in the output directory so interrupted or
+    repeated runs only write missing or changed packs. With `unpack_trpak` the packs
+    are not written at all; their inner files are decoded straight from data.trpfs
+    (see extract_trpaks_from_trpfs) and no manifest is kept. `output_writer` and
+    `queue_depth` are passed on to extract_packs. Returns (packs, stats).
+    """
+    status = status_callback or (lambda message: None)
+
+    status("[Step 1/3] Loading pack index (cached when the game files are unchanged)...")
+    packs = load_selected_packs(trpfd_path, trpfs_path, patterns, use_cache)
+    os.makedirs(output_dir, exist_ok=True)
+
+    status(f"[Step 2/3] Selected {len(packs)} packages.")
+
+    if unpack_trpak:
+        status(f"[Step 3/3] Unpacking inner files of {len(packs)} packages with {workers} workers...")
+        stats = extract_trpaks_from_trpfs(trpfs_path, packs, output_dir, workers, progress_callback, trpak_names)
+        status(f"  > Extracted {stats['extracted']} files, {len(stats['errors'])} errors.")
+        return packs, stats
+
+    status(f"[Step 3/3] Starting raw extraction of {len(packs)} packages with {workers} workers...")
+    if not incremental:
+        return packs, extract_packs(trpfs_path, packs, output_dir, workers, progress_callback, output_writer=output_writer,
+                                    queue_depth=queue_depth)
+    with ExtractionManifest(output_dir, CONTENT_HASH_NAME) as manifest:
+        stats = extract_packs(trpfs_path, packs, output_dir, workers, progress_callback, manifest, force, output_writer,
+                              queue_depth)
+    status(f"  > Wrote {stats['written']} packages, {stats['skipped']} were already up to date.")
+    return packs, stats
+
+def verify_trpfs(trpfd_path, trpfs_path, output_dir, patterns=None, use_cache=True, deep=False, workers=DEFAULT_HASH_WORKERS):
+    """Checks that every selected pack exists under `output_dir` with the expected size.
+
+    Returns a report dict with 'ok', 'missing' and 'size_mismatch' lists. With `deep`
+    the packs are also hashed across `workers` processes: against the digest in the
+    manifest when it was recorded from this same data.trpfs, else against the source
+    slice. Corrupted packs are listed in 'hash_mismatch'.
+    """
+    report = {'ok': [], 'missing': [], 'size_mismatch': []}
+    packs = load_selected_packs(trpfd_path, trpfs_path, patterns, use_cache)
+    for pack in packs:
+        path = _pack_output_path(output_dir, pack['name'])
+        if not os.path.isfile(path):
+            report['missing'].append(pack['name'])
+        elif os.path.getsize(path) != pack['size']:
+            report['size_mismatch'].append({'name': pack['name'], 'expected': pack['size'], 'actual': os.path.getsize(path)})
+        else:
+            report['ok'].append(pack['name'])
+    if deep:
+        manifest = ExtractionManifest(output_dir, CONTENT_HASH_NAME)
+        current_source = source_id(source_key(trpfs_path))
+        by_name = {pack['name']: pack for pack in packs}
+        checks = []
+        for name in report['ok']:
+            pack = by_name[name]
+            entry = manifest.get(name)
+            if entry and entry['source'] == current_source and entry['offset'] == pack['offset'] and entry['hash']:
+                expected = entry['hash']
+            else:
+                expected = (trpfs_path, pack['offset'], pack['size'])
+            checks.append((name, _pack_output_path(output_dir, name), expected))
+        compare_hashes(report, checks, workers)
+    return report
+
+# --- GAPS ---
+def gap_report(trpfd_path, trpfs_path):
+    """Accounts for the bytes of data.trpfs that no named pack covers.
+
+    Returns a dict with 'unnamed' (file table entries whose hash is not in data.trpfd,
+    as pack dicts named '_unnamed/<hash>.trpak'), 'gap_packs' (TRPAKs in gaps, named
+    '_gaps/<offset>.trpak'), 'regions' (see scan_gaps) and the 'padding_bytes',
+    'table_bytes' (old file tables), 'stale_bytes' (replaced packs) and
+    'unaccounted_bytes' totals. The pack dicts can be passed to extract_packs.
+    """
+    name_index = NameIndex(trpfd_path)
+    data_map = DataArchiveMap(trpfs_path)
+    trpfs_size = os.path.getsize(trpfs_path)
+    sizes = data_map.pack_sizes(trpfs_size)
+    named = set(name_index.hashes)
+    unnamed = [{'name': f"{UNNAMED_PACK_DIR}/{pack_hash:016x}.trpak", 'hash': pack_hash, 'offset': offset, 'size': size}
+               for pack_hash, offset, size in zip(data_map.hashes, data_map.offsets, sizes) if pack_hash not in named]
+    regions = scan_gaps(data_map, sizes, trpfs_size)
+    gap_packs = [{'name': f"{GAP_PACK_DIR}/{region['offset']:012x}.trpak", 'hash': None, 'offset': region['offset'],
+                  'size': region['size']} for region in regions if region['kind'] == 'trpak']
+    return {
+        'unnamed': sorted(unnamed, key=lambda pack: pack['offset']),
+        'gap_packs': gap_packs,
+        'regions': regions,
+        'padding_bytes': sum(region['size'] for region in regions if region['kind'] == 'padding'),
+        'table_bytes': sum(region['size'] for region in regions if region['kind'] == 'table'),
+        'stale_bytes': sum(region['size'] for region in regions if region['kind'] == 'stale_pack'),
+        'unaccounted_bytes': sum(region['size'] for region in regions if region['kind'] == 'data'),
+    }
@@ -0,0 +1,316 @@
+import hashlib
+import math
+import os
+import random
+import struct
+import zlib
+
+from .compression import COMPRESSION_NONE
+from .crypto import aes_ctr, aes_ecb, aes_xts
+from .hashing import fnv1a_64_hash_many
+from .pfs0 import PFS0_MAGIC
+from .romfs import ROMFS_DIR_ENTRY, ROMFS_EMPTY, ROMFS_FILE_ENTRY, ROMFS_HEADER
+
+FILLER_CHUNK_SIZE = 4 * 1024 * 1024
+SIZE_DISTRIBUTIONS = ('fixed', 'uniform', 'lognormal')
+PATH_WORDS = ("pokemon", "field", "effect", "ui", "model", "texture", "common", "battle", "event", "ai_influence")
+
+def _align(n, alignment):
+    return (n + alignment - 1) & ~(alignment - 1)
+
+def _write_filler(f, rnd, size):
+    """Writes `size` pseudo-random bytes in bounded chunks."""
+    while size:
+        n = min(size, FILLER_CHUNK_SIZE)
+        f.write(rnd.randbytes(n))
+        size -= n
+
+# --- PFS0 ---
+def write_pfs0(path, files, seed=0):
+    """Writes a PFS0 (NSP) container from [(name, bytes or size)].
+
+    An int instead of bytes writes that many pseudo-random bytes, so large containers
+    never have to be held in memory.
+    """
+    rnd = random.Random(seed)
+    string_table = bytearray()
+    entries = bytearray()
+    data_offset = 0
+    for name, data in files:
+        size = data if isinstance(data, int) else len(data)
+        entries += struct.pack('<QQII', data_offset, size, len(string_table), 0)
+        string_table += name.encode('utf-8') + b'\0'
+        data_offset += size
+    string_table += b'\0' * (_align(len(string_table), 0x20) - len(string_table))
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IIII', PFS0_MAGIC, len(files), len(string_table), 0))
+        f.write(entries)
+        f.write(string_table)
+        for _, data in files:
+            if isinstance(data, int):
+                _write_filler(f, rnd, data)
+            else:
+                f.write(data)
+
+# --- TRPFD / TRPFS / TRPAK ---
+def synthetic_pack_names(count, depth=(2, 5), seed=0):
+    """Returns `count` unique 'arc/.../pack_N.trpak' paths with `depth` (min, max) folders."""
+    rnd = random.Random(seed)
+    names = []
+    for i in range(count):
+        parts = [f"{rnd.choice(PATH_WORDS)}_{rnd.randint(0, 99):02d}" for _ in range(rnd.randint(*depth))]
+        names.append("arc/" + "/".join(parts) + f"/pack_{i:06d}.trpak")
+    return names
+
+def pack_sizes(count, distribution='lognormal', mean_size=64 * 1024, max_size=None, seed=0):
+    """Returns `count` pack sizes: 'fixed', 'uniform' (0..2*mean) or 'lognormal' (long tail, like the game)."""
+    if distribution not in SIZE_DISTRIBUTIONS:
+        raise ValueError(f"Unknown size distribution '{distribution}' (expected one of {', '.join(SIZE_DISTRIBUTIONS)})")
+    rnd = random.Random(seed)
+    sigma = 1.2
+    sizes = []
+    for _ in range(count):
+        if distribution == 'fixed':
+            size = mean_size
+        elif distribution == 'uniform':
+            size = rnd.randint(0, 2 * mean_size)
+        else:
+            size = int(rnd.lognormvariate(math.log(mean_size) - sigma * sigma / 2, sigma))
+        sizes.append(min(size, max_size) if max_size else size)
+    return sizes
+
+def build_trpfd(names):
+    """Builds a .trpfd whose name vector is where NameIndex looks for it (offset stored at 0x1C)."""
+    vector_start = 0x20
+    strings_start = vector_start + 4 + 4 * len(names)
+    vector = bytearray(struct.pack('<I', len(names)))
+    strings = bytearray()
+    for i, name in enumerate(names):
+        vector += struct.pack('<I', strings_start + len(strings) - (vector_start + 4 + 4 * i))
+        encoded = name.encode('utf-8')
+        strings += struct.pack('<I', len(encoded)) + encoded + b'\0'
+        strings += b'\0' * (_align(len(strings), 4) - len(strings))
+    header = bytearray(0x1C) + struct.pack('<I', vector_start - 0x1C)
+    return bytes(header + vector + strings)
+
+def build_trpak(files, compress=True):
+    """Builds a TRPAK (PackedArchive FlatBuffer) from [(name hash, raw bytes)].
+
+    Inner files are zlib-compressed when that makes them smaller and `compress` is set,
+    otherwise stored; both decode with za_tools.trpak.
+    """
+    out = bytearray(4)  # root table offset, filled in last
+
+    def pad(alignment):
+        out.extend(b'\0' * (_align(len(out), alignment) - len(out)))
+
+    root_vtable = len(out)
+    out += struct.pack('<HHHH', 8, 12, 4, 8)
+    root = len(out)
+    out += struct.pack('<iII', root - root_vtable, 0, 0)
+    file_vtable = len(out)
+    out += struct.pack('<HHHHHHH', 14, 24, 4, 8, 9, 12, 20)
+
+    while (len(out) + 4) % 8:
+        out.append(0)
+    struct.pack_into('<I', out, root + 4, len(out) - (root + 4))
+    out += struct.pack('<I', len(files)) + b''.join(struct.pack('<Q', file_hash) for file_hash, _ in files)
+
+    pad(4)
+    file_vector = len(out)
+    struct.pack_into('<I', out, root + 8, file_vector - (root + 8))
+    out += struct.pack('<I', len(files)) + bytes(4 * len(files))
+    for i, (_, raw) in enumerate(files):
+        stored = zlib.compress(raw, 1) if compress else raw
+        if len(stored) >= len(raw):
+            stored = raw
+        pad(8)
+        table = len(out)
+        slot = file_vector + 4 + 4 * i
+        struct.pack_into('<I', out, slot, table - slot)
+        out += struct.pack('<iIbBxxQI', table - file_vtable, 0, COMPRESSION_NONE, 0, len(raw), 4)
+        out += struct.pack('<I', len(stored)) + stored
+    struct.pack_into('<I', out, 0, root)
+    return bytes(out)
+
+def _trpak_payload(rnd, name, size):
+    """Inner files for one synthetic pack of roughly `size` bytes: half compressible, half random."""
+    count = rnd.randint(1, 4)
+    files = []
+    for i in range(count):
+        part = size // count
+        text = f"{name}#{i} ".encode('utf-8')
+        compressible = (text * (part // (2 * len(text)) + 1))[:part // 2]
+        files.append((f"{name}/file_{i}.bin".encode('utf-8'), compressible + rnd.randbytes(part - len(compressible))))
+    hashes = fnv1a_64_hash_many(inner_name for inner_name, _ in files)
+    return list(zip(hashes, (data for _, data in files)))
+
+def build_trpfs_preamble(pack_count):
+    """The TRPFS_TABLE_SKIP bytes before the pack count, laid out as a FlatBuffer.
+
+    Root offset, 4 bytes of padding, the vtable and the root table, whose two fields
+    point at the offset vector and the hash vector (field order as DataArchiveMap
+    reads them), so that tools which copy the preamble are tested against real offsets.
+    """
+    vtable, table = 8, 16
+    return (struct.pack('<I4x', table) + struct.pack('<HHHH', 8, 12, 4, 8)
+            + struct.pack('<iII', table - vtable, 28 - (table + 4), 36 + 8 * pack_count - (table + 8)))
+
+def write_trpfs(path, packs):
+    """Writes an ONEPACK .trpfs from an iterable of (pack hash, bytes), in order. Returns the pack offsets."""
+    offsets = []
+    hashes = []
+    with open(path, 'wb') as f:
+        f.write(b"ONEPACK\0" + bytes(8))
+        for pack_hash, data in packs:
+            offsets.append(f.tell())
+            hashes.append(pack_hash)
+            f.write(data)
+        table_offset = f.tell()
+        f.write(build_trpfs_preamble(len(offsets)) + struct.pack('<I', len(offsets)) + b''.join(struct.pack('<Q', o) for o in offsets))
+        f.write(bytes(4) + struct.pack('<I', len(hashes)) + b''.join(struct.pack('<Q', h) for h in hashes))
+        f.seek(8)
+        f.write(struct.pack('<Q', table_offset))
+    return offsets
+
+def write_synthetic_game(output_dir, pack_count=1000, distribution='lognormal', mean_size=64 * 1024,
+                         max_size=None, depth=(2, 5), trpak=True, seed=0):
+    """Writes data.trpfd and data.trpfs with `pack_count` packs into `output_dir`.
+
+    Packs are real TRPAK files (or random bytes without `trpak`) stored in shuffled
+    order, as in the game, so offset order differs from name order. Returns the
+    (trpfd_path, trpfs_path) pair.
+    """
+    rnd = random.Random(seed)
+    names = synthetic_pack_names(pack_count, depth, seed)
+    sizes = pack_sizes(pack_count, distribution, mean_size, max_size, seed)
+    hashes = fnv1a_64_hash_many(name.encode('utf-8') for name in names)
+    order = list(range(pack_count))
+    rnd.shuffle(order)
+
+    def packs():
+        for i in order:
+            data = build_trpak(_trpak_payload(rnd, names[i], sizes[i])) if trpak else rnd.randbytes(sizes[i])
+            yield hashes[i], data
+
+    os.makedirs(output_dir, exist_ok=True)
+    trpfd_path = os.path.join(output_dir, 'data.trpfd')
+    trpfs_path = os.path.join(output_dir, 'data.trpfs')
+    with open(trpfd_path, 'wb') as f:
+        f.write(build_trpfd(names))
+    write_trpfs(trpfs_path, packs())
+    return trpfd_path, trpfs_path
+
+# --- ROMFS ---
+def build_romfs(files):
+    """Builds a RomFS image from {'dir/name': bytes}.
+
+    Directory and file tables are laid out like Nintendo's; the hash tables hold a
+    single empty bucket since readers here walk the tables directly.
+    """
+    dirs = {'': {'name': '', 'parent': '', 'dirs': [], 'files': []}}
+    for path in sorted(files):
+        parts = path.split('/')
+        for depth in range(1, len(parts)):
+            dir_path = '/'.join(parts[:depth])
+            if dir_path not in dirs:
+                parent = '/'.join(parts[:depth - 1])
+                dirs[dir_path] = {'name': parts[depth - 1], 'parent': parent, 'dirs': [], 'files': []}
+                dirs[parent]['dirs'].append(dir_path)
+        dirs['/'.join(parts[:-1])]['files'].append(path)
+
+    # Breadth-first offsets, so the root directory is at offset 0
+    order = ['']
+    for dir_path in order:
+        order.extend(dirs[dir_path]['dirs'])
+    dir_offsets, offset = {}, 0
+    for dir_path in order:
+        dir_offsets[dir_path] = offset
+        offset += ROMFS_DIR_ENTRY.size + _align(len(dirs[dir_path]['name'].encode('utf-8')), 4)
+    file_order = [path for dir_path in order for path in dirs[dir_path]['files']]
+    file_offsets, offset = {}, 0
+    for path in file_order:
+        file_offsets[path] = offset
+        offset += ROMFS_FILE_ENTRY.size + _align(len(path.rsplit('/', 1)[-1].encode('utf-8')), 4)
+
+    data = bytearray()
+    data_offsets = {}
+    for path in file_order:
+        data_offsets[path] = len(data)
+        data += files[path]
+        data += b'\0' * (_align(len(data), 0x10) - len(data))
+
+    def sibling(items, item, offsets):
+        i = items.index(item)
+        return offsets[items[i + 1]] if i + 1 < len(items) else ROMFS_EMPTY
+
+    dir_table = bytearray()
+    for dir_path in order:
+        info = dirs[dir_path]
+        name = info['name'].encode('utf-8')
+        parent_dirs = dirs[info['parent']]['dirs'] if dir_path else []
+        dir_table += ROMFS_DIR_ENTRY.pack(
+            dir_offsets[info['parent']],
+            sibling(parent_dirs, dir_path, dir_offsets) if dir_path else ROMFS_EMPTY,
+            dir_offsets[info['dirs'][0]] if info['dirs'] else ROMFS_EMPTY,
+            file_offsets[info['files'][0]] if info['files'] else ROMFS_EMPTY,
+            ROMFS_EMPTY, len(name)) + name.ljust(_align(len(name), 4), b'\0')
+
+    file_table = bytearray()
+    for path in file_order:
+        parent = path.rsplit('/', 1)[0] if '/' in path else ''
+        name = path.rsplit('/', 1)[-1].encode('utf-8')
+        file_table += ROMFS_FILE_ENTRY.pack(
+            dir_offsets[parent], sibling(dirs[parent]['files'], path, file_offsets),
+            data_offsets[path], len(files[path]), ROMFS_EMPTY, len(name)) + name.ljust(_align(len(name), 4), b'\0')
+
+    empty_bucket = struct.pack('<I', ROMFS_EMPTY)
+    dir_hash_offset = ROMFS_HEADER.size
+    dir_meta_offset = dir_hash_offset + 4
+    file_hash_offset = dir_meta_offset + len(dir_table)
+    file_meta_offset = file_hash_offset + 4
+    data_offset = _align(file_meta_offset + len(file_table), 0x10)
+    header = ROMFS_HEADER.pack(ROMFS_HEADER.size, dir_hash_offset, 4, dir_meta_offset, len(dir_table),
+                               file_hash_offset, 4, file_meta_offset, len(file_table), data_offset)
+    image = header + empty_bucket + dir_table + empty_bucket + file_table
+    return image + b'\0' * (data_offset - len(image)) + data
+
+# --- NCA ---
+def build_nca(keyset, romfs_image, section_key=None, romfs_level_offset=0x200, seed=None):
+    """Builds an NCA3 with a single AES-CTR RomFS section, encrypted with `keyset`.
+
+    `keyset` must hold 'header_key' and 'key_area_key_application_00'. Returns the
+    NCA bytes; the section key is random unless given.
+    """
+    section_key = section_key or os.urandom(16)
+    section_ctr = os.urandom(8) if seed is None else hashlib.sha256(seed).digest()[:8]
+
+    body = b'\0' * romfs_level_offset + romfs_image
+    body += b'\0' * (_align(len(body), 0x200) - len(body))
+    section_start = 0xC00
+
+    header = bytearray(0xC00)
+    header[0x200:0x204] = b"NCA3"
+    header[0x205] = 0  # Program
+    struct.pack_into('<QQ', header, 0x208, section_start + len(body), 0x0100000000001000)
+    struct.pack_into('<II', header, 0x240, section_start // 0x200, (section_start + len(body)) // 0x200)
+    header[0x248] = 1
+
+    fs_header = bytearray(0x200)
+    struct.pack_into('<HBBB', fs_header, 0, 2, 0, 3, 3)  # version, RomFS, IVFC, AES-CTR
+    struct.pack_into('<4sIII', fs_header, 0x8, b"IVFC", 0x20000, 0x20, 7)
+    struct.pack_into('<QQ', fs_header, 0x18 + 5 * 0x18, romfs_level_offset, len(romfs_image))
+    fs_header[0x140:0x148] = section_ctr
+    header[0x400:0x600] = fs_header
+    header[0x280:0x2A0] = hashlib.sha256(fs_header).digest()
+
+    key_area = bytes(0x20) + section_key + bytes(0x10)
+    header[0x300:0x340] = aes_ecb(keyset['key_area_key_application_00'], key_area, encrypt=True)
+
+    counter = section_ctr[::-1] + (section_start >> 4).to_bytes(8, 'big')
+    encrypted_body = aes_ctr(section_key, counter).update(body)
+    return aes_xts(keyset['header_key'], bytes(header), 0, encrypt=True) + encrypted_body
+
+def random_keyset():
+    """Returns a throwaway keyset with just the keys build_nca and NcaReader need."""
+    return {'header_key': os.urandom(32), 'key_area_key_application_00': os.urandom(16)}
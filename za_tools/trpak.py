@@ -0,0 +1,212 @@
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .compression import COMPRESSION_NONE, CompressionError, decompress_to_file, detect_codec
+from .flatbuffers import FlatBufferError, root_table
+from .hashing import fnv1a_64_hash_many
+from .magic import SNIFF_BYTES, sniff_type
+from .profiling import stage
+
+class TrpakError(IOError):
+    """Raised when a pack does not contain a valid TRPAK file table."""
+
+# --- TRPAK PARSER ---
+def parse_trpak(buf, base=0, limit=None):
+    """Parses the file table of the TRPAK (PackedArchive FlatBuffer) starting at `base` in `buf`.
+
+    Schema: root { file_hashes: [u64], files: [PackedFile] } and
+    PackedFile { unused: u32, compression: i8, level: u8, size: u64, buffer: [u8] }.
+    Returns one dict per inner file with its name hash, compression field, decoded size
+    and the absolute position and length of its stored bytes. `limit` is the end of the
+    pack; data running past it is rejected.
+    """
+    limit = len(buf) if limit is None else limit
+    try:
+        root = root_table(buf, base)
+        hashes = root.scalar_vector(0, 'Q')
+        files = root.tables(1)
+        if len(hashes) != len(files):
+            raise TrpakError(f"TRPAK lists {len(hashes)} hashes but {len(files)} files")
+        entries = []
+        for file_hash, packed in zip(hashes, files):
+            data_offset, data_size = packed.vector(4)
+            if data_offset + data_size > limit:
+                raise TrpakError(f"TRPAK entry {file_hash:016x} runs past the end of the pack")
+            entries.append({
+                'hash': file_hash,
+                'compression': packed.scalar(1, '<b', COMPRESSION_NONE),
+                'level': packed.scalar(2, '<B'),
+                'size': packed.scalar(3, '<Q'),
+                'data_offset': data_offset,
+                'data_size': data_size,
+            })
+        return entries
+    except FlatBufferError as e:
+        raise TrpakError(f"Invalid TRPAK file table: {e}") from None
+
+def trpak_extent(buf, base=0, limit=None):
+    """Returns how many bytes from `base` the TRPAK actually uses.
+
+    That is the end of the furthest table, vtable or vector its file table refers to;
+    alignment padding or unrelated data after the pack lies beyond it. Raises
+    TrpakError if the bytes at `base` are not a TRPAK that fits before `limit`.
+    """
+    limit = len(buf) if limit is None else limit
+    try:
+        root = root_table(buf, base)
+        hashes_start, hash_count = root.vector(0)
+        files_start, file_count = root.vector(1)
+        if root.vtable_size < 8 or not file_count or hash_count != file_count:
+            raise TrpakError("Not a TRPAK file table")
+        starts = [root.pos, root.vtable, hashes_start, files_start]
+        ends = [root.pos + root.inline_size, root.vtable + root.vtable_size,
+                hashes_start + 8 * hash_count, files_start + 4 * file_count]
+        for packed in root.tables(1):
+            data_start, data_size = packed.vector(4)
+            starts += [packed.pos, packed.vtable]
+            ends += [packed.pos + packed.inline_size, packed.vtable + packed.vtable_size, data_start + data_size]
+    except FlatBufferError as e:
+        raise TrpakError(f"Invalid TRPAK file table: {e}") from None
+    if min(starts) < base or max(ends) > limit:
+        raise TrpakError("TRPAK file table points outside the pack")
+    return max(ends) - base
+
+def load_name_list(fname):
+    """Reads a text file of inner file paths (one per line) into a {fnv1a hash: path} dict."""
+    with open(fname, encoding='utf-8') as f:
+        names = [line.strip() for line in f if line.strip()]
+    return dict(zip(fnv1a_64_hash_many(name.encode('utf-8') for name in names), names))
+
+def describe_entries(buf, entries, names=None):
+    """Adds the detected codec and the known (or hash-derived) name to each entry."""
+    for entry in entries:
+        head = buf[entry['data_offset']:entry['data_offset'] + SNIFF_BYTES]
+        entry['codec'] = detect_codec(entry['compression'], head, entry['data_size'], entry['size'])
+        entry['name'] = (names or {}).get(entry['hash'])
+    return entries
+
+# --- INNER FILE EXTRACTION ---
+class _SniffingWriter:
+    """Output for an unnamed inner file: created as '<base_path>.<sniffed type>' once its first bytes are known.
+
+    The first SNIFF_BYTES decoded bytes pick the extension before the file is opened,
+    so it is written once under its final name.
+    """
+    def __init__(self, base_path):
+        self._base_path = base_path
+        self._head = b''
+        self._f = None
+        self.path = None
+
+    def _open(self, head):
+        self.path = f"{self._base_path}.{sniff_type(head)}"
+        self._f = open(self.path, 'wb')
+
+    def write(self, data):
+        if self._f is None:
+            if self._head or len(data) < SNIFF_BYTES:
+                # Only short first chunks are collected; a full one is sniffed in place
+                self._head += bytes(data)
+                if len(self._head) < SNIFF_BYTES:
+                    return len(data)
+                data, self._head = self._head, b''
+            self._open(data)
+        return self._f.write(data)
+
+    def close(self):
+        if self._f is None:
+            self._open(self._head)
+            self._f.write(self._head)
+        self._f.close()
+
+def _write_entry(buf, entry, output_dir):
+    """Decodes one inner file straight to disk; unknown names get '<hash>.<sniffed type>'."""
+    view = memoryview(buf)[entry['data_offset']:entry['data_offset'] + entry['data_size']]
+    try:
+        name = entry['name'] or f"{entry['hash']:016x}"
+        output_path = os.path.join(output_dir, name.replace('/', os.sep))
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        out_f = open(output_path, 'wb') if entry['name'] else _SniffingWriter(output_path)
+        try:
+            decompress_to_file(entry['codec'], view, out_f, entry['size'])
+        finally:
+            out_f.close()
+    finally:
+        view.release()
+    return output_path if entry['name'] else out_f.path
+
+def extract_trpak_entries(buf, entries, output_dir, names=None):
+    """Extracts parsed TRPAK entries from `buf`. Returns {'extracted': [...], 'errors': [...]}."""
+    result = {'extracted': [], 'errors': []}
+    for entry in describe_entries(buf, entries, names):
+        try:
+            path = _write_entry(buf, entry, output_dir)
+            result['extracted'].append({'hash': f"{entry['hash']:016x}", 'path': path, 'size': entry['size'], 'codec': entry['codec']})
+        except (CompressionError, OSError) as e:
+            result['errors'].append({'hash': f"{entry['hash']:016x}", 'codec': entry['codec'], 'error': str(e)})
+    return result
+
+def _map_file(fname):
+    with open(fname, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def list_trpak(fname, names=None):
+    """Returns the described file table of a standalone .trpak file."""
+    buf = _map_file(fname)
+    try:
+        return describe_entries(buf, parse_trpak(buf), names)
+    finally:
+        buf.close()
+
+def extract_trpak(fname, output_dir, names=None):
+    """Extracts every inner file of a standalone .trpak file into `output_dir`."""
+    buf = _map_file(fname)
+    try:
+        return extract_trpak_entries(buf, parse_trpak(buf), output_dir, names)
+    finally:
+        buf.close()
+
+# --- ONE-PASS TRPFS STAGE ---
+def _unpack_pack(buf, pack, output_dir, names):
+    pack_dir = os.path.join(output_dir, os.path.splitext(pack['name'])[0].replace('/', os.sep))
+    with stage('trpak.parse', pack['size']):
+        entries = parse_trpak(buf, pack['offset'], pack['offset'] + pack['size'])
+    with stage('trpak.decode') as timer:
+        result = extract_trpak_entries(buf, entries, pack_dir, names)
+        timer.add_bytes(sum(entry['size'] for entry in result['extracted']))
+    return result
+
+def extract_trpaks_from_trpfs(trpfs_path, packs, output_dir, workers=1, progress_callback=None, names=None):
+    """Unpacks the inner files of `packs` directly from data.trpfs, without writing .trpak slices.
+
+    data.trpfs is mapped once and each pack is parsed in place; inner files go to
+    '<output_dir>/<pack path without .trpak>/'. Progress is reported like extract_packs.
+    Returns {'extracted': n, 'errors': [...]} where errors name the pack and inner file.
+    """
+    summary = {'extracted': 0, 'errors': []}
+    total = len(packs)
+    total_bytes = sum(p['size'] for p in packs)
+    done = 0
+    bytes_done = 0
+
+    buf = _map_file(trpfs_path)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {pool.submit(_unpack_pack, buf, pack, output_dir, names): pack
+                       for pack in sorted(packs, key=lambda p: p['size'], reverse=True)}
+            for future in as_completed(futures):
+                pack = futures[future]
+                try:
+                    result = future.result()
+                    summary['extracted'] += len(result['extracted'])
+                    summary['errors'].extend(dict(error, pack=pack['name']) for error in result['errors'])
+                except TrpakError as e:
+                    summary['errors'].append({'pack': pack['name'], 'error': str(e)})
+                done += 1
+                bytes_done += pack['size']
+                if progress_callback:
+                    progress_callback(done, total, pack, bytes_done, total_bytes)
+    finally:
+        buf.close()
+    return summary
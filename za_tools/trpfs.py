@@ -0,0 +1,322 @@
+import bisect
+import mmap
+import os
+import struct
+import sys
+from array import array
+from contextlib import contextmanager
+
+from .flatbuffers import PagedBuffer
+from .hashing import fnv1a_64_hash_many
+from .pack_table import PackTable, argsort, join_hashes
+from .trpak import TrpakError, trpak_extent
+
+TRPFS_MAGIC = b"ONEPACK\0"
+TRPFD_VECTOR_OFFSET = 0x1C
+# Between the table offset and the pack count; the hash count follows the offsets after 4 more bytes
+TRPFS_TABLE_SKIP = 28
+TRPFS_HEADER_SIZE = 16
+# Zero runs in gaps are scanned in blocks of this size
+GAP_SCAN_BLOCK = 64 * 1024
+# Extent sidecar written by za_tools.packer next to data.trpfs ('data.trpfs.extents'):
+# magic, u64 table offset and u64 size of the archive it describes, u32 pack count,
+# u32 dead region count, the exact size of every pack (u64, file table order), then
+# (u64 offset, u64 size, u64 kind) for every region an in-place update left unused
+EXTENT_SIDECAR_SUFFIX = '.extents'
+EXTENT_RECORD_MAGIC = b"ZAEXTNT\0"
+_EXTENT_HEADER = struct.Struct('<8sQQII')
+DEAD_REGION_SIZE = 24
+# Kinds of dead region: an older copy of a replaced pack, or an old file table
+DEAD_PACK = 0
+DEAD_TABLE = 1
+
+_U32 = struct.Struct('<I')
+
+class TrpfsError(IOError):
+    """Raised when a .trpfd or .trpfs header points outside the file."""
+
+# --- BOUNDS-CHECKED BULK READS ---
+def _check_range(what, offset, size, limit):
+    if offset < 0 or size < 0 or offset + size > limit:
+        raise TrpfsError(f"{what} at {offset:#x} (+{size:#x}) runs past the end of the file ({limit:#x} bytes)")
+
+def _u32_at(buf, offset, what):
+    _check_range(what, offset, 4, len(buf))
+    return _U32.unpack_from(buf, offset)[0]
+
+def _int_array(typecode, data):
+    """Decodes a little-endian integer vector in one call."""
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+def _read_exact(f, offset, size, limit, what):
+    _check_range(what, offset, size, limit)
+    f.seek(offset)
+    data = f.read(size)
+    if len(data) != size:
+        raise TrpfsError(f"{what} at {offset:#x} is truncated")
+    return data
+
+@contextmanager
+def _open_binary(source):
+    """Yields `source` itself if it is already a binary file object, else opens the path."""
+    if hasattr(source, 'read'):
+        yield source
+    else:
+        with open(source, 'rb') as f:
+            yield f
+
+def _file_size(f):
+    f.seek(0, os.SEEK_END)
+    return f.tell()
+
+# --- PARSER CLASSES ---
+class NameIndex:
+    """Parses a .trpfd file (path or seekable binary file) to extract package names and their hashes.
+
+    The file is read in one go and the string vector is resolved in memory. Names are
+    kept in one UTF-8 blob (entry i spans name_offsets[i]:name_offsets[i + 1]) next to
+    an array('Q') of their hashes.
+    """
+    def __init__(self, fname):
+        with _open_binary(fname) as f:
+            f.seek(0)
+            data = f.read()
+        base = TRPFD_VECTOR_OFFSET + _u32_at(data, TRPFD_VECTOR_OFFSET, "Name vector offset")
+        count = _u32_at(data, base, "Name count")
+        _check_range("Name offset table", base + 4, 4 * count, len(data))
+        rel_offsets = _int_array('I', data[base + 4:base + 4 + 4 * count])
+
+        unpack_length = _U32.unpack_from
+        encoded = []
+        for i, rel_off in enumerate(rel_offsets):
+            off = base + 4 + i * 4 + rel_off
+            if off + 4 > len(data):
+                _check_range(f"Name {i}", off, 4, len(data))
+            end = off + 4 + unpack_length(data, off)[0]
+            if end > len(data):
+                _check_range(f"Name {i}", off + 4, end - off - 4, len(data))
+            encoded.append(data[off + 4:end])
+        self.name_blob = b''.join(encoded)
+        try:
+            self.name_blob.decode('utf-8')
+        except UnicodeDecodeError:
+            # Drop undecodable bytes per name, as the names were always read with 'ignore'
+            encoded = [name.decode('utf-8', 'ignore').encode('utf-8') for name in encoded]
+            self.name_blob = b''.join(encoded)
+
+        self.name_offsets = array('Q', [0])
+        for name in encoded:
+            self.name_offsets.append(self.name_offsets[-1] + len(name))
+        self.hashes = array('Q', fnv1a_64_hash_many(encoded))
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def name(self, i):
+        return self.name_blob[self.name_offsets[i]:self.name_offsets[i + 1]].decode('utf-8')
+
+    @property
+    def pack_infos(self):
+        """The entries as a list of {'name', 'hash'} dicts (built on each access)."""
+        return [{'name': self.name(i), 'hash': pack_hash} for i, pack_hash in enumerate(self.hashes)]
+
+class DataArchiveMap:
+    """Parses a .trpfs file (path or seekable binary file) to map package hashes to their file offsets.
+
+    Only the header and the file table are read, each vector in a single read.
+    `hashes` and `offsets` are parallel array('Q') columns in file table order, and
+    `table_offset` is where the file table starts (the end of the pack data) and
+    `table_end` where it ends. When za_tools.packer wrote the archive, the extent
+    sidecar next to it supplies `recorded_sizes` (else None) and `dead_regions`, the
+    (offset, size, kind) ranges that in-place updates left unused; a sidecar that
+    describes another version of the archive is ignored.
+    """
+    def __init__(self, fname):
+        self.path = fname if isinstance(fname, (str, os.PathLike)) else None
+        # A file object is kept so that pack_sizes can measure the packs through it
+        self._stream = None if self.path is not None else fname
+        with _open_binary(fname) as f:
+            size = _file_size(f)
+            header = _read_exact(f, 0, TRPFS_HEADER_SIZE, size, "TRPFS header")
+            if header[:8] != TRPFS_MAGIC:
+                raise TrpfsError("Invalid .trpfs signature")
+            self.table_offset = struct.unpack_from('<Q', header, 8)[0]
+            table = self.table_offset + TRPFS_TABLE_SKIP
+            pack_count = struct.unpack('<I', _read_exact(f, table, 4, size, "Pack count"))[0]
+            # Offsets, 4 unknown bytes and the hash count in one read
+            offsets_and_count = _read_exact(f, table + 4, 8 * pack_count + 8, size, "Pack offset table")
+            self.offsets = _int_array('Q', offsets_and_count[:8 * pack_count])
+            hash_count = struct.unpack_from('<I', offsets_and_count, 8 * pack_count + 4)[0]
+            self.hashes = _int_array('Q', _read_exact(f, table + 12 + 8 * pack_count, 8 * hash_count, size, "Pack hash table"))
+            if hash_count != pack_count:
+                raise TrpfsError(f"TRPFS table lists {pack_count} offsets but {hash_count} hashes")
+            self.table_end = table + 12 + 16 * pack_count
+            self.recorded_sizes = None
+            self.dead_regions = []
+            if self.path is not None:
+                self._read_extent_sidecar(size)
+
+    def _read_extent_sidecar(self, size):
+        try:
+            with open(os.fspath(self.path) + EXTENT_SIDECAR_SUFFIX, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return
+        if len(data) < _EXTENT_HEADER.size:
+            return
+        magic, table_offset, archive_size, pack_count, dead_count = _EXTENT_HEADER.unpack_from(data, 0)
+        # A sidecar left from another version of the archive (e.g. one rewritten by another tool) is not used
+        if (magic != EXTENT_RECORD_MAGIC or (table_offset, archive_size, pack_count) != (self.table_offset, size, len(self.offsets))
+                or len(data) != _EXTENT_HEADER.size + 8 * pack_count + DEAD_REGION_SIZE * dead_count):
+            return
+        body = data[_EXTENT_HEADER.size:]
+        self.recorded_sizes = _int_array('Q', body[:8 * pack_count])
+        dead = _int_array('Q', body[8 * pack_count:])
+        self.dead_regions = [tuple(dead[i:i + 3]) for i in range(0, len(dead), 3)]
+
+    @property
+    def pack_hash_to_offset(self):
+        """The table as a {hash: offset} dict (built on each access)."""
+        return dict(zip(self.hashes, self.offsets))
+
+    @contextmanager
+    def _buffer(self, trpfs_size):
+        """Yields the archive as a buffer: one memory map of a path, or a PagedBuffer over a file object."""
+        if self.path is None:
+            stream = self._stream
+
+            def pread(size, offset):
+                stream.seek(offset)
+                return stream.read(size)
+
+            yield PagedBuffer(pread, trpfs_size)
+            return
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield buf
+
+    def pack_sizes(self, trpfs_size, measure=True):
+        """Returns the exact size of every pack as an array('Q') column in file table order.
+
+        A pack can run at most to the next boundary: the next offset in the file table
+        (whether .trpfd names that pack or not), the start of a dead region, the file
+        table itself or `trpfs_size`. Sizes from the packer's extent sidecar are used
+        when they all fit their slots. Otherwise, with `measure`, every pack is parsed
+        in place (only the pages holding its file table are read, from a path or a
+        file object alike) and a TRPAK followed by nothing but zeros up to its boundary
+        is cut to the bytes its FlatBuffer uses, so alignment padding is left out.
+        """
+        boundaries = sorted(set(self.offsets) | {self.table_offset, trpfs_size}
+                            | {offset for offset, _, _ in self.dead_regions})
+        sizes = array('Q', (boundaries[bisect.bisect_right(boundaries, offset)] - offset if offset < trpfs_size else 0
+                            for offset in self.offsets))
+        recorded = self.recorded_sizes
+        if recorded is not None and all(exact <= size for exact, size in zip(recorded, sizes)):
+            return array('Q', recorded)
+        if measure and trpfs_size:
+            with self._buffer(trpfs_size) as buf:
+                for i, offset in enumerate(self.offsets):
+                    if not sizes[i]:
+                        continue
+                    end = offset + sizes[i]
+                    try:
+                        extent = trpak_extent(buf, offset, end)
+                    except TrpakError:
+                        continue
+                    # Only padding is cut: real bytes after the FlatBuffer stay part of the pack
+                    if _skip_zeros(buf, offset + extent, end) == end:
+                        sizes[i] = extent
+        return sizes
+
+# --- PACK MAP ---
+def build_pack_table(name_index, data_map, trpfs_size, measure=True, sizes=None):
+    """Joins names to offsets by hash and orders the packs by offset.
+
+    Sizes come from data_map.pack_sizes(trpfs_size, measure) unless already computed
+    and passed as `sizes`: recorded by the packer, or bounded by the next pack, dead
+    region or the table and measured. Works on whole columns (vectorized with NumPy when
+    available) and returns a PackTable.
+    """
+    rows, slots = join_hashes(name_index.hashes, data_map.hashes, array('Q', range(len(data_map.hashes))))
+    all_sizes = data_map.pack_sizes(trpfs_size, measure) if sizes is None else sizes
+    offsets = array('Q', (data_map.offsets[slot] for slot in slots))
+    order = argsort(offsets)
+    hashes = array('Q', (name_index.hashes[rows[i]] for i in order))
+    sizes = array('Q', (all_sizes[slots[i]] for i in order))
+    offsets = array('Q', (offsets[i] for i in order))
+
+    blob, bounds = name_index.name_blob, name_index.name_offsets
+    names = [blob[bounds[rows[i]]:bounds[rows[i] + 1]] for i in order]
+    name_offsets = array('Q', [0])
+    for name in names:
+        name_offsets.append(name_offsets[-1] + len(name))
+    return PackTable(hashes, offsets, sizes, b''.join(names), name_offsets)
+
+def build_pack_map(name_index, data_map, trpfs_size):
+    """Returns build_pack_table() as an offset-sorted list of {'name','hash','offset','size'} dicts."""
+    return build_pack_table(name_index, data_map, trpfs_size).pack_map()
+
+# --- GAP SCAN ---
+def _skip_zeros(buf, pos, end):
+    """Returns the position of the first non-zero byte in buf[pos:end], or `end`."""
+    while pos < end:
+        block = buf[pos:min(end, pos + GAP_SCAN_BLOCK)]
+        rest = block.lstrip(b'\0')
+        if rest:
+            return pos + len(block) - len(rest)
+        pos += len(block)
+    return end
+
+def scan_gaps(data_map, sizes, trpfs_size):
+    """Finds and classifies every byte range between the header and the file table that no pack covers.
+
+    `sizes` are the data_map.pack_sizes() of its file table. Each uncovered range is
+    cut at the edges of the packer's dead regions and split into regions: 'table' (an
+    old file table left by an in-place update), 'stale_pack' (the old copy of a pack an
+    in-place update replaced), 'padding' (zeros), 'trpak' (a complete TRPAK that no
+    table entry points at) and 'data' (anything else, unaccounted for). Returns the
+    regions as {'offset', 'size', 'kind'} dicts in file order. Needs a DataArchiveMap
+    opened from a path.
+    """
+    if data_map.path is None:
+        raise TrpfsError("Scanning for gaps needs data.trpfs on disk")
+    end_of_data = min(data_map.table_offset, trpfs_size)
+    covered = sorted((offset, offset + size) for offset, size in zip(data_map.offsets, sizes) if size)
+    gaps = []
+    position = TRPFS_HEADER_SIZE
+    for start, end in covered + [(end_of_data, end_of_data)]:
+        if min(start, end_of_data) > position:
+            gaps.append((position, min(start, end_of_data)))
+        position = max(position, end)
+    cuts = sorted({offset for offset, _, _ in data_map.dead_regions}
+                  | {offset + size for offset, size, _ in data_map.dead_regions})
+    gaps = [piece for start, end in gaps
+            for piece in zip([start] + [c for c in cuts if start < c < end], [c for c in cuts if start < c < end] + [end])]
+    dead_kinds = {DEAD_TABLE: 'table', DEAD_PACK: 'stale_pack'}
+    dead = [(offset, offset + size, dead_kinds[kind]) for offset, size, kind in data_map.dead_regions if kind in dead_kinds]
+
+    regions = []
+    with open(data_map.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        for start, end in gaps:
+            kind = next((kind for dead_start, dead_end, kind in dead if dead_start <= start and end <= dead_end), None)
+            if kind is not None:
+                regions.append({'offset': start, 'size': end - start, 'kind': kind})
+                continue
+            position = start
+            while position < end:
+                data_start = _skip_zeros(buf, position, end)
+                if data_start > position:
+                    regions.append({'offset': position, 'size': data_start - position, 'kind': 'padding'})
+                if data_start == end:
+                    break
+                try:
+                    extent = trpak_extent(buf, data_start, end)
+                except TrpakError:
+                    regions.append({'offset': data_start, 'size': end - data_start, 'kind': 'data'})
+                    break
+                regions.append({'offset': data_start, 'size': extent, 'kind': 'trpak'})
+                position = data_start + extent
+    return regions
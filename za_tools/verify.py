@@ -0,0 +1,154 @@
+import hashlib
+import mmap
+import os
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ProcessPoolExecutor
+
+from .fileio import COPY_CHUNK_SIZE
+from .hashing import CONTENT_HASH_NAME, content_hasher
+
+DEFAULT_HASH_WORKERS = os.cpu_count() or 1
+# Jobs are handed to the pool in batches so small packs do not cost one round trip each
+HASH_BATCH_BYTES = 64 * 1024 * 1024
+HASH_BATCH_JOBS = 256
+
+# --- PARALLEL RANGE HASHING ---
+_worker_maps = {}
+
+def _map_file(path):
+    """Returns a read-only mmap of `path`, cached per worker process (None for empty files)."""
+    if path not in _worker_maps:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            _worker_maps[path] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+    return _worker_maps[path]
+
+def _new_hasher(hash_name):
+    return hashlib.sha256() if hash_name == 'sha256' else content_hasher(hash_name)
+
+def hash_range(path, offset, size, hash_name=CONTENT_HASH_NAME):
+    """Hashes `size` bytes of `path` at `offset` through an mmap, one COPY_CHUNK_SIZE slice at a time.
+
+    Returns the hex digest, or None if the file is shorter than the range.
+    """
+    hasher = _new_hasher(hash_name)
+    if size == 0:
+        return hasher.hexdigest()
+    mapped = _map_file(path)
+    if mapped is None or offset + size > len(mapped):
+        return None
+    view = memoryview(mapped)
+    try:
+        for start in range(offset, offset + size, COPY_CHUNK_SIZE):
+            hasher.update(view[start:min(start + COPY_CHUNK_SIZE, offset + size)])
+    finally:
+        view.release()
+    return hasher.hexdigest()
+
+def _hash_batch(batch):
+    try:
+        return [hash_range(*job) for job in batch]
+    finally:
+        for mapped in _worker_maps.values():
+            if mapped is not None:
+                mapped.close()
+        _worker_maps.clear()
+
+def _batches(jobs):
+    batch, batch_bytes = [], 0
+    for job in jobs:
+        batch.append(job)
+        batch_bytes += job[2]
+        if len(batch) >= HASH_BATCH_JOBS or batch_bytes >= HASH_BATCH_BYTES:
+            yield batch
+            batch, batch_bytes = [], 0
+    if batch:
+        yield batch
+
+def hash_ranges(jobs, workers=DEFAULT_HASH_WORKERS):
+    """Hashes many (path, offset, size, hash_name) ranges across a process pool.
+
+    Returns the hex digests in job order (None for ranges past the end of their file).
+    With one worker everything runs in this process.
+    """
+    jobs = list(jobs)
+    if workers <= 1 or len(jobs) <= 1:
+        return _hash_batch(jobs)
+    digests = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for batch_digests in pool.map(_hash_batch, _batches(jobs)):
+            digests.extend(batch_digests)
+    return digests
+
+# --- CNMT ---
+def parse_cnmt_xml(data):
+    """Returns {content id: {'type', 'size', 'sha256'}} from a .cnmt.xml as shipped next to the NCAs in an NSP."""
+    contents = {}
+    root = ElementTree.fromstring(data)
+    for content in root.iter('Content'):
+        content_id = (content.findtext('Id') or '').strip().lower()
+        digest = (content.findtext('Hash') or '').strip().lower()
+        if content_id and digest:
+            contents[content_id] = {
+                'type': (content.findtext('Type') or '').strip(),
+                'size': int((content.findtext('Size') or '0').strip()),
+                'sha256': digest,
+            }
+    return contents
+
+# --- DEEP VERIFICATION ---
+def compare_hashes(report, checks, workers=DEFAULT_HASH_WORKERS, hash_name=CONTENT_HASH_NAME):
+    """Hashes each extracted file and compares it with its expected digest or source range.
+
+    `checks` holds (name, output_path, expected) where `expected` is either a digest
+    string or a (source_path, offset, size) range to hash. Names whose contents differ
+    move from report['ok'] to report['hash_mismatch'].
+    """
+    jobs = []
+    for _, output_path, expected in checks:
+        jobs.append((output_path, 0, os.path.getsize(output_path), hash_name))
+        if not isinstance(expected, str):
+            jobs.append((*expected, hash_name))
+    digests = iter(hash_ranges(jobs, workers))
+
+    mismatched = set()
+    report.setdefault('hash_mismatch', [])
+    for name, _, expected in checks:
+        actual = next(digests)
+        expected_digest = expected if isinstance(expected, str) else next(digests)
+        if actual != expected_digest:
+            mismatched.add(name)
+            report['hash_mismatch'].append({'name': name, 'expected': expected_digest, 'actual': actual})
+    report['ok'] = [name for name in report['ok'] if name not in mismatched]
+    report['hash_algorithm'] = hash_name
+    return report
+
+def read_cnmt(nsp_path, entries):
+    """Returns {entry filename: CNMT content} for the NSP entries listed in any .cnmt.xml entry of the same NSP.
+
+    `entries` are list_pfs0() dicts.
+    """
+    contents = {}
+    with open(nsp_path, 'rb') as f:
+        for entry in entries:
+            if entry['filename'].lower().endswith('.cnmt.xml') and entry['in_bounds']:
+                f.seek(entry['offset'])
+                contents.update(parse_cnmt_xml(f.read(entry['size'])))
+    return {entry['filename']: contents[entry['filename'].split('.')[0].lower()] for entry in entries
+            if entry['in_bounds'] and entry['filename'].split('.')[0].lower() in contents}
+
+def check_cnmt(report, checks, workers=DEFAULT_HASH_WORKERS):
+    """Hashes extracted files with SHA-256 and compares them with the digests of their .cnmt.xml.
+
+    `checks` holds (name, output_path, sha256). Each file is read once and the source
+    is not read at all: a match proves both the NSP entry and its extraction. Adds
+    'cnmt_checked' (count) and 'cnmt_mismatch' to the report; mismatched names leave
+    report['ok'].
+    """
+    digests = hash_ranges([(output_path, 0, os.path.getsize(output_path), 'sha256') for _, output_path, _ in checks], workers)
+    report['cnmt_checked'] = len(checks)
+    report['cnmt_mismatch'] = [{'name': name, 'expected': expected, 'actual': digest}
+                               for (name, _, expected), digest in zip(checks, digests) if digest != expected]
+    mismatched = {item['name'] for item in report['cnmt_mismatch']}
+    report['ok'] = [name for name in report['ok'] if name not in mismatched]
+    return report
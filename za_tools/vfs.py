@@ -0,0 +1,179 @@
+import errno
+import io
+import mmap
+import os
+import stat
+import time
+
+from .index_cache import load_pack_index
+from .selection import select_packs
+
+try:
+    from fuse import FUSE, FuseOSError, Operations
+except ImportError:  # fusepy is optional; only mount() needs it
+    FUSE = None
+    Operations = object
+
+# --- PACK FILE OBJECT ---
+class PackFile(io.RawIOBase):
+    """Read-only, seekable file object over one pack inside data.trpfs.
+
+    The data is a memoryview slice of the archive's mmap, so nothing is copied until
+    the caller reads; getbuffer() hands out the slice itself for zero-copy access.
+    """
+    def __init__(self, view, name):
+        super().__init__()
+        self._view = view
+        self._pos = 0
+        self.name = name
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        self._checkClosed()
+        n = min(len(b), len(self._view) - self._pos)
+        if n <= 0:
+            return 0
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def readall(self):
+        self._checkClosed()
+        data = bytes(self._view[self._pos:])
+        self._pos = len(self._view)
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._checkClosed()
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self._pos = offset
+        return self._pos
+
+    def tell(self):
+        self._checkClosed()
+        return self._pos
+
+    def getbuffer(self):
+        """Returns the pack's bytes as a read-only memoryview (no copy)."""
+        self._checkClosed()
+        return self._view
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+# --- VIRTUAL FILESYSTEM ---
+class TrpfsFS:
+    """Read-only view of the packs in data.trpfs as files, without extracting them.
+
+    Pack paths use '/' separators, e.g. fs.open('arc/pokemon/pm0001.trpak').
+    The archive is mapped once; every opened file is a slice of that mapping.
+    """
+    def __init__(self, trpfd_path, trpfs_path, use_cache=True):
+        self.index = load_pack_index(trpfd_path, trpfs_path, use_cache=use_cache)
+        with open(trpfs_path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mtime = os.path.getmtime(trpfs_path)
+
+    def _pack(self, name):
+        pack = self.index.lookup(name.replace('\\', '/').lstrip('/'))
+        if pack is None:
+            raise FileNotFoundError(errno.ENOENT, "No such pack", name)
+        return pack
+
+    def open(self, name, mode='rb'):
+        """Opens a pack for reading. Only binary read mode is supported."""
+        if mode not in ('r', 'rb'):
+            raise ValueError("TrpfsFS is read-only; use mode 'rb'")
+        pack = self._pack(name)
+        view = memoryview(self._map)[pack['offset']:pack['offset'] + pack['size']]
+        return PackFile(view, pack['name'])
+
+    def exists(self, name):
+        return self.index.lookup(name.replace('\\', '/').lstrip('/')) is not None
+
+    def stat(self, name):
+        """Returns the pack dict (name, hash, offset, size)."""
+        return self._pack(name)
+
+    def listdir(self, path=''):
+        """Returns the names of the packs and folders directly inside `path`."""
+        prefix = path.strip('/') + '/' if path.strip('/') else ''
+        children = []
+        for pack in self.index.iter_prefix(prefix):
+            child = pack['name'][len(prefix):].split('/', 1)[0]
+            if not children or children[-1] != child:
+                children.append(child)
+        return children
+
+    def glob(self, *patterns):
+        """Returns the pack dicts matching exact names, prefixes or globs, sorted by offset."""
+        return select_packs(self.index, patterns)
+
+    def close(self):
+        self.index.close()
+        try:
+            self._map.close()
+        except BufferError:
+            # Files are still open; the mapping is released when they are collected
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# --- FUSE MOUNT ---
+class _TrpfsOperations(Operations):
+    def __init__(self, fs):
+        self.fs = fs
+        self.dirs = {''}
+        for pack in fs.index:
+            parts = pack['name'].split('/')[:-1]
+            for i in range(1, len(parts) + 1):
+                self.dirs.add('/'.join(parts[:i]))
+
+    def getattr(self, path, fh=None):
+        name = path.strip('/')
+        if name in self.dirs:
+            return {'st_mode': stat.S_IFDIR | 0o555, 'st_nlink': 2, 'st_mtime': self.fs._mtime, 'st_ctime': self.fs._mtime, 'st_atime': time.time()}
+        pack = self.fs.index.lookup(name)
+        if pack is None:
+            raise FuseOSError(errno.ENOENT)
+        return {'st_mode': stat.S_IFREG | 0o444, 'st_nlink': 1, 'st_size': pack['size'],
+                'st_mtime': self.fs._mtime, 'st_ctime': self.fs._mtime, 'st_atime': time.time()}
+
+    def readdir(self, path, fh):
+        return ['.', '..'] + self.fs.listdir(path.strip('/'))
+
+    def open(self, path, flags):
+        if flags & (os.O_WRONLY | os.O_RDWR):
+            raise FuseOSError(errno.EROFS)
+        return 0
+
+    def read(self, path, size, offset, fh):
+        pack = self.fs.index.lookup(path.strip('/'))
+        if pack is None:
+            raise FuseOSError(errno.ENOENT)
+        start = pack['offset'] + min(offset, pack['size'])
+        end = pack['offset'] + min(offset + size, pack['size'])
+        return self.fs._map[start:end]
+
+def mount(trpfd_path, trpfs_path, mountpoint, foreground=True):
+    """Mounts data.trpfs read-only at `mountpoint` through FUSE (requires the 'fusepy' package)."""
+    if FUSE is None:
+        raise RuntimeError("FUSE mounting needs the 'fusepy' package (pip install fusepy) and a FUSE driver")
+    with TrpfsFS(trpfd_path, trpfs_path) as fs:
+        FUSE(_TrpfsOperations(fs), mountpoint, foreground=foreground, ro=True, nothreads=False)